@@ -4,18 +4,29 @@
 # https://musicbrainz.org/ws/2/recording?fmt=json&query=firstreleasedate:1990%20AND%20tag:rock&limit=100
 
 import datetime
+import functools
 import json
+import math
 import pathlib
 import re
-import time
-from typing import TypedDict
+import sys
+from typing import NotRequired, TypedDict
 
-import requests
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+# pylint: disable-next=wrong-import-position
+from sgcommon import httpclient, trace
 
+CHECKPOINT_PAGES = 20  # result pages fetched between two saves of the store
 MAX_CACHE_LIVE = 1  # days
+PARTITION_LIMIT = 300  # recordings, a few pages
+PARTITIONS_FILE = "mb_partitions.json"
 RATE_LIMITING_DELAY = 1  # seconds
 REQUEST_LIMIT = 100
 REQUEST_TIMEOUT = 60  # seconds
+STORE_FILE = "mb_store.json"
+TAG = "rock"
+
+REGEX_PARENTHESIZED = re.compile(r"\(.+\)")
 
 
 class MBData(TypedDict):
@@ -25,8 +36,44 @@ class MBData(TypedDict):
     recordings: list[str]
 
 
-class MBRecording(TypedDict):
-    title: str
+class MBQueryIndex(TypedDict):
+    timestamp: str
+    count: int
+    offset: int
+    ids: list[str]
+
+
+class MBWorkList(TypedDict):
+    timestamp: str
+    count: int  # reported for the whole query
+    # [first, last] release dates of the partitions, see `split_range`
+    pending: list[list[str]]
+    done: list[list[str]]
+
+
+class MBStore(TypedDict):
+    # recording ID -> normalized title, shared by the queries
+    recordings: dict[str, str]
+    # query -> IDs of its recordings
+    queries: dict[str, MBQueryIndex]
+    # partitioned query -> its work list
+    partitions: dict[str, MBWorkList]
+
+
+class MBTag(TypedDict):
+    count: int
+    name: str
+
+
+MBRecording = TypedDict(
+    "MBRecording",
+    {
+        "id": NotRequired[str],
+        "title": str,
+        "first-release-date": NotRequired[str],
+        "tags": NotRequired[list[MBTag]],
+    },
+)
 
 
 class MBRecordingResponse(TypedDict):
@@ -37,48 +84,229 @@ class MBRecordingResponse(TypedDict):
 
 
 def fetch_json_data(
-    year: int, offset: int, timestamp: datetime.datetime, bypass_cache: bool
+    query: str, offset: int, timestamp: datetime.datetime
 ) -> MBRecordingResponse:
     now = datetime.datetime.now(tz=datetime.UTC)
-    if bypass_cache or now - timestamp > datetime.timedelta(
-        days=MAX_CACHE_LIVE
-    ):
+    if now - timestamp > datetime.timedelta(days=MAX_CACHE_LIVE):
         offset = 0
 
     params = {
         "fmt": "json",
-        "query": f"firstreleasedate:{year} AND tag:rock",
+        "query": query,
         "limit": REQUEST_LIMIT,
         "offset": offset,
     }
 
-    r = requests.get(
-        "https://musicbrainz.org/ws/2/recording",
-        params=params,
-        timeout=REQUEST_TIMEOUT,
+    r = get_session().get(
+        "https://musicbrainz.org/ws/2/recording", params=params
     )
 
     if r.status_code != 200:
         raise RuntimeError(f"Cannot fetch Music Brainz. {r.text}")
 
-    return r.json()
+    with trace.span("parse:json"):
+        return r.json()
+
+
+def fetch_partitions(
+    store: MBStore,
+    year: int,
+    bypass_cache: bool,
+    debug: bool,
+    tag: str = TAG,
+) -> str:
+    """Fetch a year query as release date ranges of a few pages each.
+
+    The ranges are split, by their count, until it is at most
+    `PARTITION_LIMIT`, so no deep offset is requested, but for a single day
+    beyond it. The work list is saved after each range, apart from the bulk of
+    the store, and an interrupted run resumes with the pending ranges. The
+    store is saved every `CHECKPOINT_PAGES` pages, the caller saves the rest.
+    Return the query, indexed with the IDs of all its partitions, and checked
+    against its count.
+    """
+    query = get_query(year, tag)
+    work_list = store["partitions"].get(query)
+    if (
+        bypass_cache
+        or work_list is None
+        # its first page was not saved
+        or query not in store["queries"]
+        or not work_list["pending"]
+        and is_stale(work_list["timestamp"])
+    ):
+        count = probe_query(store, query)
+        work_list = {
+            "timestamp": store["queries"][query]["timestamp"],
+            "count": count,
+            "pending": [[str(year), f"{year}-12-31"]],
+            "done": [],
+        }
+        store["partitions"][query] = work_list
+    since = datetime.datetime.fromisoformat(work_list["timestamp"])
+
+    pending = work_list["pending"]
+    # the pages of the last ranges done before a crash may not be saved
+    for first, last in list(work_list["done"]):
+        if not is_fetched(store, get_range_query(first, last, tag)):
+            work_list["done"].remove([first, last])
+            pending.append([first, last])
+    unsaved = 0
+    while pending:
+        first, last = pending[-1]
+        partition = get_range_query(first, last, tag)
+        count = probe_query(store, partition, since)
+        unsaved += 1
+        ranges: list[list[str]] = []
+        if count > PARTITION_LIMIT:
+            # one more part, as the dates are unevenly spread
+            parts = math.ceil(count / PARTITION_LIMIT) + 1
+            ranges = split_range(first, last, parts)
+        if ranges:
+            print(f"{get_current_time()}|Split {first}..{last} ({count}).")
+            pending.pop()
+            pending += reversed(ranges)
+        else:
+            print(f"{get_current_time()}|Partition {first}..{last} ({count}).")
+            # pending until fetched, an interrupted fetch resumes at its page
+            unsaved = fetch_query(store, partition, False, debug, unsaved)
+            pending.pop()
+            work_list["done"].append([first, last])
+        if unsaved >= CHECKPOINT_PAGES:
+            save_store(store, debug)
+            unsaved = 0
+        save_partitions(store, debug)
+
+    partitions = [
+        store["queries"][get_range_query(first, last, tag)]
+        for first, last in work_list["done"]
+    ]
+    query_index = store["queries"][query]
+    query_index["ids"] = list(
+        dict.fromkeys(
+            query_index["ids"] + [mbid for p in partitions for mbid in p["ids"]]
+        )
+    )
+    # the date ranges are disjoint, so their counts add up
+    reported = sum(p["count"] for p in partitions)
+    if reported != work_list["count"] or len(query_index["ids"]) < reported:
+        print(
+            f"{get_current_time()}|Partitions returned"
+            f" {len(query_index["ids"])} recordings ({reported} reported),"
+            f" out of {work_list["count"]}."
+        )
+    return query
+
+
+def fetch_query(
+    store: MBStore,
+    query: str,
+    bypass_cache: bool,
+    debug: bool,
+    unsaved: int = 0,
+) -> int:
+    """Fetch the missing result pages of a query into the store.
+
+    The store is saved every `CHECKPOINT_PAGES` pages, counting the `unsaved`
+    pages fetched before. Return the pages fetched since the last save.
+    """
+    if bypass_cache or query not in store["queries"]:
+        # the stale timestamp restarts from the first page
+        store["queries"][query] = init_query_index()
+    query_index = store["queries"][query]
+    while True:
+        timestamp = datetime.datetime.fromisoformat(query_index["timestamp"])
+        count = query_index["count"]
+        offset = query_index["offset"] + REQUEST_LIMIT
+
+        if count == -1 or offset < count:
+            r_json = fetch_json_data(query, offset, timestamp)
+            progress = "-/-" if count == -1 else f"{offset}/{count}"
+            print(f"{get_current_time()}|Downloading {progress}.")
+        else:
+            print(f"{get_current_time()}|Download completed.")
+            break
+
+        with trace.span("parse:titles"):
+            added = update_store(store, query, r_json)
+        if added < len(r_json["recordings"]):
+            print(
+                f"{get_current_time()}|Reused"
+                f" {len(r_json["recordings"]) - added} stored recordings."
+            )
+
+        unsaved += 1
+        if unsaved >= CHECKPOINT_PAGES:
+            save_store(store, debug)
+            unsaved = 0
+    return unsaved
 
 
 def get_current_time() -> str:
     return datetime.datetime.now().isoformat(" ", "seconds")
 
 
-def init_json_data() -> MBData:
+def get_query(year: int, tag: str = TAG) -> str:
+    return f"firstreleasedate:{year} AND tag:{tag}"
+
+
+def get_query_file(query: str) -> str:
+    """Name the result file of a query, e.g. `mb_tag_jazz.json`."""
+    return f"mb_{re.sub(r"\W+", "_", query).strip("_").lower()}.json"
+
+
+def get_range_query(first: str, last: str, tag: str = TAG) -> str:
+    return f"firstreleasedate:[{first} TO {last}] AND tag:{tag}"
+
+
+@functools.cache
+def get_session() -> httpclient.Session:
+    return httpclient.Session(
+        timeout=REQUEST_TIMEOUT, rates=[(1, RATE_LIMITING_DELAY)]
+    )
+
+
+def get_titles(store: MBStore, query: str, pattern: str) -> MBData:
+    """Return the distinct titles of a query matching `pattern`."""
+    query_index = store["queries"][query]
+    regex_match = re.compile(pattern, re.I)
+    recordings = store["recordings"]
+    titles = dict.fromkeys(recordings[mbid] for mbid in query_index["ids"])
+    return {
+        "timestamp": query_index["timestamp"],
+        "count": query_index["count"],
+        "offset": query_index["offset"],
+        "recordings": [title for title in titles if regex_match.match(title)],
+    }
+
+
+def init_query_index() -> MBQueryIndex:
     return {
         "timestamp": datetime.datetime(
             1, 1, 1, tzinfo=datetime.UTC
         ).isoformat(),
         "count": -1,
         "offset": 0,
-        "recordings": [],
+        "ids": [],
     }
 
 
+def is_fetched(store: MBStore, query: str) -> bool:
+    """Whether every result page of a query is in the store."""
+    query_index = store["queries"].get(query)
+    return (
+        query_index is not None
+        and query_index["count"] != -1
+        and query_index["offset"] + REQUEST_LIMIT >= query_index["count"]
+    )
+
+
+def is_stale(timestamp: str) -> bool:
+    now = datetime.datetime.now(tz=datetime.UTC)
+    age = now - datetime.datetime.fromisoformat(timestamp)
+    return age > datetime.timedelta(days=MAX_CACHE_LIVE)
+
+
 def load_json_data(file: str) -> MBData:
     json_data: MBData = {}  # type: ignore
     if pathlib.Path(file).exists():
@@ -87,36 +315,142 @@ def load_json_data(file: str) -> MBData:
     return json_data
 
 
+def load_store(
+    file: str = STORE_FILE, partitions_file: str = PARTITIONS_FILE
+) -> MBStore:
+    store: MBStore = {"recordings": {}, "queries": {}, "partitions": {}}
+    if pathlib.Path(file).exists():
+        with trace.span("cache:read"), open(file, encoding="utf-8") as f:
+            store = json.load(f)
+    # formerly saved with the recordings
+    store.setdefault("partitions", {})
+    if pathlib.Path(partitions_file).exists():
+        with open(partitions_file, encoding="utf-8") as f:
+            store["partitions"] = json.load(f)
+    return store
+
+
+def normalize_title(title: str) -> str:
+    """Strip parenthesized parts and normalize case and apostrophes."""
+    title = REGEX_PARENTHESIZED.sub("", title).strip(" /").lower()
+    return title.replace("\u2019", "'")
+
+
+def probe_query(
+    store: MBStore,
+    query: str,
+    since: datetime.datetime = datetime.datetime.min.replace(
+        tzinfo=datetime.UTC
+    ),
+) -> int:
+    """Return the count of a query, from its first page if not fetched since
+    `since`."""
+    query_index = store["queries"].get(query)
+    if (
+        query_index is None
+        or query_index["count"] == -1
+        or datetime.datetime.fromisoformat(query_index["timestamp"]) < since
+        or is_stale(query_index["timestamp"])
+    ):
+        store["queries"][query] = init_query_index()
+        now = datetime.datetime.now(tz=datetime.UTC)
+        r_json = fetch_json_data(query, 0, now)
+        with trace.span("parse:titles"):
+            update_store(store, query, r_json)
+    return store["queries"][query]["count"]
+
+
 def save_json_data(file: str, json_data: MBData, debug: bool):
     indent = 2 if debug else None
-    with open(file, "w", encoding="utf-8") as f:
+    with trace.span("cache:write"), open(file, "w", encoding="utf-8") as f:
         json.dump(json_data, f, indent=indent)
 
 
-def update_json_data(
-    current_data: MBData, new_data: MBRecordingResponse, pattern: str
-) -> MBData:
-    if len(new_data) == 0:
-        return current_data
+def save_partitions(store: MBStore, debug: bool, file: str = PARTITIONS_FILE):
+    """Save the work lists, without the bulk of the store."""
+    indent = 2 if debug else None
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump(store["partitions"], f, indent=indent)
 
-    merged_data: MBData = {}  # type: ignore
-    merged_data["timestamp"] = new_data["created"]
-    merged_data["count"] = new_data["count"]
-    merged_data["offset"] = new_data["offset"]
-    merged_data["recordings"] = current_data["recordings"]
 
-    regex_sub = re.compile(r"\(.+\)")
-    regex_match = re.compile(pattern, re.I)
-    recordings = merged_data["recordings"]
+def save_store(store: MBStore, debug: bool, file: str = STORE_FILE):
+    """Save the recordings and the query indexes, see `save_partitions`."""
+    indent = 2 if debug else None
+    with trace.span("cache:write"), open(file, "w", encoding="utf-8") as f:
+        json.dump(
+            {"recordings": store["recordings"], "queries": store["queries"]},
+            f,
+            indent=indent,
+        )
+
+
+def split_range(first: str, last: str, parts: int) -> list[list[str]]:
+    """Split a release date range in up to `parts` ranges of as many days.
+
+    The dates are compared as strings, and `first` may be a year or a month:
+    `[1990 TO 1990-12-31]` also holds the dates only known to the year or the
+    month. So does a range starting on the first day of a month.
+    """
+    start = datetime.date.fromisoformat(f"{first}-01-01"[:10])
+    days = (datetime.date.fromisoformat(last) - start).days + 1
+    parts = min(parts, days)
+    if parts < 2:
+        return []
+    starts = [
+        start + datetime.timedelta(days=days * i // parts)
+        for i in range(1, parts)
+    ]
+    firsts = [first] + [
+        date.isoformat()[:7] if date.day == 1 else date.isoformat()
+        for date in starts
+    ]
+    lasts = [(date - datetime.timedelta(days=1)).isoformat() for date in starts]
+    return [[a, b] for a, b in zip(firsts, lasts + [last])]
+
+
+def update_store(
+    store: MBStore, query: str, new_data: MBRecordingResponse
+) -> int:
+    """Add a result page to the query index and the shared recordings.
+
+    Return the number of recordings new to the store, the others were stored
+    by an overlapping query and are not normalized again.
+    """
+    query_index = store["queries"][query]
+    query_index["timestamp"] = new_data["created"]
+    query_index["count"] = new_data["count"]
+    query_index["offset"] = new_data["offset"]
+
+    recordings = store["recordings"]
+    ids = set(query_index["ids"])
+    added = 0
     for recording in new_data["recordings"]:
-        title = recording["title"]
-        title = regex_sub.sub("", title).strip(" /").lower()
-        title = title.replace("\u2019", "'")
+        mbid = recording.get("id")
+        if mbid is None:
+            continue
+        if mbid not in recordings:
+            recordings[mbid] = normalize_title(recording["title"])
+            added += 1
+        if mbid not in ids:
+            ids.add(mbid)
+            query_index["ids"].append(mbid)
 
-        if regex_match.match(title) and title not in recordings:
-            recordings.append(title)
+    return added
 
-    return merged_data
+
+def load_index_data(index_file: str, year: int, pattern: str) -> MBData:
+    """Answer a query from a local dump index, see `mbdump`."""
+    import mbdump  # pylint: disable=import-outside-toplevel
+
+    titles = mbdump.lookup(index_file, year, TAG)
+    regex_match = re.compile(pattern, re.I)
+    recordings = [title for title in titles if regex_match.match(title)]
+    return {
+        "timestamp": datetime.datetime.now(tz=datetime.UTC).isoformat(),
+        "count": len(titles),
+        "offset": len(titles),
+        "recordings": recordings,
+    }
 
 
 def main(
@@ -124,32 +458,47 @@ def main(
     pattern: str = r"^[a-z]{4}$",
     bypass_cache: bool = False,
     debug: bool = False,
+    index_file: str | None = None,
+    query: str | None = None,
+    partition: bool = False,
 ):
-    filename = f"mb_{year}.json"
-    print(f"{get_current_time()}|Download data for year {year}.")
-
-    mb_data = load_json_data(filename)
-    if len(mb_data) == 0:
-        mb_data = init_json_data()
-
-    while True:
-        timestamp = datetime.datetime.fromisoformat(mb_data["timestamp"])
-        count = mb_data["count"]
-        offset = mb_data["offset"] + REQUEST_LIMIT
-
-        if count == -1 or offset < count:
-            r_json = fetch_json_data(year, offset, timestamp, bypass_cache)
-            progress = "-/-" if count == -1 else f"{offset}/{count}"
-            print(f"{get_current_time()}|Downloading {progress}.")
-            time.sleep(RATE_LIMITING_DELAY)
+    """Save the titles of a query matching `pattern`.
+
+    The query defaults to the rock recordings first released in `year`, saved
+    to `mb_<year>.json`, any other Lucene query of the recording search is
+    saved to `get_query_file(query)`. With `partition`, the year query is
+    fetched as release date ranges, see `fetch_partitions`.
+    """
+    filename = f"mb_{year}.json" if query is None else get_query_file(query)
+
+    if index_file is not None:
+        if query is not None:
+            raise ValueError("The dump index only answers year queries.")
+        print(f"{get_current_time()}|Load data for year {year} from index.")
+        save_json_data(
+            filename, load_index_data(index_file, year, pattern), debug
+        )
+        print(f"{get_current_time()}|Load completed.")
+        return
+
+    if partition and query is not None:
+        raise ValueError("Only year queries are partitioned.")
+    store = load_store()
+    try:
+        if partition:
+            print(f"{get_current_time()}|Download data for year {year}.")
+            query = fetch_partitions(store, year, bypass_cache, debug)
         else:
-            r_json: MBRecordingResponse = {}  # type: ignore
-            print(f"{get_current_time()}|Download completed.")
-            break
-
-        mb_data = update_json_data(mb_data, r_json, pattern)
-
-        save_json_data(filename, mb_data, debug)
+            if query is None:
+                query = get_query(year)
+            print(f"{get_current_time()}|Download data for query {query}.")
+            fetch_query(store, query, bypass_cache, debug)
+    finally:
+        # the pages fetched since the last checkpoint, even if interrupted
+        save_store(store, debug)
+        if store["partitions"]:
+            save_partitions(store, debug)
+    save_json_data(filename, get_titles(store, query, pattern), debug)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""Import a local Music Brainz dump into a year/tag inverted index.
+
+The input is either a Music Brainz JSON dump (one recording per line,
+optionally compressed or packed in the `recording.tar.xz` archive) or any file
+in the same shape as `MBRecordingResponse`. The index is a SQLite database, so
+a lookup only reads the postings of its year and tag.
+"""
+
+import argparse
+import bz2
+import contextlib
+import datetime
+import gzip
+import io
+import itertools
+import json
+import lzma
+import pathlib
+import sqlite3
+import tarfile
+from collections.abc import Iterable, Iterator
+from typing import IO, cast
+
+import fetchmb
+
+INDEX_FILE = "mb_index.sqlite"
+BATCH_SIZE = 10000  # recordings per transaction
+
+
+class ExtractedArgs:
+    dump: list[str]
+    output: str
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("dump", nargs="+", help="Music Brainz dump files.")
+    ap.add_argument(
+        "-o", "--output", default=INDEX_FILE, help="Output index file."
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def open_text(file: str) -> IO[str]:
+    """Open a plain or compressed text file, guessed from its extension."""
+    match pathlib.Path(file).suffix:
+        case ".gz":
+            return gzip.open(file, "rt", encoding="utf-8")
+        case ".bz2":
+            return bz2.open(file, "rt", encoding="utf-8")
+        case ".xz":
+            return lzma.open(file, "rt", encoding="utf-8")
+        case _:
+            return open(file, encoding="utf-8")
+
+
+def iter_lines(file: str) -> Iterator[str]:
+    """Stream the lines of a dump file without loading it in memory."""
+    if ".tar" in pathlib.Path(file).suffixes:
+        with tarfile.open(file, "r|*") as tar:
+            for member in tar:
+                if not member.isfile() or member.name.rsplit("/")[-1] not in (
+                    "recording",
+                    "recording.json",
+                ):
+                    continue
+                f = tar.extractfile(member)
+                if f is None:
+                    continue
+                yield from io.TextIOWrapper(f, encoding="utf-8")
+        return
+    with open_text(file) as f:
+        yield from f
+
+
+def iter_recordings(file: str) -> Iterator[fetchmb.MBRecording]:
+    """Stream the recordings of a dump file.
+
+    Each line may hold either a recording or a whole `MBRecordingResponse`.
+    A pretty-printed response spanning several lines is loaded at once, if
+    its first line is not JSON. A later line that is not JSON is skipped.
+    """
+    lines = iter_lines(file)
+    first = True
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            if not first:
+                print(f"Skip line {number} of {file}, not JSON.")
+                continue
+            # not JSON lines, read the whole document
+            data = json.loads("\n".join([line, *lines]))
+        first = False
+        if "recordings" in data:
+            yield from cast(fetchmb.MBRecordingResponse, data)["recordings"]
+        else:
+            yield cast(fetchmb.MBRecording, data)
+
+
+def open_index(file: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file)
+    connection.executescript(
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        "CREATE TABLE IF NOT EXISTS titles ("
+        " id INTEGER PRIMARY KEY, title TEXT NOT NULL UNIQUE);"
+        "CREATE TABLE IF NOT EXISTS postings ("
+        " year TEXT NOT NULL,"
+        " tag TEXT NOT NULL,"
+        " title_id INTEGER NOT NULL,"
+        " PRIMARY KEY (year, tag, title_id)"
+        ") WITHOUT ROWID;"
+    )
+    return connection
+
+
+def build_index(file: str, recordings: Iterable[fetchmb.MBRecording]):
+    """Write the postings of `recordings` to a new index `file`."""
+    pathlib.Path(file).unlink(missing_ok=True)
+    title_ids: dict[str, int] = {}
+    with contextlib.closing(open_index(file)) as connection:
+        iterator = iter(recordings)
+        while batch := list(itertools.islice(iterator, BATCH_SIZE)):
+            titles: list[tuple[int, str]] = []
+            postings: list[tuple[str, str, int]] = []
+            for recording in batch:
+                year = recording.get("first-release-date", "")[:4]
+                tags = recording.get("tags", [])
+                if not (year and tags):
+                    continue
+                title = fetchmb.normalize_title(recording["title"])
+                if title not in title_ids:
+                    title_ids[title] = len(title_ids)
+                    titles.append((title_ids[title], title))
+                postings.extend(
+                    (year, tag["name"].lower(), title_ids[title])
+                    for tag in tags
+                )
+            with connection:
+                connection.executemany(
+                    "INSERT INTO titles VALUES (?, ?)", titles
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO postings VALUES (?, ?, ?)", postings
+                )
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('created', ?)",
+                (datetime.datetime.now(tz=datetime.UTC).isoformat(),),
+            )
+
+
+def lookup(file: str, year: int, tag: str) -> list[str]:
+    """Return the normalized titles first released in `year` with `tag`."""
+    with contextlib.closing(open_index(file)) as connection:
+        rows = connection.execute(
+            "SELECT title FROM postings JOIN titles ON titles.id = title_id"
+            " WHERE year = ? AND tag = ? ORDER BY title_id",
+            (str(year), tag.lower()),
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def count(file: str) -> tuple[int, int]:
+    """Return the number of titles and years of an index."""
+    with contextlib.closing(open_index(file)) as connection:
+        (titles,) = connection.execute("SELECT count(*) FROM titles").fetchone()
+        (years,) = connection.execute(
+            "SELECT count(DISTINCT year) FROM postings"
+        ).fetchone()
+    return titles, years
+
+
+def main(dumps: list[str], output: str = INDEX_FILE):
+    recordings = (r for dump in dumps for r in iter_recordings(dump))
+    print(f"{fetchmb.get_current_time()}|Import {len(dumps)} dump files.")
+    build_index(output, recordings)
+    titles, years = count(output)
+    print(
+        f"{fetchmb.get_current_time()}|Indexed {titles} titles"
+        f" in {years} years."
+    )
+
+
+if __name__ == "__main__":
+    args: ExtractedArgs = parse_args()
+    main(args.dump, args.output)
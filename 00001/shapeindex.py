@@ -0,0 +1,155 @@
+"""Index titles by word shape and solve several puzzle patterns together.
+
+A shape signature replaces every letter of a normalized title by `a` and
+keeps the other characters, so `the wanted` and `the [a-z]{6}` both have the
+signature `aaa aaaaaa`. Looking up a pattern is then a hash probe followed by
+a check of its known letters.
+"""
+
+import math
+import re
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple
+
+import fetchmb
+
+REGEX_LETTER = re.compile("[a-z]")
+# an escaped letter or digit is a class (`\d`, `\w`...) or a reference, not
+# a literal, so it is not matched and the pattern falls back to a full scan
+REGEX_PATTERN_TOKEN = re.compile(
+    r"\[a-z\](?:\{(\d+)\})?|\\([^a-z0-9])|([^\\\[\]{}()*+?.|^$])"
+)
+
+# Two characters are equal: ((constraint, position), (constraint, position)).
+Link = tuple[tuple[int, int], tuple[int, int]]
+
+
+class Shape(NamedTuple):
+    signature: str
+    letters: tuple[tuple[int, str], ...]
+
+
+class Solution(NamedTuple):
+    score: float
+    titles: tuple[str, ...]
+
+
+def get_signature(title: str) -> str:
+    return REGEX_LETTER.sub("a", title)
+
+
+def parse_pattern(pattern: str) -> Shape | None:
+    """Convert an anchored pattern into its shape.
+
+    Only literal characters, escaped punctuation and `[a-z]`, optionally
+    repeated with `{n}`, are supported. Return `None` for any other pattern,
+    including the classes `\\d`, `\\s` and `\\w`.
+    """
+    pattern = pattern.lower()
+    if not (pattern.startswith("^") and pattern.endswith("$")):
+        return None
+    body = pattern[1:-1]
+    signature: list[str] = []
+    letters: list[tuple[int, str]] = []
+    pos = 0
+    while pos < len(body):
+        m = REGEX_PATTERN_TOKEN.match(body, pos)
+        if m is None:
+            return None
+        repeat, escaped, literal = m.groups()
+        if escaped is None and literal is None:
+            signature.append("a" * int(repeat or 1))
+        else:
+            char = escaped or literal
+            if REGEX_LETTER.fullmatch(char):
+                letters.append((len("".join(signature)), char))
+            signature.append(get_signature(char))
+        pos = m.end()
+    return Shape("".join(signature), tuple(letters))
+
+
+class ShapeIndex:
+    """Titles grouped by shape signature, with a weight per title."""
+
+    def __init__(self, titles: Iterable[str] = ()):
+        self.shapes: dict[str, dict[str, float]] = {}
+        for title in titles:
+            self.add(title)
+
+    @classmethod
+    def from_mb_data(cls, file: str) -> "ShapeIndex":
+        return cls(fetchmb.load_json_data(file).get("recordings", []))
+
+    def add(self, title: str, weight: float = 1):
+        title = fetchmb.normalize_title(title)
+        titles = self.shapes.setdefault(get_signature(title), {})
+        titles[title] = titles.get(title, 0) + weight
+
+    def lookup(self, pattern: str) -> dict[str, float]:
+        """Return the titles matching `pattern`, with their weights."""
+        shape = parse_pattern(pattern)
+        if shape is None:
+            # unsupported pattern, scan every title
+            regex_match = re.compile(pattern, re.I)
+            return {
+                title: weight
+                for titles in self.shapes.values()
+                for title, weight in titles.items()
+                if regex_match.match(title)
+            }
+        return {
+            title: weight
+            for title, weight in self.shapes.get(shape.signature, {}).items()
+            if all(title[i] == char for i, char in shape.letters)
+        }
+
+
+def solve(
+    constraints: Sequence[tuple[ShapeIndex, str]],
+    links: Sequence[Link] = (),
+    limit: int = 10,
+) -> list[Solution]:
+    """Find titles satisfying every `(index, pattern)` constraint at once.
+
+    `links` ties characters of different answers together. Solutions are
+    ranked by the product of the title weights, best first.
+    """
+    candidates = [
+        sorted(index.lookup(pattern).items(), key=lambda x: -x[1])
+        for index, pattern in constraints
+    ]
+    # assign the most constrained answer first
+    order = sorted(range(len(constraints)), key=lambda i: len(candidates[i]))
+    rank = {c: r for r, c in enumerate(order)}
+    # links checked once both of their answers are assigned
+    checks: list[list[Link]] = [[] for _ in order]
+    for link in links:
+        (a, _), (b, _) = link
+        checks[max(rank[a], rank[b])].append(link)
+
+    solutions: list[Solution] = []
+    assigned: list[str] = [""] * len(constraints)
+
+    def is_linked(link: Link) -> bool:
+        (a, pos_a), (b, pos_b) = link
+        title_a, title_b = assigned[a], assigned[b]
+        return (
+            pos_a < len(title_a)
+            and pos_b < len(title_b)
+            and title_a[pos_a] == title_b[pos_b]
+        )
+
+    def search(depth: int, log_score: float):
+        if depth == len(order):
+            solutions.append(Solution(math.exp(log_score), tuple(assigned)))
+            return
+        c = order[depth]
+        for title, weight in candidates[c]:
+            assigned[c] = title
+            if all(is_linked(link) for link in checks[depth]):
+                search(depth + 1, log_score + math.log(weight))
+        assigned[c] = ""
+
+    search(0, 0)
+    solutions.sort(key=lambda s: -s.score)
+    return solutions[:limit]
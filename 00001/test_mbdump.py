@@ -0,0 +1,74 @@
+"""Tests of the dump index, on a tiny dump.
+"""
+
+import contextlib
+import io
+import json
+import pathlib
+import tempfile
+import unittest
+
+import mbdump
+
+RECORDINGS = [
+    {
+        "title": "Love Song",
+        "first-release-date": "1990-05-01",
+        "tags": [{"count": 1, "name": "Rock"}, {"count": 1, "name": "pop"}],
+    },
+    {
+        "title": "Wild Train",
+        "first-release-date": "1990",
+        "tags": [{"count": 2, "name": "rock"}],
+    },
+    {
+        "title": "Blue Moon",
+        "first-release-date": "1991-01-01",
+        "tags": [{"count": 1, "name": "rock"}],
+    },
+    # without a date or tags, not indexed
+    {"title": "Gold", "tags": [{"count": 1, "name": "rock"}]},
+    {"title": "Dark Star", "first-release-date": "1990-02-02"},
+]
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.folder = pathlib.Path(directory.name)
+
+    def build(self, lines: list[str]) -> str:
+        dump = self.folder / "recording.json"
+        dump.write_text("\n".join(lines), encoding="utf-8")
+        index = str(self.folder / mbdump.INDEX_FILE)
+        mbdump.build_index(index, mbdump.iter_recordings(str(dump)))
+        return index
+
+    def test_lookup(self):
+        index = self.build([json.dumps(r) for r in RECORDINGS])
+        self.assertEqual(
+            mbdump.lookup(index, 1990, "ROCK"), ["love song", "wild train"]
+        )
+        self.assertEqual(mbdump.lookup(index, 1990, "pop"), ["love song"])
+        self.assertEqual(mbdump.lookup(index, 1991, "rock"), ["blue moon"])
+        self.assertEqual(mbdump.lookup(index, 1992, "rock"), [])
+        self.assertEqual(mbdump.count(index), (3, 2))
+
+    def test_response_document(self):
+        response = {"count": 3, "offset": 0, "recordings": RECORDINGS[:3]}
+        index = self.build(json.dumps(response, indent=2).splitlines())
+        self.assertEqual(
+            mbdump.lookup(index, 1990, "rock"), ["love song", "wild train"]
+        )
+
+    def test_bad_line(self):
+        lines = [json.dumps(r) for r in RECORDINGS]
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            index = self.build([lines[0], "{not json", *lines[1:]])
+        self.assertIn("Skip line 2", stdout.getvalue())
+        self.assertEqual(mbdump.count(index), (3, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
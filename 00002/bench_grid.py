@@ -0,0 +1,109 @@
+"""Compare the projection grid detector with the Hough transform
+"""
+# import the necessary packages
+import argparse
+import pathlib
+import time
+from collections.abc import Callable
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+import grid
+
+DATA_DIR = pathlib.Path(__file__).resolve().parent / "data"
+TOLERANCE = 2  # pixels, for lines to match
+
+Lines = tuple[list[int], list[int]]  # horizontal y, vertical x
+
+
+class ExtractedArgs:
+    repeat: int
+
+
+def detect_hough(gray: MatLike) -> Lines:
+    """The detector of `test.py`: Canny, HoughLinesP and overlapping_filter."""
+    canny = cv2.Canny(gray, 50, 150)
+    lines = cv2.HoughLinesP(canny, 1, np.pi / 180, 50, None, 350, 6)
+    horizontal: list[int] = []
+    vertical: list[int] = []
+    for x1, y1, x2, y2 in lines.reshape(-1, 4) if lines is not None else []:
+        if x1 == x2:
+            vertical.append(int(x1))
+        elif y1 == y2:
+            horizontal.append(int(y1))
+
+    def overlapping_filter(positions: list[int]) -> list[int]:
+        positions = sorted(positions)
+        return [
+            p
+            for i, p in enumerate(positions)
+            if i == 0 or p - positions[i - 1] > 5
+        ]
+
+    return overlapping_filter(horizontal), overlapping_filter(vertical)
+
+
+def detect_projection(gray: MatLike) -> Lines:
+    rows, columns = grid.detect_grid(gray)
+    return [grid.get_center(r) for r in rows], [
+        grid.get_center(c) for c in columns
+    ]
+
+
+def count_matches(positions: list[int], others: list[int]) -> int:
+    return sum(any(abs(p - o) <= TOLERANCE for o in others) for p in positions)
+
+
+def time_detector(
+    detector: Callable[[MatLike], Lines], gray: MatLike, repeat: int
+) -> tuple[Lines, float]:
+    """Return the lines and the best time in milliseconds."""
+    best = float("inf")
+    lines: Lines = ([], [])
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = detector(gray)
+        best = min(best, time.perf_counter() - start)
+    return lines, best * 1000
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--repeat", type=int, default=5, help="runs per image, best kept"
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def main(repeat: int):
+    print(
+        f"{"image":<16}{"hough ms":>10}{"proj ms":>10}"
+        f"{"hough h/v":>12}{"proj h/v":>12}{"matched":>10}"
+    )
+    totals = [0.0, 0.0]
+    for file in sorted(DATA_DIR.glob("*.png")):
+        gray = cv2.imread(str(file), cv2.IMREAD_GRAYSCALE)
+        hough, hough_ms = time_detector(detect_hough, gray, repeat)
+        projection, projection_ms = time_detector(
+            detect_projection, gray, repeat
+        )
+        totals[0] += hough_ms
+        totals[1] += projection_ms
+        matched = count_matches(hough[0], projection[0]) + count_matches(
+            hough[1], projection[1]
+        )
+        print(
+            f"{file.name:<16}{hough_ms:>10.2f}{projection_ms:>10.2f}"
+            f"{f"{len(hough[0])}/{len(hough[1])}":>12}"
+            f"{f"{len(projection[0])}/{len(projection[1])}":>12}"
+            f"{f"{matched}/{len(hough[0]) + len(hough[1])}":>10}"
+        )
+    print(f"{"total":<16}{totals[0]:>10.2f}{totals[1]:>10.2f}")
+
+
+if __name__ == "__main__":
+    args: ExtractedArgs = parse_args()
+    main(args.repeat)
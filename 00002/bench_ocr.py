@@ -0,0 +1,95 @@
+"""Compare the multi-scale cascade of Tesseract with the single heavy pass
+"""
+# import the necessary packages
+import argparse
+import pathlib
+import sys
+import time
+from collections.abc import Callable
+
+import cv2
+import pytesseract
+from cv2.typing import MatLike
+
+import steam_key_ocr
+
+DATA_DIR = pathlib.Path(__file__).resolve().parent / "data"
+
+
+class ExtractedArgs:
+    repeat: int
+
+
+def read_single_pass(gray: MatLike) -> list[str]:
+    text = steam_key_ocr.recognize(steam_key_ocr.preprocess(gray))
+    return [line for line in text.splitlines() if line.strip()]
+
+
+def normalize(lines: list[str]) -> set[str]:
+    """The key lines, without the spaces the OCR may add or drop."""
+    return {
+        "".join(line.split())
+        for line in lines
+        if steam_key_ocr.KEY_PATTERN.search(line)
+    }
+
+
+def time_reader(
+    reader: Callable[[MatLike], list[str]], gray: MatLike, repeat: int
+) -> tuple[list[str], float]:
+    """Return the lines and the best time in milliseconds."""
+    best = float("inf")
+    lines: list[str] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = reader(gray)
+        best = min(best, time.perf_counter() - start)
+    return lines, best * 1000
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--repeat", type=int, default=1, help="runs per image, best kept"
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def main(repeat: int):
+    """Time both readers on `data`, and count their correct keys.
+
+    The keys are checked against the labels of the image when there are,
+    otherwise the cascade is checked against the single pass.
+    """
+    print(
+        f"{"image":<16}{"single ms":>10}{"cascade ms":>12}"
+        f"{"single":>10}{"cascade":>10}"
+    )
+    totals = [0.0, 0.0]
+    for file in sorted(DATA_DIR.glob("*.png")):
+        gray = cv2.imread(str(file), cv2.IMREAD_GRAYSCALE)
+        single, single_ms = time_reader(read_single_pass, gray, repeat)
+        cascade, cascade_ms = time_reader(steam_key_ocr.read_keys, gray, repeat)
+        totals[0] += single_ms
+        totals[1] += cascade_ms
+        labels = file.with_suffix(".txt")
+        expected = normalize(
+            labels.read_text(encoding="utf-8").splitlines()
+            if labels.is_file()
+            else single
+        )
+        print(
+            f"{file.name:<16}{single_ms:>10.0f}{cascade_ms:>12.0f}"
+            f"{f"{len(normalize(single) & expected)}/{len(expected)}":>10}"
+            f"{f"{len(normalize(cascade) & expected)}/{len(expected)}":>10}"
+        )
+    print(f"{"total":<16}{totals[0]:>10.0f}{totals[1]:>12.0f}")
+
+
+if __name__ == "__main__":
+    args: ExtractedArgs = parse_args()
+    try:
+        main(args.repeat)
+    except pytesseract.TesseractNotFoundError:
+        sys.exit("Tesseract is not installed.")
@@ -0,0 +1,480 @@
+"""Recognize Steam keys with glyph templates
+"""
+# import the necessary packages
+import argparse
+import hashlib
+import pathlib
+import time
+from collections.abc import Sequence
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike
+
+import grid
+
+FOLDER = pathlib.Path(__file__).resolve().parent
+DATA_DIR = FOLDER / "data"
+TEMPLATES_FILE = FOLDER / "glyph_templates.npz"
+
+TEXT_THRESHOLD = 160
+GLYPH_HEIGHT = 19
+GLYPH_WIDTH = 14
+ROW_PITCH = GLYPH_HEIGHT + 1  # from a rule to the next
+INK_THRESHOLD = 240
+GRAY_THRESHOLD = 64
+BLURRED_GRAY = 0.75  # above, the ink of a sheet is blurred, as resized
+SHARPEN_AMOUNT = 0.75
+SHARPEN_SIGMA = 1
+WIDTH_TOLERANCE = 1
+KERNING = 2  # columns touching glyphs may share or leave out, as `WV`
+MIN_SCORE = 0.85  # below, ask Tesseract
+KEY_COLUMNS = 5  # =, key, +, F, key end
+TESSERACT_OPTIONS = (
+    "--psm 10 -c tessedit_char_whitelist="
+    "+-0123456789=ABCDEFGHIJKLMNOPQRSTUVWXYZ|"
+)
+DIGITS = "0123456789"
+KEY_CHARS = DIGITS + "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# the formats of the key columns, as the allowed chars of each glyph
+CELL_FORMATS: tuple[tuple[tuple[str, ...], ...], ...] = (
+    (("=",),),
+    ((KEY_CHARS,) * 5 + ("-",) + (KEY_CHARS,) * 5 + ("-",),),
+    (("+",),),
+    (("F", DIGITS), ("F", DIGITS, DIGITS)),
+    ((KEY_CHARS,) * 5,),
+)
+
+
+class ExtractedArgs:
+    images: list[str]
+    learn: bool
+
+
+class Templates(NamedTuple):
+    chars: npt.NDArray[np.str_]
+    vectors: npt.NDArray[np.float32]  # normalized, one row per char
+    widths: npt.NDArray[np.int_]
+
+
+class Glyph(NamedTuple):
+    char: str
+    score: float
+
+
+Span = tuple[int, int, Glyph]  # first and past the last column of a glyph
+
+
+class Cell(NamedTuple):
+    ink: npt.NDArray[np.float32]
+    mask: npt.NDArray[np.bool_]
+
+
+def is_blurred(gray: MatLike) -> bool:
+    """Tell if most of the ink of a sheet is gray, not near black."""
+    ink = gray < INK_THRESHOLD
+    gray_ink = ink & (gray > GRAY_THRESHOLD)
+    return int(gray_ink.sum()) > BLURRED_GRAY * int(ink.sum())
+
+
+def get_cells(gray: MatLike) -> list[list[Cell]]:
+    """Split a grayscale screenshot of a sheet into its cells, by row.
+
+    A sheet taken at another scale is resized row by row, from the distance
+    between the centers of its rules to `ROW_PITCH`, so the templates fit it.
+    Its rules are thicker, or blurred: each is taken as one pixel at the scale
+    of the templates, around its center. If its ink is blurred, as by a
+    linear resize, the resized rows are sharpened.
+    """
+    rows, columns = grid.detect_grid(gray)
+    sharpen = is_blurred(gray)
+    cells: list[list[Cell]] = []
+    for top, bottom in zip(rows, rows[1:]):
+        scale = 2 * ROW_PITCH / (sum(bottom) - sum(top))
+        y0, y1 = (round(sum(rule) / 2 - 0.5 / scale) for rule in (top, bottom))
+        row = gray[y0:y1].copy()
+        # blank the rules, lest the resizing blur them into the cells
+        row[: top[1] - y0] = 255
+        row[bottom[0] - y0 :] = 255
+        for x0, x1 in columns:
+            row[:, x0:x1] = 255
+        if scale != 1:
+            row = cv2.resize(
+                row,
+                (round(row.shape[1] * scale), ROW_PITCH),
+                interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC,
+            )
+            if sharpen:
+                blurred = cv2.GaussianBlur(row, (0, 0), SHARPEN_SIGMA)
+                row = cv2.addWeighted(
+                    row, 1 + SHARPEN_AMOUNT, blurred, -SHARPEN_AMOUNT, 0
+                )
+        ink = (255 - row[1:].astype(np.float32)) / 255
+        text = row[1:] < TEXT_THRESHOLD
+        xs = [round(sum(rule) / 2 * scale - 0.5) for rule in columns]
+        cells.append(
+            [
+                Cell(ink[:, x0 + 1 : x1], text[:, x0 + 1 : x1])
+                for x0, x1 in zip(xs, xs[1:])
+            ]
+        )
+    return cells
+
+
+def get_segments(mask: npt.NDArray[np.bool_]) -> list[tuple[int, int]]:
+    """Split the columns of a cell into runs of ink."""
+    has_ink = np.r_[0, mask.any(axis=0).astype(np.int8), 0]
+    bounds = np.flatnonzero(np.diff(has_ink))
+    return [(int(a), int(b)) for a, b in bounds.reshape(-1, 2)]
+
+
+def get_features(
+    ink: npt.NDArray[np.float32], spans: list[tuple[int, int]]
+) -> npt.NDArray[np.float32]:
+    """Center each span of columns in a glyph box and normalize it."""
+    features = np.zeros((len(spans), GLYPH_HEIGHT, GLYPH_WIDTH), np.float32)
+    if ink.shape[0] != GLYPH_HEIGHT:
+        ink = cv2.resize(
+            ink, (ink.shape[1], GLYPH_HEIGHT), interpolation=cv2.INTER_AREA
+        )
+    for i, (a, b) in enumerate(spans):
+        width = min(b - a, GLYPH_WIDTH)
+        left = (GLYPH_WIDTH - width) // 2
+        features[i, :, left : left + width] = ink[:, a : a + width]
+    features = features.reshape(len(spans), -1)
+    features -= features.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-6)
+
+
+def learn_templates(images: list[pathlib.Path]) -> Templates:
+    """Average the glyphs of the labeled `images` by char.
+
+    The label of `image.png` is `image.txt`, with the key columns of each row,
+    as `= GMG0K-L9Z9B- + F11|A9C6P`. Only the cells split into as many
+    glyphs as their label has chars are learned from.
+    """
+    samples: dict[str, list[npt.NDArray[np.float32]]] = {}
+    widths: dict[str, list[int]] = {}
+    for image in images:
+        labels = image.with_suffix(".txt").read_text(encoding="utf-8")
+        gray = cv2.imread(str(image), cv2.IMREAD_GRAYSCALE)
+        for cells, label in zip(get_cells(gray), labels.splitlines()):
+            texts = label.replace("|", " ").split()
+            for cell, text in zip(cells[-KEY_COLUMNS:], texts):
+                spans = get_segments(cell.mask)
+                if len(spans) != len(text):
+                    continue
+                for char, feature, (a, b) in zip(
+                    text, get_features(cell.ink, spans), spans
+                ):
+                    samples.setdefault(char, []).append(feature)
+                    widths.setdefault(char, []).append(b - a)
+    chars = sorted(samples)
+    vectors = np.array([np.mean(samples[c], axis=0) for c in chars])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return Templates(
+        np.array(chars),
+        vectors.astype(np.float32),
+        np.array([int(np.median(widths[c])) for c in chars]),
+    )
+
+
+def get_digest(images: list[pathlib.Path]) -> str:
+    """Hash the labeled `images` and their labels."""
+    digest = hashlib.sha256()
+    for image in images:
+        for file in (image, image.with_suffix(".txt")):
+            digest.update(file.name.encode())
+            digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+def load_templates(learn: bool = False) -> Templates:
+    """Load the templates, learning them from `data/*.txt` if needed.
+
+    They are learned again when the labeled images have changed since.
+    """
+    images = [
+        label.with_suffix(".png") for label in sorted(DATA_DIR.glob("*.txt"))
+    ]
+    digest = get_digest(images)
+    if not learn and TEMPLATES_FILE.is_file():
+        with np.load(TEMPLATES_FILE) as npz:
+            if "digest" in npz and str(npz["digest"]) == digest:
+                return Templates(npz["chars"], npz["vectors"], npz["widths"])
+    templates = learn_templates(images)
+    np.savez_compressed(TEMPLATES_FILE, digest=digest, **templates._asdict())
+    return templates
+
+
+def fits(glyphs: list[Span], chars: Sequence[str]) -> bool:
+    return len(glyphs) == len(chars) and all(
+        glyph.char in allowed for (_, _, glyph), allowed in zip(glyphs, chars)
+    )
+
+
+def get_candidates(
+    start: int, stop: int, templates: Templates
+) -> list[tuple[int, int]]:
+    """List the spans of `start:stop` as wide as a template, or about."""
+    return [
+        (a, a + w)
+        for w in range(
+            max(1, templates.widths.min() - WIDTH_TOLERANCE),
+            templates.widths.max() + WIDTH_TOLERANCE + 1,
+        )
+        for a in range(start, stop - w + 1)
+    ]
+
+
+def get_scores(
+    ink: npt.NDArray[np.float32],
+    candidates: list[tuple[int, int]],
+    templates: Templates,
+) -> npt.NDArray[np.float32]:
+    """Score every candidate span against every template at once."""
+    scores = get_features(ink, candidates) @ templates.vectors.T
+    # a glyph of the wrong width does not count
+    spans = np.array(candidates)
+    too_far = (
+        np.abs((spans[:, 1] - spans[:, 0])[:, None] - templates.widths)
+        > WIDTH_TOLERANCE
+    )
+    scores[too_far] = -1
+    return scores
+
+
+def read_format(
+    cell: Cell, templates: Templates, chars: Sequence[str]
+) -> tuple[float, list[Span]]:
+    """Split a cell into one glyph per item of `chars`, among its chars.
+
+    As in `read_segment`, the best split is found by dynamic programming, but
+    over the whole cell, whose blank columns are skipped, with exactly as many
+    glyphs as `chars`. Touching glyphs may share, or leave out, up to
+    `KERNING` columns. Each column counts once in the total score.
+    Returns: the total score, `-inf` if there is no such split, and the glyphs.
+    """
+    width = cell.ink.shape[1]
+    candidates = [
+        span
+        for a, b in get_segments(cell.mask)
+        for span in get_candidates(a, b, templates)
+    ]
+    if not candidates:
+        return -np.inf, []
+    scores = get_scores(cell.ink, candidates, templates)
+    by_char = np.array(
+        [
+            np.where(np.isin(templates.chars, list(allowed)), scores, -np.inf)
+            for allowed in chars
+        ]
+    )
+    best = by_char.argmax(axis=2)
+    best_scores = np.take_along_axis(by_char, best[:, :, None], 2)[:, :, 0]
+
+    # the steps to each column: the candidates ending there, the column
+    # covered before each, and the columns each adds
+    kernings = np.arange(-KERNING, KERNING + 1)
+    indices = np.repeat(np.arange(len(candidates)), len(kernings))
+    starts, ends = np.array(candidates)[indices].T
+    froms = starts + np.tile(kernings, len(candidates))
+    valid = (froms >= 0) & (froms < ends)
+    indices, starts, ends, froms = (
+        indices[valid],
+        starts[valid],
+        ends[valid],
+        froms[valid],
+    )
+    added = ends - np.maximum(starts, froms)
+    order = np.argsort(ends, kind="stable")
+    columns, firsts = np.unique(ends[order], return_index=True)
+    steps_to = {
+        int(column): (indices[group], froms[group], added[group])
+        for column, group in zip(columns, np.split(order, firsts[1:]))
+    }
+    blank = ~cell.mask.any(axis=0)
+    # by column covered and count of glyphs: the best total, and its last
+    # step, from a column with a candidate, or -1 over a blank column
+    totals = np.full((width + 1, len(chars) + 1), -np.inf)
+    totals[0, 0] = 0
+    previous = np.zeros((width + 1, len(chars) + 1), np.int_)
+    steps = np.full((width + 1, len(chars) + 1), -1)
+    counts = np.arange(len(chars))
+    for column in range(1, width + 1):
+        if column in steps_to:
+            step_indices, step_froms, step_added = steps_to[column]
+            new = (
+                totals[step_froms, :-1]
+                + best_scores[:, step_indices].T * step_added[:, None]
+            )
+            best_steps = new.argmax(axis=0)
+            totals[column, 1:] = new[best_steps, counts]
+            previous[column, 1:] = step_froms[best_steps]
+            steps[column, 1:] = step_indices[best_steps]
+        if blank[column - 1]:
+            better = totals[column - 1] > totals[column]
+            totals[column, better] = totals[column - 1, better]
+            previous[column, better] = column - 1
+            steps[column, better] = -1
+    total = float(totals[width, len(chars)])
+    if total == -np.inf:
+        return total, []
+    glyphs: list[Span] = []
+    column, count = width, len(chars)
+    while column > 0:
+        i = int(steps[column, count])
+        column = int(previous[column, count])
+        if i >= 0:
+            count -= 1
+            a, b = candidates[i]
+            char = str(templates.chars[best[count, i]])
+            glyphs.append((a, b, Glyph(char, float(best_scores[count, i]))))
+    return total, glyphs[::-1]
+
+
+def read_segment(
+    ink: npt.NDArray[np.float32], templates: Templates
+) -> list[Span]:
+    """Split a run of ink into glyphs, touching ones included.
+
+    Every split into glyphs of the template widths is scored at once, and the
+    best split found by dynamic programming, weighted by glyph width.
+    """
+    width = ink.shape[1]
+    candidates = get_candidates(0, width, templates)
+    scores = get_scores(ink, candidates, templates)
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(candidates)), best]
+
+    by_end: dict[int, list[int]] = {}
+    for i, (_, b) in enumerate(candidates):
+        by_end.setdefault(b, []).append(i)
+    totals = np.full(width + 1, -np.inf)
+    totals[0] = 0
+    previous = np.full(width + 1, -1)
+    for end in range(1, width + 1):
+        for i in by_end.get(end, []):
+            a = candidates[i][0]
+            total = totals[a] + best_scores[i] * (end - a)
+            if total > totals[end]:
+                totals[end] = total
+                previous[end] = i
+    glyphs: list[Span] = []
+    end = width
+    while end > 0 and previous[end] >= 0:
+        i = previous[end]
+        a, b = candidates[i]
+        char = str(templates.chars[best[i]])
+        glyphs.append((a, b, Glyph(char, float(best_scores[i]))))
+        end = a
+    return glyphs[::-1]
+
+
+def read_with_tesseract(ink: npt.NDArray[np.float32]) -> str | None:
+    """Read a single glyph with Tesseract, if it is installed."""
+    # pylint: disable-next=import-outside-toplevel
+    import pytesseract
+
+    image = cv2.copyMakeBorder(
+        (255 - ink * 255).astype(np.uint8),
+        8,
+        8,
+        8,
+        8,
+        cv2.BORDER_CONSTANT,
+        value=255,
+    )
+    try:
+        text = pytesseract.image_to_string(image, config=TESSERACT_OPTIONS)
+    except pytesseract.TesseractNotFoundError:
+        return None
+    return text.strip()[:1] or None
+
+
+def read_cell(
+    cell: Cell,
+    templates: Templates,
+    formats: Sequence[Sequence[str]] = (),
+) -> str:
+    """Read the glyphs of a cell, again by its `formats` if none fits.
+
+    Touching glyphs may be split wrong, as `W` into `IV`, while the format
+    tells how many glyphs there are. A glyph below `MIN_SCORE` is read by
+    Tesseract, if it is installed and its char fits the format.
+    """
+    glyphs = [
+        (a + c, a + d, glyph)
+        for a, b in get_segments(cell.mask)
+        for c, d, glyph in read_segment(cell.ink[:, a:b], templates)
+    ]
+    chars = next((chars for chars in formats if fits(glyphs, chars)), None)
+    if formats and chars is None:
+        total, format_glyphs, chars = max(
+            (
+                (*read_format(cell, templates, chars), chars)
+                for chars in formats
+            ),
+            key=lambda read: read[0],
+        )
+        if total > -np.inf:
+            glyphs = format_glyphs
+        else:
+            chars = None
+    text: list[str] = []
+    for i, (a, b, glyph) in enumerate(glyphs):
+        char = glyph.char
+        if glyph.score < MIN_SCORE:
+            fallback = read_with_tesseract(cell.ink[:, a:b])
+            if fallback and (chars is None or fallback in chars[i]):
+                char = fallback
+        text.append(char)
+    return "".join(text)
+
+
+def read_keys(gray: MatLike, templates: Templates) -> list[str]:
+    """Read the key columns of each row, formatted like the labels."""
+    keys: list[str] = []
+    for cells in get_cells(gray):
+        if len(cells) < KEY_COLUMNS:
+            continue
+        equal, key, plus, f, key_end = (
+            read_cell(cell, templates, formats)
+            for cell, formats in zip(cells[-KEY_COLUMNS:], CELL_FORMATS)
+        )
+        keys.append(f"{equal} {key} {plus} {f:<3}|{key_end}")
+    return keys
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("images", nargs="+", help="paths to images to be OCR'd")
+    ap.add_argument(
+        "--learn",
+        action="store_true",
+        help="learn the templates again from the labeled images",
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def main(images: list[str], learn: bool = False):
+    templates = load_templates(learn)
+    for image in images:
+        gray = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+        start = time.perf_counter()
+        keys = read_keys(gray, templates)
+        seconds = time.perf_counter() - start
+        print("\n".join(keys))
+        print(
+            f"{len(keys)} keys in {seconds * 1000:.1f} ms",
+            f"({seconds * 1000 / max(1, len(keys)):.2f} ms per key)",
+        )
+
+
+if __name__ == "__main__":
+    args: ExtractedArgs = parse_args()
+    main(args.images, args.learn)
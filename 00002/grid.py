@@ -0,0 +1,66 @@
+"""Detect the grid lines of a sheet screenshot from projection profiles
+"""
+# import the necessary packages
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike
+
+LINE_THRESHOLD = 225  # grid lines are light gray
+MIN_LINE_LENGTH = 350
+
+Rule = tuple[int, int]  # first and past the last pixel across the line
+
+
+class Grid(NamedTuple):
+    rows: list[Rule]  # horizontal lines, top to bottom
+    columns: list[Rule]  # vertical lines, left to right
+
+
+def find_rules(
+    mask: npt.NDArray[np.uint8], axis: int, min_length: int
+) -> list[Rule]:
+    """Find the lines along `axis` (1: horizontal, 0: vertical).
+
+    The opening keeps the runs of at least `min_length` pixels, so text is
+    dropped, and the rows (or columns) holding one are the lines. Adjacent
+    ones, as blurred lines give, are merged.
+    """
+    # the kernel is one pixel thick, so the rows (or columns) are opened
+    # independently, and only the ones with enough pixels need to be
+    candidates = np.flatnonzero(mask.sum(axis=axis) >= min_length)
+    if not candidates.size:
+        return []
+    lines = mask[candidates] if axis == 1 else mask[:, candidates]
+    kernel = np.ones(
+        (1, min_length) if axis == 1 else (min_length, 1), np.uint8
+    )
+    opened = cv2.morphologyEx(
+        np.ascontiguousarray(lines), cv2.MORPH_OPEN, kernel
+    )
+    positions = candidates[opened.sum(axis=axis) >= min_length]
+    if not positions.size:
+        return []
+    breaks = np.flatnonzero(np.diff(positions) > 1)
+    starts = positions[np.r_[0, breaks + 1]]
+    stops = positions[np.r_[breaks, len(positions) - 1]] + 1
+    return [(int(a), int(b)) for a, b in zip(starts, stops)]
+
+
+def detect_grid(
+    gray: MatLike,
+    min_length: int = MIN_LINE_LENGTH,
+    threshold: int = LINE_THRESHOLD,
+) -> Grid:
+    """Detect the horizontal and vertical lines of a grayscale image."""
+    mask = (gray < threshold).astype(np.uint8)
+    return Grid(
+        find_rules(mask, 1, min(min_length, gray.shape[1])),
+        find_rules(mask, 0, min(min_length, gray.shape[0])),
+    )
+
+
+def get_center(rule: Rule) -> int:
+    return (rule[0] + rule[1] - 1) // 2
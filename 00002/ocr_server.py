@@ -0,0 +1,195 @@
+"""Serve the Steam key recognition over HTTP, with the engine kept warm
+"""
+# import the necessary packages
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import pathlib
+import sys
+import threading
+import time
+from typing import Any
+
+import cv2
+import numpy as np
+import pytesseract
+
+import glyph_ocr
+import steam_key_ocr
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+# pylint: disable-next=wrong-import-position
+from sgcommon import trace
+
+HOST = "127.0.0.1"
+PORT = 8042
+MAX_WORKERS = 4
+MAX_PENDING = 16  # requests queued or running, 503 beyond
+LATENCY_WINDOW = 1000  # latest requests in the metrics
+COUNTS = ("recognized", "invalid", "failed", "rejected")
+
+
+class ExtractedArgs:
+    host: str
+    port: int
+    workers: int
+    max_pending: int
+    engine: str
+
+
+class OCRService:
+    """Recognize images in a bounded worker pool, and keep latency metrics."""
+
+    def __init__(self, engine: str, workers: int, max_pending: int):
+        self.engine = engine
+        self.templates = (
+            glyph_ocr.load_templates() if engine == "glyph" else None
+        )
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.latencies: collections.deque[float] = collections.deque(
+            maxlen=LATENCY_WINDOW
+        )
+        self.counts = collections.Counter[str]()
+
+    def recognize(self, data: bytes) -> list[str]:
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError("Not an image.")
+        if self.templates is not None:
+            return glyph_ocr.read_keys(gray, self.templates)
+        return steam_key_ocr.read_keys(gray)
+
+    def submit(self, data: bytes) -> list[str] | None:
+        """Recognize `data`, or return `None` if too many are pending.
+
+        Raises: `ValueError` if `data` is not an image, and the errors of
+        Tesseract.
+        """
+        if not self.slots.acquire(blocking=False):
+            self.count("rejected")
+            return None
+        start = time.perf_counter()
+        try:
+            keys = self.executor.submit(self.recognize, data).result()
+        except ValueError:
+            self.count("invalid")
+            raise
+        except (
+            pytesseract.TesseractError,
+            pytesseract.TesseractNotFoundError,
+        ):
+            self.count("failed")
+            raise
+        finally:
+            self.slots.release()
+        with self.lock:
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            self.counts["recognized"] += 1
+        return keys
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def get_metrics(self) -> dict[str, Any]:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            metrics: dict[str, Any] = {
+                name: self.counts[name] for name in COUNTS
+            }
+        metrics["engine"] = self.engine
+        if latencies:
+            for percent in (50, 95, 99):
+                metrics[f"p{percent}_ms"] = round(
+                    trace.get_percentile(latencies, percent), 2
+                )
+        return metrics
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """`POST /keys` with an image as body, `GET /metrics`."""
+
+    service: OCRService
+
+    def send_json(self, status: int, body: dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path != "/metrics":
+            self.send_json(404, {"error": "Not found."})
+            return
+        self.send_json(200, self.service.get_metrics())
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        if self.path != "/keys":
+            self.send_json(404, {"error": "Not found."})
+            return
+        start = time.perf_counter()
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            keys = self.service.submit(data)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except (
+            pytesseract.TesseractError,
+            pytesseract.TesseractNotFoundError,
+        ) as e:
+            self.send_json(500, {"error": str(e)})
+            return
+        if keys is None:
+            self.send_json(503, {"error": "Too many pending requests."})
+            return
+        milliseconds = (time.perf_counter() - start) * 1000
+        self.send_json(200, {"keys": keys, "ms": round(milliseconds, 2)})
+
+    def log_message(self, format: str, *args: Any):  # pylint: disable=W0622
+        pass
+
+
+class Server(http.server.ThreadingHTTPServer):
+    # bursts beyond the pending requests get a 503, not a refused connection
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS)
+    ap.add_argument(
+        "--max-pending",
+        type=int,
+        default=MAX_PENDING,
+        help="requests queued or running, rejected with 503 beyond",
+    )
+    ap.add_argument("--engine", choices=("glyph", "tesseract"), default="glyph")
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def main(args: ExtractedArgs):
+    Handler.service = OCRService(args.engine, args.workers, args.max_pending)
+    server = Server((args.host, args.port), Handler)
+    print(f"Serving {args.engine} OCR on http://{args.host}:{args.port}/keys")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Handler.service.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main(parse_args())
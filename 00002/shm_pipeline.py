@@ -0,0 +1,317 @@
+"""Recognize many images in parallel, handing them over through shared memory
+"""
+# import the necessary packages
+import argparse
+import multiprocessing
+import multiprocessing.queues
+import queue
+import time
+from collections.abc import Sequence
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from PIL import Image
+
+import glyph_ocr
+import steam_key_ocr
+
+PREPROCESS_WORKERS = 2
+OCR_WORKERS = 2
+SLOTS_PER_WORKER = 2  # images ready or being read, per OCR worker
+SLOT_SIZE = 32 * 2**20  # bytes, larger images go through the queue
+POLL_SECONDS = 1  # to check that the workers are alive
+
+Image8 = npt.NDArray[np.uint8]
+
+
+class ExtractedArgs:
+    images: list[str]
+    engine: str
+    single_pass: bool
+    preprocess_workers: int
+    ocr_workers: int
+    slots: int | None
+    slot_size: int
+    pickle: bool
+
+
+class Handle(NamedTuple):
+    slot: int
+    shapes: tuple[tuple[int, ...], ...]  # of the images, one after the other
+
+
+class Handoff(NamedTuple):
+    """The images of a path ready for OCR, in a slot of the ring or as they
+    are if too large.
+    """
+
+    index: int
+    handle: Handle | None
+    images: tuple[Image8, ...] | None
+    error: str | None
+
+
+class Result(NamedTuple):
+    index: int
+    keys: list[str]
+    error: str | None
+
+
+class Ring:
+    """Fixed-size slots of a shared memory block, reused in turn.
+
+    A writer takes a free slot, waiting if they are all in use, and passes
+    its `Handle` to a reader, which puts the slot back once done. Only the
+    handles are pickled between the processes, never the pixels.
+    """
+
+    def __init__(self, slots: int, slot_size: int):
+        self.slot_size = slot_size
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=slots * slot_size
+        )
+        self.free: multiprocessing.queues.Queue[int] = multiprocessing.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+
+    def fits(self, images: Sequence[Image8]) -> bool:
+        return sum(image.nbytes for image in images) <= self.slot_size
+
+    def view(self, handle: Handle) -> tuple[Image8, ...]:
+        """The images of a slot, without a copy."""
+        views: list[Image8] = []
+        offset = handle.slot * self.slot_size
+        for shape in handle.shapes:
+            view = np.ndarray(shape, np.uint8, self.memory.buf, offset)
+            views.append(view)
+            offset += view.nbytes
+        return tuple(views)
+
+    def put(self, images: Sequence[Image8]) -> Handle:
+        handle = Handle(self.free.get(), tuple(image.shape for image in images))
+        for view, image in zip(self.view(handle), images):
+            view[...] = image
+        return handle
+
+    def release(self, handle: Handle):
+        self.free.put(handle.slot)
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("images", nargs="+", help="paths to images to be OCR'd")
+    ap.add_argument(
+        "--engine",
+        choices=("tesseract", "glyph"),
+        default="tesseract",
+        help="glyph: match the glyphs of the sheet against learned templates",
+    )
+    ap.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="upscale the whole images before the OCR, see steam_key_ocr.py",
+    )
+    ap.add_argument(
+        "--preprocess-workers",
+        type=int,
+        default=PREPROCESS_WORKERS,
+        help="processes decoding and preprocessing the images",
+    )
+    ap.add_argument(
+        "--ocr-workers",
+        type=int,
+        default=OCR_WORKERS,
+        help="processes reading the keys",
+    )
+    ap.add_argument(
+        "--slots",
+        type=int,
+        help=f"images in the ring, {SLOTS_PER_WORKER} per OCR worker by"
+        " default",
+    )
+    ap.add_argument("--slot-size", type=int, default=SLOT_SIZE, help="bytes")
+    ap.add_argument(
+        "--pickle",
+        action="store_true",
+        help="hand the images over through the queue, for comparison",
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def prepare(path: str, engine: str, single_pass: bool) -> tuple[Image8, ...]:
+    """Decode an image, and upscale it for Tesseract.
+
+    Returns: the grayscale image for the glyph engine, the upscaled one with
+    `single_pass`, or else both, the upscaled one for the heaviest pass.
+    """
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError(f"Not an image: {path}")
+    if engine == "glyph":
+        return (gray,)
+    upscaled = np.asarray(steam_key_ocr.preprocess(gray))
+    return (upscaled,) if single_pass else (gray, upscaled)
+
+
+def preprocess_worker(
+    tasks: multiprocessing.queues.Queue[tuple[int, str] | None],
+    handoffs: multiprocessing.queues.Queue[Handoff | None],
+    ring: Ring | None,
+    engine: str,
+    single_pass: bool,
+):
+    """Decode and preprocess the images into the ring, until `None`."""
+    try:
+        while (task := tasks.get()) is not None:
+            index, path = task
+            try:
+                images = prepare(path, engine, single_pass)
+            # a broken image must not stop the others
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                handoffs.put(Handoff(index, None, None, str(e)))
+                continue
+            if ring is None or not ring.fits(images):
+                handoffs.put(Handoff(index, None, images, None))
+                continue
+            handoffs.put(Handoff(index, ring.put(images), None, None))
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+def read_image(
+    images: Sequence[Image8],
+    templates: glyph_ocr.Templates | None,
+    single_pass: bool,
+) -> list[str]:
+    if templates is not None:
+        return glyph_ocr.read_keys(images[0], templates)
+    if not single_pass:
+        return steam_key_ocr.read_keys(*images)
+    # already preprocessed
+    text = steam_key_ocr.recognize(Image.fromarray(images[0]))
+    # the key lines only, as `steam_key_ocr.read_keys`
+    return [
+        line for line in text.splitlines() if steam_key_ocr.is_key_like(line)
+    ]
+
+
+def ocr_worker(
+    handoffs: multiprocessing.queues.Queue[Handoff | None],
+    results: multiprocessing.queues.Queue[Result],
+    ring: Ring | None,
+    engine: str,
+    single_pass: bool,
+):
+    """Read the keys of the images handed over, until `None`."""
+    templates = glyph_ocr.load_templates() if engine == "glyph" else None
+    try:
+        while (handoff := handoffs.get()) is not None:
+            if handoff.error is not None:
+                results.put(Result(handoff.index, [], handoff.error))
+                continue
+            if handoff.handle is None:
+                images = handoff.images
+            else:
+                assert ring is not None
+                images = ring.view(handoff.handle)
+            assert images is not None
+            try:
+                keys = read_image(images, templates, single_pass)
+            # Tesseract, OpenCV or a broken image: fail this image only
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                results.put(Result(handoff.index, [], str(e)))
+                continue
+            finally:
+                # the views must not outlive the slot
+                del images
+                if handoff.handle is not None:
+                    assert ring is not None
+                    ring.release(handoff.handle)
+            results.put(Result(handoff.index, keys, None))
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+def run(args: ExtractedArgs) -> list[Result]:
+    """Recognize `args.images`, and return the results in the same order."""
+    ring = None
+    if not args.pickle:
+        slots = args.slots or SLOTS_PER_WORKER * args.ocr_workers
+        ring = Ring(slots, args.slot_size)
+    tasks: multiprocessing.queues.Queue[tuple[int, str] | None] = (
+        multiprocessing.Queue()
+    )
+    handoffs: multiprocessing.queues.Queue[Handoff | None] = (
+        multiprocessing.Queue()
+    )
+    results: multiprocessing.queues.Queue[Result] = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=preprocess_worker,
+            args=(tasks, handoffs, ring, args.engine, args.single_pass),
+        )
+        for _ in range(args.preprocess_workers)
+    ] + [
+        multiprocessing.Process(
+            target=ocr_worker,
+            args=(handoffs, results, ring, args.engine, args.single_pass),
+        )
+        for _ in range(args.ocr_workers)
+    ]
+    try:
+        for worker in workers:
+            worker.start()
+        for task in enumerate(args.images):
+            tasks.put(task)
+        for _ in range(args.preprocess_workers):
+            tasks.put(None)
+        by_index: dict[int, Result] = {}
+        while len(by_index) < len(args.images):
+            try:
+                result = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if any(worker.exitcode for worker in workers):
+                    raise RuntimeError("A worker failed.") from None
+                continue
+            by_index[result.index] = result
+        for _ in range(args.ocr_workers):
+            handoffs.put(None)
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        if ring is not None:
+            ring.close()
+            ring.unlink()
+    return [by_index[i] for i in range(len(args.images))]
+
+
+def main(args: ExtractedArgs):
+    start = time.perf_counter()
+    results = run(args)
+    seconds = time.perf_counter() - start
+    for image, result in zip(args.images, results):
+        print(f"{image}:")
+        print(result.error or "\n".join(result.keys))
+    print(
+        f"{len(results)} images in {seconds:.2f} s",
+        f"({len(results) / seconds:.1f} images/s)",
+    )
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,104 +1,203 @@
 """Recognize Steam key using Optical Character Recognition
 """
+
 # import the necessary packages
 import argparse
+import pathlib
+import re
+from typing import NamedTuple
 
 import cv2
 import pytesseract
 from cv2.typing import MatLike
 from PIL import Image, ImageFilter
 
-# import re
+import glyph_ocr
 
 RESIZE_FACTOR = 3.2
-# CROP_SIZE = 20
+TESSERACT_CONFIG = pathlib.Path(__file__).resolve().parent / "tessconfigs"
+# a key line of the sheets, like the labels of `data`
+KEY_PATTERN = re.compile(r"=\s*\w{5}-\w{5}-?\s*\+\s*F\d\d?\s*\|\s*\w{5}")
+# enough of a key line to be worth reading again, unlike the headers, the row
+# numbers or the titles
+KEY_FRAGMENT = re.compile(r"\w{5}\s?-\s?\w{5}")
+MIN_CONFIDENCE = 80  # of every word of a line, out of 100
+# (scale, smooth) from the cheapest to the heaviest, the last one alone with
+# `--single-pass`
+PASSES = [(1.0, False), (1.5, False), (RESIZE_FACTOR, True)]
+LINE_MARGIN = 4  # pixels around a line, when it is read again
+PSM_LINE = 7  # Tesseract page segmentation mode: a single text line
 
 
 class ExtractedArgs:
     image: str
+    engine: str
+    single_pass: bool
 
 
-def main0():
-    # construct the argument parser and parse the arguments
-    ap: argparse.ArgumentParser = argparse.ArgumentParser()
-    ap.add_argument("image", help="path to input image to be OCR'd")
-    args: ExtractedArgs = ap.parse_args(namespace=ExtractedArgs())
+class Line(NamedTuple):
+    text: str
+    confidence: float  # of the least confident word
+    box: tuple[int, int, int, int]  # left, top, right, bottom in the input
 
-    # load the input image
-    image: Image.Image = Image.open(args.image).convert("RGB")  # 57
 
-    image = image.convert("L")  # 34
-    # image = image.crop((CROP_SIZE, CROP_SIZE, image.width, image.height))
-    image = image.resize(
-        (int(image.width * RESIZE_FACTOR), int(image.height * RESIZE_FACTOR)),
-        Image.LANCZOS,
-    )  # 10
+def preprocess(
+    gray: MatLike, scale: float = RESIZE_FACTOR, smooth: bool = True
+) -> Image.Image:
+    image: Image.Image = Image.fromarray(gray)
+    if scale != 1:
+        image = image.resize(
+            (int(image.width * scale), int(image.height * scale)),
+            Image.LANCZOS,
+        )
 
-    image = image.filter(ImageFilter.SMOOTH_MORE)  # 9
-    # image = image.filter(ImageFilter.MinFilter(3))
-    # image = image.filter(ImageFilter.UnsharpMask(6.8, 269, 0))  # 15
-    # image = image.filter(ImageFilter.SHARPEN)  # 10
+    if smooth:
+        image = image.filter(ImageFilter.SMOOTH_MORE)
+    return image
 
-    # image.show()
-    # image.save("image.png")
 
+def recognize(image: Image.Image) -> str:
     # OCR the input image using Tesseract
-    # options: str = "--dpi 300 --tessdata-dir ./tessdata tessconfigs"  # 15
-    options: str = "--dpi 300 tessconfigs"
-    text: str = pytesseract.image_to_string(image, config=options)
-    print(text)
-    # print("---")
-
-    # text = text.replace("-+", "+")
-    # pattern: re.Pattern[str] = re.compile(r".+=\w{5}-\w{5}\+F\d\d?\w{5}")
-    # text = "\n".join([l for l in text.split("\n") if pattern.match(l)])
-    # print(text)
-    # print(len(text.split()))
-    # cv2.imshow("aa", image)
-    # cv2.waitKey(0)
-    # cv2.destroyAllWindows()
+    options: str = f"--dpi 300 {TESSERACT_CONFIG}"
+    return pytesseract.image_to_string(image, config=options)
+
+
+def read_lines(image: Image.Image, scale: float, psm: int = 3) -> list[Line]:
+    """OCR `image`, resized by `scale`, into lines with their confidence."""
+    data = pytesseract.image_to_data(
+        image,
+        config=f"--dpi 300 --psm {psm} {TESSERACT_CONFIG}",
+        output_type=pytesseract.Output.DICT,
+    )
+    words: dict[tuple[int, int, int], list[int]] = {}
+    for i, text in enumerate(data["text"]):
+        if text.strip() and float(data["conf"][i]) >= 0:
+            number = (
+                data["block_num"][i],
+                data["par_num"][i],
+                data["line_num"][i],
+            )
+            words.setdefault(number, []).append(i)
+    lines: list[Line] = []
+    for indices in words.values():
+        left = min(data["left"][i] for i in indices)
+        top = min(data["top"][i] for i in indices)
+        right = max(data["left"][i] + data["width"][i] for i in indices)
+        bottom = max(data["top"][i] + data["height"][i] for i in indices)
+        lines.append(
+            Line(
+                " ".join(data["text"][i] for i in indices),
+                min(float(data["conf"][i]) for i in indices),
+                (
+                    int(left / scale),
+                    int(top / scale),
+                    int(right / scale) + 1,
+                    int(bottom / scale) + 1,
+                ),
+            )
+        )
+    return lines
+
+
+def is_valid(line: Line) -> bool:
+    return (
+        line.confidence >= MIN_CONFIDENCE
+        and KEY_PATTERN.search(line.text) is not None
+    )
+
+
+def is_key_like(text: str) -> bool:
+    return KEY_FRAGMENT.search(text) is not None
+
+
+def read_line_again(
+    gray: MatLike, line: Line, upscaled: MatLike | None = None
+) -> Line:
+    """Read a line with the next passes, until it is valid.
+
+    The last pass crops `upscaled`, the image of the last pass, if given.
+    """
+    left, top, right, bottom = line.box
+    y0, y1 = max(top - LINE_MARGIN, 0), bottom + LINE_MARGIN
+    x0, x1 = max(left - LINE_MARGIN, 0), right + LINE_MARGIN
+    crop = gray[y0:y1, x0:x1]
+    for scale, smooth in PASSES[1:]:
+        if upscaled is not None and (scale, smooth) == PASSES[-1]:
+            image = Image.fromarray(
+                upscaled[
+                    int(y0 * scale) : int(y1 * scale),
+                    int(x0 * scale) : int(x1 * scale),
+                ]
+            )
+        else:
+            image = preprocess(crop, scale, smooth)
+        parts = read_lines(image, scale, PSM_LINE)
+        if parts:
+            line = Line(
+                " ".join(part.text for part in parts),
+                min(part.confidence for part in parts),
+                line.box,
+            )
+        if is_valid(line):
+            break
+    return line
+
+
+def read_keys(gray: MatLike, upscaled: MatLike | None = None) -> list[str]:
+    """OCR the key lines of `gray`, each with the cheapest pass that reads it.
+
+    The whole image is read with the first of `PASSES`, then only the key
+    lines that are misread, or not confident enough, are cropped and read
+    again with the heavier ones. The other lines are dropped. If no line at
+    all is a key, the image is likely not readable at that scale, and it is
+    read whole with the heaviest pass. `upscaled`, the whole image of the
+    heaviest pass, is used instead of preprocessing `gray` again, if given.
+    """
+    scale, smooth = PASSES[0]
+    lines = read_lines(preprocess(gray, scale, smooth), scale)
+    if not any(is_valid(line) for line in lines):
+        scale, smooth = PASSES[-1]
+        image = (
+            preprocess(gray, scale, smooth)
+            if upscaled is None
+            else Image.fromarray(upscaled)
+        )
+        lines = read_lines(image, scale)
+        return [line.text for line in lines if is_key_like(line.text)]
+    return [
+        (line if is_valid(line) else read_line_again(gray, line, upscaled)).text
+        for line in lines
+        if is_key_like(line.text)
+    ]
 
 
 def main():
     # construct the argument parser and parse the arguments
     ap: argparse.ArgumentParser = argparse.ArgumentParser()
     ap.add_argument("image", help="path to input image to be OCR'd")
+    ap.add_argument(
+        "--engine",
+        choices=("tesseract", "glyph"),
+        default="tesseract",
+        help="glyph: match the glyphs of the sheet against learned templates",
+    )
+    ap.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="read the whole image with the heaviest preprocessing only",
+    )
     args: ExtractedArgs = ap.parse_args(namespace=ExtractedArgs())
+    if args.engine == "glyph":
+        glyph_ocr.main([args.image])
+        return
 
     # load the input image
-    image: MatLike = cv2.imread(args.image)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    image = image.convert("L")  # 34
-    # image = image.crop((CROP_SIZE, CROP_SIZE, image.width, image.height))
-    image = image.resize(
-        (int(image.width * RESIZE_FACTOR), int(image.height * RESIZE_FACTOR)),
-        Image.LANCZOS,
-    )  # 10
-
-    image = image.filter(ImageFilter.SMOOTH_MORE)  # 9
-    # image = image.filter(ImageFilter.MinFilter(3))
-    # image = image.filter(ImageFilter.UnsharpMask(6.8, 269, 0))  # 15
-    # image = image.filter(ImageFilter.SHARPEN)  # 10
-
-    # image.show()
-    # image.save("image.png")
-
-    # OCR the input image using Tesseract
-    # options: str = "--dpi 300 --tessdata-dir ./tessdata tessconfigs"  # 15
-    options: str = "--dpi 300 tessconfigs"
-    text: str = pytesseract.image_to_string(image, config=options)
+    gray: MatLike = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+    if not args.single_pass:
+        print("\n".join(read_keys(gray)))
+        return
+    text: str = recognize(preprocess(gray))
     print(text)
-    # print("---")
-
-    # text = text.replace("-+", "+")
-    # pattern: re.Pattern[str] = re.compile(r".+=\w{5}-\w{5}\+F\d\d?\w{5}")
-    # text = "\n".join([l for l in text.split("\n") if pattern.match(l)])
-    # print(text)
-    # print(len(text.split()))
-    # cv2.imshow("aa", image)
-    # cv2.waitKey(0)
-    # cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+"""Tests of the glyph engine, on the sheets of `data`.
+"""
+import unittest
+
+import cv2
+
+import glyph_ocr
+import steam_key_ocr
+
+HELD_OUT = "97C3MPJ"  # labeled by hand, not by the engine
+
+
+def get_images() -> list[str]:
+    return [label.stem for label in sorted(glyph_ocr.DATA_DIR.glob("*.txt"))]
+
+
+def learn_without(name: str) -> glyph_ocr.Templates:
+    """Learn the templates from the labeled images but `name`."""
+    return glyph_ocr.learn_templates(
+        [
+            glyph_ocr.DATA_DIR / f"{image}.png"
+            for image in get_images()
+            if image != name
+        ]
+    )
+
+
+def get_labels(name: str) -> list[str]:
+    return (
+        (glyph_ocr.DATA_DIR / f"{name}.txt")
+        .read_text(encoding="utf-8")
+        .splitlines()
+    )
+
+
+def read(
+    name: str,
+    templates: glyph_ocr.Templates,
+    scale: float = 1,
+    interpolation: int = cv2.INTER_NEAREST,
+) -> list[str]:
+    gray = cv2.imread(
+        str(glyph_ocr.DATA_DIR / f"{name}.png"), cv2.IMREAD_GRAYSCALE
+    )
+    if scale != 1:
+        gray = cv2.resize(
+            gray, None, fx=scale, fy=scale, interpolation=interpolation
+        )
+    return glyph_ocr.read_keys(gray, templates)
+
+
+class ReadKeysTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.held_out = learn_without(HELD_OUT)
+
+    def test_held_out_sheets(self):
+        for name in get_images():
+            with self.subTest(name):
+                self.assertEqual(
+                    read(name, learn_without(name)), get_labels(name)
+                )
+
+    def test_key_format(self):
+        templates = glyph_ocr.load_templates()
+        for image in sorted(glyph_ocr.DATA_DIR.glob("*.png")):
+            with self.subTest(image.stem):
+                keys = read(image.stem, templates)
+                self.assertTrue(keys)
+                for key in keys:
+                    self.assertRegex(key, steam_key_ocr.KEY_PATTERN)
+
+    def test_scaled_sheet(self):
+        for scale in (2, 3):
+            with self.subTest(scale=scale):
+                self.assertEqual(
+                    read(HELD_OUT, self.held_out, scale), get_labels(HELD_OUT)
+                )
+
+    def test_blurred_sheet(self):
+        self.assertEqual(
+            read(HELD_OUT, self.held_out, 3, cv2.INTER_LINEAR),
+            get_labels(HELD_OUT),
+        )
+
+    def test_rescaled_sheet(self):
+        # a fractional factor moves the glyphs off the pixel grid: only the
+        # format of the keys holds
+        for interpolation in (cv2.INTER_LINEAR, cv2.INTER_AREA):
+            with self.subTest(interpolation=interpolation):
+                keys = read(HELD_OUT, self.held_out, 1.5, interpolation)
+                self.assertEqual(len(keys), len(get_labels(HELD_OUT)))
+                for key in keys:
+                    self.assertRegex(key, steam_key_ocr.KEY_PATTERN)
+
+
+if __name__ == "__main__":
+    unittest.main()
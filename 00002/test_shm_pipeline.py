@@ -0,0 +1,75 @@
+"""Tests of the shared memory pipeline, with the glyph engine.
+"""
+import contextlib
+import io
+import multiprocessing
+import pathlib
+import tempfile
+import unittest
+from typing import Any
+from unittest import mock
+
+import cv2
+import numpy as np
+
+import glyph_ocr
+import shm_pipeline
+
+SHEETS = [str(glyph_ocr.DATA_DIR / "97C3MPJ.png")]
+
+
+def get_args(images: list[str], **kwargs: Any) -> shm_pipeline.ExtractedArgs:
+    args = shm_pipeline.ExtractedArgs()
+    args.images = images
+    args.engine = "glyph"
+    args.single_pass = False
+    args.preprocess_workers = 1
+    args.ocr_workers = 2
+    args.slots = None
+    args.slot_size = shm_pipeline.SLOT_SIZE
+    args.pickle = False
+    for key, value in kwargs.items():
+        setattr(args, key, value)
+    return args
+
+
+@unittest.skipUnless(
+    multiprocessing.get_start_method() == "fork", "patches the workers"
+)
+class RunTest(unittest.TestCase):
+    def run_pipeline(self, args: shm_pipeline.ExtractedArgs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return shm_pipeline.run(args)
+
+    def test_ring_and_pickle(self):
+        labels = (glyph_ocr.DATA_DIR / "97C3MPJ.txt").read_text(
+            encoding="utf-8"
+        )
+        for pickle in (False, True):
+            with self.subTest(pickle=pickle):
+                (result,) = self.run_pipeline(get_args(SHEETS, pickle=pickle))
+                self.assertIsNone(result.error)
+                self.assertEqual(result.keys, labels.splitlines())
+
+    def test_failing_image(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        blank = str(pathlib.Path(directory.name) / "blank.png")
+        cv2.imwrite(blank, np.full((20, 30), 255, np.uint8))
+        read_keys = glyph_ocr.read_keys
+
+        def fail_on_blank(gray: Any, templates: Any) -> list[str]:
+            if gray.min() == 255:
+                raise cv2.error("blank sheet")
+            return read_keys(gray, templates)
+
+        with mock.patch.object(glyph_ocr, "read_keys", fail_on_blank):
+            results = self.run_pipeline(get_args([blank, *SHEETS]))
+        self.assertEqual(results[0].keys, [])
+        self.assertIn("blank sheet", results[0].error or "")
+        self.assertIsNone(results[1].error)
+        self.assertTrue(results[1].keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
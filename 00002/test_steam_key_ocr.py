@@ -0,0 +1,105 @@
+"""Tests of the Tesseract passes, with a stubbed Tesseract.
+"""
+import unittest
+from typing import Any
+from unittest import mock
+
+import numpy as np
+
+import steam_key_ocr
+
+KEY = "= GMG0K-L9Z9B- + F11 | A9C6P"
+MISREAD = "= GMG0K-L9Z9B- + FI1 A9C6P"
+TITLE = "Giveaways of the month"
+
+
+def get_data(lines: list[tuple[str, float]]) -> dict[str, list[Any]]:
+    """Return the output of `image_to_data`, one line of words per item."""
+    data: dict[str, list[Any]] = {
+        key: []
+        for key in (
+            "text",
+            "conf",
+            "block_num",
+            "par_num",
+            "line_num",
+            "left",
+            "top",
+            "width",
+            "height",
+        )
+    }
+    for number, (text, confidence) in enumerate(lines, 1):
+        for i, word in enumerate(text.split()):
+            data["text"].append(word)
+            data["conf"].append(confidence)
+            data["block_num"].append(1)
+            data["par_num"].append(1)
+            data["line_num"].append(number)
+            data["left"].append(10 + 40 * i)
+            data["top"].append(20 * number)
+            data["width"].append(30)
+            data["height"].append(15)
+    return data
+
+
+class ReadKeysTest(unittest.TestCase):
+    def read_keys(
+        self, *pages: list[tuple[str, float]], upscaled: Any = None
+    ) -> tuple[list[str], mock.Mock]:
+        """Read a blank sheet as Tesseract reads `pages` in turn.
+
+        Returns: the keys, and the stub of Tesseract.
+        """
+        with mock.patch.object(
+            steam_key_ocr.pytesseract,
+            "image_to_data",
+            side_effect=[get_data(page) for page in pages],
+        ) as image_to_data:
+            keys = steam_key_ocr.read_keys(
+                np.full((200, 400), 255, np.uint8), upscaled
+            )
+        return keys, image_to_data
+
+    def test_confident_line(self):
+        keys, tesseract = self.read_keys([(KEY, 95)])
+        self.assertEqual(keys, [KEY])
+        self.assertEqual(tesseract.call_count, 1)
+
+    def test_low_confidence_line(self):
+        keys, tesseract = self.read_keys(
+            [(KEY, 95), (MISREAD, 40)], [(KEY, 90)]
+        )
+        self.assertEqual(keys, [KEY, KEY])
+        self.assertEqual(tesseract.call_count, 2)
+
+    def test_other_line(self):
+        keys, tesseract = self.read_keys([(TITLE, 30), (KEY, 95)])
+        self.assertEqual(keys, [KEY])
+        self.assertEqual(tesseract.call_count, 1)
+
+    def test_failed_line(self):
+        # every pass is tried, and the last reading is kept
+        keys, tesseract = self.read_keys(
+            [(KEY, 95), (MISREAD, 40)],
+            [(MISREAD, 50)],
+            [(MISREAD + "1", 60)],
+        )
+        self.assertEqual(keys, [KEY, MISREAD + "1"])
+        self.assertEqual(tesseract.call_count, len(steam_key_ocr.PASSES))
+
+    def test_upscaled(self):
+        # the last pass crops the upscaled image handed over
+        upscaled = np.full((640, 1280), 128, np.uint8)
+        keys, tesseract = self.read_keys(
+            [(KEY, 95), (MISREAD, 40)],
+            [(MISREAD, 50)],
+            [(KEY, 90)],
+            upscaled=upscaled,
+        )
+        self.assertEqual(keys, [KEY, KEY])
+        self.assertEqual(np.asarray(tesseract.call_args.args[0]).max(), 128)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+# pyright: reportUnknownMemberType=false
+"""SteamGifts Whitelist Candidates from the Cached Giveaway Entries.
+"""
+import argparse
+import time
+from collections.abc import Sequence
+from typing import NamedTuple, cast
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse
+
+import main as crawler
+
+
+class ExtractedArgs:
+    top: int
+    user: str | None
+
+
+class Incidence(NamedTuple):
+    """Giveaway x user matrices, with interned user IDs as columns."""
+
+    usernames: list[str]
+    entries: scipy.sparse.csr_array
+    wins: scipy.sparse.csr_array
+    trusted: npt.NDArray[np.bool_]
+
+
+class Candidate(NamedTuple):
+    username: str
+    entries: int
+    wins: int
+    overlap: int
+    score: float
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--top", type=int, default=50, help="Number of candidates to show."
+    )
+    ap.add_argument("--user", help="Show the top co-entrants of this user.")
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def load_cached_giveaways() -> list[crawler.Giveaway]:
+    with crawler.get_cache() as db:
+        return cast(
+            list[crawler.Giveaway], db.table(crawler.CACHE_GIVEAWAYS).all()
+        )
+
+
+def build_incidence(giveaways: Sequence[crawler.Giveaway]) -> Incidence:
+    """Build the entry and win matrices of `giveaways`.
+
+    Trusted users are the winners who received a gift and the creators who
+    sent one.
+    """
+    ids: dict[str, int] = {}
+    entries: tuple[list[int], list[int]] = ([], [])
+    wins: tuple[list[int], list[int]] = ([], [])
+    trusted: set[int] = set()
+    for row, giveaway in enumerate(giveaways):
+        for username in giveaway.get("entries", []):
+            entries[0].append(row)
+            entries[1].append(ids.setdefault(username, len(ids)))
+        for winner in giveaway.get("winners", []):
+            if winner["received"]:
+                wins[0].append(row)
+                wins[1].append(ids.setdefault(winner["username"], len(ids)))
+                trusted.add(wins[1][-1])
+        if giveaway.get("received"):
+            creator = giveaway["creator"]["username"]
+            trusted.add(ids.setdefault(creator, len(ids)))
+
+    shape = (len(giveaways), len(ids))
+
+    def to_csr(rows: list[int], cols: list[int]) -> scipy.sparse.csr_array:
+        # duplicates are summed, then counted once
+        matrix = scipy.sparse.csr_array(
+            (np.ones(len(rows), np.int32), (rows, cols)), shape=shape
+        )
+        matrix.data[:] = 1
+        return matrix
+
+    is_trusted = np.zeros(len(ids), np.bool_)
+    is_trusted[list(trusted)] = True
+    return Incidence(list(ids), to_csr(*entries), to_csr(*wins), is_trusted)
+
+
+def get_co_entries(
+    incidence: Incidence, username: str
+) -> list[tuple[str, int]]:
+    """Count the giveaways entered by `username` and each other user."""
+    user = incidence.usernames.index(username)
+    counts = incidence.entries.T @ incidence.entries[:, [user]].toarray()
+    counts = counts.ravel()
+    counts[user] = 0
+    order = np.flatnonzero(counts)
+    order = order[np.argsort(-counts[order], kind="stable")]
+    return [(incidence.usernames[i], int(counts[i])) for i in order]
+
+
+def rank_candidates(incidence: Incidence) -> list[Candidate]:
+    """Rank the entrants, trusted users excluded.
+
+    The score is the number of entries, plus the number of giveaways entered
+    along with the trusted users, averaged per trusted user.
+    """
+    entries = incidence.entries
+    entry_counts = np.asarray(entries.sum(axis=0)).ravel()
+    win_counts = np.asarray(incidence.wins.sum(axis=0)).ravel()
+    # trusted entrants per giveaway, joined back to every entrant
+    trusted_counts = entries @ incidence.trusted.astype(np.int32)
+    overlap = entries.T @ trusted_counts - entry_counts * incidence.trusted
+    scores = entry_counts + overlap / max(1, int(incidence.trusted.sum()))
+
+    candidates = np.flatnonzero(~incidence.trusted & (entry_counts > 0))
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [
+        Candidate(
+            incidence.usernames[i],
+            int(entry_counts[i]),
+            int(win_counts[i]),
+            int(overlap[i]),
+            float(scores[i]),
+        )
+        for i in candidates
+        if incidence.usernames[i] != crawler.SG_USER
+    ]
+
+
+def main(top: int, user: str | None = None):
+    start = time.perf_counter()
+    incidence = build_incidence(load_cached_giveaways())
+    giveaway_count, user_count = incidence.entries.shape
+    if user and user not in incidence.usernames:
+        print(f"{user} has not entered any cached giveaway.")
+    elif user:
+        print(f"Top co-entrants of {user}:")
+        for username, count in get_co_entries(incidence, user)[:top]:
+            print(f"{username:<25}{count:>8}")
+    else:
+        print(f"{"username":<25}{"entries":>8}{"wins":>8}{"overlap":>8}")
+        for candidate in rank_candidates(incidence)[:top]:
+            print(
+                f"{candidate.username:<25}{candidate.entries:>8}"
+                f"{candidate.wins:>8}{candidate.overlap:>8}"
+            )
+    print(
+        f"{user_count} users in {giveaway_count} giveaways,",
+        f"analyzed in {time.perf_counter() - start:.2f} s.",
+    )
+
+
+if __name__ == "__main__":
+    args: ExtractedArgs = parse_args()
+    main(args.top, args.user)
@@ -1,22 +1,38 @@
 # pyright: reportUnknownMemberType=false
 """SteamGifts Whitelist/Blacklist Suggestion.
 """
+
+from __future__ import annotations
+
 import argparse
 import datetime
-import json
+import itertools
 import logging
 import math
+import pathlib
 import sys
-from typing import Any, Literal, NotRequired, TypedDict, cast
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any, Literal, NotRequired, TypedDict, cast
 
-import bs4
-import pyrate_limiter
-import requests
-import requests_ratelimiter
 import tinydb
-import urllib3
 from tinydb import queries, table
-from urllib3 import util
+
+import planner
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+# pylint: disable-next=wrong-import-position
+from sgcommon import lazy, negcache, trace, userstore
+
+# not needed to plan from the cache, so only loaded when used
+if TYPE_CHECKING:
+    import bs4
+    import requests
+
+    from sgcommon import httpclient
+else:
+    bs4 = lazy.lazy_import("bs4")
+    requests = lazy.lazy_import("requests")
+    httpclient = lazy.lazy_import("sgcommon.httpclient")
 
 SG_USER = "ngoclong19"
 COOKIE_NAME = "PHPSESSID"
@@ -29,13 +45,25 @@ REQUEST_PER_SECOND = 4
 REQUEST_PER_MINUTE = 120
 REQUEST_PER_HOUR = 2400
 REQUEST_PER_DAY = 14400
+REQUEST_RATES: list[planner.Rate] = [
+    (REQUEST_PER_SECOND, 1),
+    (REQUEST_PER_MINUTE, 60),
+    (REQUEST_PER_HOUR, 3600),
+    (REQUEST_PER_DAY, 86400),
+]
 REQUEST_TIMEOUT = 13
+# the failed fetches are retried at the end, see `load_giveaways`
+REQUEST_RETRIES = 3
 
 CACHE_FILE = "data/cache.json"
 CACHE_LIVE_SECONDS = 7 * 24 * 3600
 CACHE_GIVEAWAYS = "giveaways"
+CACHE_QUOTA = "quota"
 CACHE_USERNAMES = "usernames"
 CACHE_USERS = "users"
+# shared with the whitelist manager
+NEGATIVE_CACHE_NAME = "users"
+USER_INFOS_TASK = "user infos"
 
 
 RequestMethod = Literal["head", "get"]
@@ -44,6 +72,8 @@ UserUpdateMode = Literal["default", "creator", "winner"]
 
 class ExtractedArgs:
     no_cache: bool
+    plan: bool
+    cache_only: bool
 
 
 class User(TypedDict):
@@ -71,6 +101,7 @@ class Giveaway(TypedDict):
     creator: User
     winners: NotRequired[list[Winner]]
     entries_page_offset: NotRequired[int]
+    entries: NotRequired[list[str]]
 
 
 def parse_args() -> ExtractedArgs:
@@ -81,6 +112,17 @@ def parse_args() -> ExtractedArgs:
         action="store_true",
         help="Disable the cache.",
     )
+    ap.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the crawl plan and its ETA, without crawling.",
+    )
+    ap.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Print the crawl plan of the cached giveaways, without any"
+        " request.",
+    )
     return ap.parse_args(namespace=ExtractedArgs())
 
 
@@ -92,6 +134,25 @@ def get_current_timestamp() -> int:
     return int(datetime.datetime.now(datetime.UTC).timestamp())
 
 
+def get_requests_today() -> int:
+    today = datetime.date.today().isoformat()
+    with get_cache() as db:
+        doc = db.table(CACHE_QUOTA).get(tinydb.Query()["date"] == today)
+    return cast(int, doc["requests"]) if doc else 0
+
+
+def add_requests_today(request_count: int):
+    """Count requests against the daily limit, which outlives a run."""
+    today = datetime.date.today().isoformat()
+    with get_cache() as db:
+        quota: table.Table = db.table(CACHE_QUOTA)
+        doc = quota.get(tinydb.Query()["date"] == today)
+        request_count += cast(int, doc["requests"]) if doc else 0
+        # the previous days are not needed anymore
+        quota.truncate()
+        quota.insert({"date": today, "requests": request_count})
+
+
 def get_log_formatter() -> logging.Formatter:
     # create formatter
     return logging.Formatter(
@@ -118,10 +179,16 @@ def get_logger() -> logging.Logger:
     return logger
 
 
-def init_session() -> requests.Session:
+def init_session() -> httpclient.Session:
+    # pylint: disable=import-outside-toplevel
+    import pyrate_limiter
+    import requests_ratelimiter
+    import urllib3.util
+
     urllib3.add_stderr_logger(logging.WARNING).setFormatter(get_log_formatter())
 
-    retry_strategy = util.Retry(total=500, backoff_factor=5)
+    # the daily limit outlives a run, so keep the persistent SQLite bucket
+    retry_strategy = urllib3.util.Retry(REQUEST_RETRIES, backoff_factor=1)
     adapter = requests_ratelimiter.LimiterAdapter(
         REQUEST_PER_SECOND,
         REQUEST_PER_MINUTE,
@@ -131,10 +198,11 @@ def init_session() -> requests.Session:
         max_retries=retry_strategy,
     )
 
-    session = requests.Session()
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-
+    session = httpclient.Session(
+        timeout=REQUEST_TIMEOUT,
+        adapter=adapter,
+        breaker=httpclient.CircuitBreaker(),
+    )
     session.cookies.set(COOKIE_NAME, COOKIE_VALUE)
     return session
 
@@ -148,13 +216,18 @@ def fetch_request(
     method: RequestMethod = "get",
 ) -> requests.Response:
     if method == "head":
-        return session.head(url, timeout=REQUEST_TIMEOUT)
-    return session.get(
-        url,
-        params=params,
-        timeout=REQUEST_TIMEOUT,
-        allow_redirects=allow_redirects,
-    )
+        r = session.head(url, timeout=REQUEST_TIMEOUT)
+    else:
+        r = session.get(
+            url,
+            params=params,
+            timeout=REQUEST_TIMEOUT,
+            allow_redirects=allow_redirects,
+        )
+    if httpclient.is_failure(r.status_code):
+        # not a page to parse, retried later
+        r.raise_for_status()
+    return r
 
 
 def is_logged_in(session: requests.Session) -> bool:
@@ -180,6 +253,7 @@ def fetch_giveaways(
     return fetch_request(session, url, params).json()["results"]
 
 
+@trace.traced("cache:user")
 def upsert_user(
     user: User,
     no_cache: bool = False,
@@ -225,6 +299,13 @@ def upsert_user(
         usernames.upsert({"username": user["username"]}, username_query)
 
 
+@trace.traced("parse:entries")
+def parse_entries(text: str) -> list[str]:
+    """Return the usernames of a giveaway entry page."""
+    soup = bs4.BeautifulSoup(text, "html.parser")
+    return [e.text for e in soup.select("a.table__column__heading")]
+
+
 def process_giveaway_entry_page(
     session: requests.Session, giveaway: Giveaway, page: int
 ) -> list[str]:
@@ -244,7 +325,7 @@ def process_giveaway_entry_page(
         params = {"page": page}
     r: requests.Response = fetch_request(session, url, params)
 
-    soup = bs4.BeautifulSoup(r.text, "html.parser")
+    entries = parse_entries(r.text)
     logger.info(
         # pylint: disable-next=line-too-long
         "Finished retrieving giveaway (ID: %d) entry page %d out of %d.",
@@ -252,39 +333,64 @@ def process_giveaway_entry_page(
         page,
         page_count,
     )
-    return [entry.text for entry in soup.select("a.table__column__heading")]
+    return entries
 
 
 def get_giveaway_entries(
-    session: requests.Session, giveaway: Giveaway, no_cache: bool = False
-) -> list[str]:
+    session: requests.Session,
+    giveaway: Giveaway,
+    no_cache: bool = False,
+    max_pages: int | None = None,
+) -> Iterator[list[str]]:
+    """Fetch the entries not retrieved yet, at most `max_pages` pages.
+
+    Every page is kept in the giveaway cache, for `analytics.py`, and in
+    `giveaway` before its entries are yielded, so that a failed fetch resumes
+    from the next page.
+    """
     logger: logging.Logger = get_logger()
     entries: list[str] = []
+    cached_entries: list[str] = [] if no_cache else giveaway.get("entries", [])
     page_offset = 1 if no_cache else giveaway.get("entries_page_offset", 0) + 1
+    giveaway["entries_page_offset"] = page_offset - 1
+    giveaway["entries"] = cached_entries
     page_count: int = math.ceil(giveaway["entry_count"] / 25)
+    last_page = page_count
+    if max_pages is not None:
+        last_page = min(page_count, page_offset + max_pages - 1)
 
-    with get_cache() as db:
-        logger.info(
-            "Retrieving a total of %d giveaway entry pages...",
-            page_count,
-        )
-        giveaways: table.Table = db.table(CACHE_GIVEAWAYS)
-        for page in range(page_offset, page_count + 1):
-            entries.extend(process_giveaway_entry_page(session, giveaway, page))
-            giveaways.update(
-                {"entries_page_offset": page},
+    logger.info(
+        "Retrieving a total of %d giveaway entry pages...",
+        page_count,
+    )
+    for page in range(page_offset, last_page + 1):
+        page_entries = process_giveaway_entry_page(session, giveaway, page)
+        entries.extend(page_entries)
+        giveaway["entries_page_offset"] = page
+        giveaway["entries"] = cached_entries + entries
+        # not kept open while the entries are processed
+        with get_cache() as db, trace.span("cache:giveaway"):
+            db.table(CACHE_GIVEAWAYS).update(
+                {
+                    "entries_page_offset": page,
+                    "entries": giveaway["entries"],
+                },
                 tinydb.Query()["id"] == giveaway["id"],
             )
-        logger.info(
-            "Finished retrieving a total of %d giveaway entry pages.",
-            page_count,
-        )
-    return entries
+        yield page_entries
+    logger.info(
+        "Finished retrieving a total of %d giveaway entry pages.",
+        page_count,
+    )
 
 
 def filter_ended_giveaways(
-    session: requests.Session, no_cache: bool = False
+    session: requests.Session | None, no_cache: bool = False
 ) -> list[Giveaway]:
+    """Return the ended giveaways, fetched again once all are outdated.
+
+    Without a session, the cached ones are kept, even if outdated.
+    """
     with get_cache() as db:
         giveaways: table.Table = db.table(CACHE_GIVEAWAYS)
         now: int = get_current_timestamp()
@@ -292,10 +398,10 @@ def filter_ended_giveaways(
         cond: queries.QueryInstance = (
             tinydb.Query()["end_timestamp"] >= now - CACHE_LIVE_SECONDS
         )
-        if no_cache or not giveaways.contains(cond):
+        if session and (no_cache or not giveaways.contains(cond)):
             # there are only outdated giveaways
             giveaways.truncate()
-        if not giveaways:
+        if session and not giveaways:
             # get created and won giveaways
             giveaways.insert_multiple(fetch_giveaways(session))
             giveaways.insert_multiple(fetch_giveaways(session, fetch_won=True))
@@ -306,7 +412,10 @@ def filter_ended_giveaways(
 
 
 def process_giveaway(
-    session: requests.Session, giveaway: Giveaway, no_cache: bool = False
+    session: requests.Session,
+    giveaway: Giveaway,
+    no_cache: bool = False,
+    max_pages: int | None = None,
 ):
     # load giveaway creator and winners
     creator: User = giveaway["creator"]
@@ -321,66 +430,203 @@ def process_giveaway(
             upsert_user(creator, no_cache, update_mode="creator")
 
     # load giveaway entries
-    for entry in get_giveaway_entries(session, giveaway, no_cache):
-        upsert_user({"username": entry, "steam_id": ""}, no_cache)
+    for entries in get_giveaway_entries(session, giveaway, no_cache, max_pages):
+        for entry in entries:
+            upsert_user({"username": entry, "steam_id": ""}, no_cache)
+
+
+def get_crawl_tasks(
+    giveaways: list[Giveaway], no_cache: bool = False
+) -> list[planner.Task]:
+    """List the remaining entry pages by giveaway, then the user infos.
+
+    The entries of the sent giveaways are worth more, then the latest ones.
+    The profiles still fresh in the shared store cost no request.
+    """
+    tasks: list[planner.Task] = []
+    giveaways = sorted(giveaways, key=lambda ga: ga["end_timestamp"])
+    for giveaway in reversed(giveaways):
+        page_offset = 0 if no_cache else giveaway.get("entries_page_offset", 0)
+        page_count = math.ceil(giveaway["entry_count"] / 25) - page_offset
+        if page_count > 0:
+            value = 2 if giveaway["creator"]["username"] == SG_USER else 1
+            tasks.append(planner.Task(str(giveaway["id"]), page_count, value))
+    negative_cache = negcache.NegativeCache(NEGATIVE_CACHE_NAME)
+    with (
+        get_cache() as db,
+        userstore.UserStore(ttl=CACHE_LIVE_SECONDS) as user_store,
+    ):
+        fresh = user_store.get_usernames(userstore.PROFILE)
+        user_count = sum(
+            doc["username"] not in negative_cache
+            and doc["username"] not in fresh
+            for doc in db.table(CACHE_USERNAMES)
+        )
+    if user_count:
+        tasks.append(planner.Task(USER_INFOS_TASK, user_count, 0.5))
+    return tasks
+
+
+def plan_giveaways(
+    giveaways_ended: list[Giveaway], no_cache: bool = False
+) -> planner.Plan:
+    plan = planner.get_plan(
+        get_crawl_tasks(giveaways_ended, no_cache),
+        REQUEST_RATES,
+        get_requests_today(),
+    )
+    planner.print_plan(plan)
+    return plan
 
 
-def load_giveaways(session: requests.Session, no_cache: bool = False):
-    """Fetch created and won giveaways."""
+def load_giveaways(
+    session: requests.Session, no_cache: bool = False, plan_only: bool = False
+) -> planner.Plan:
+    """Fetch created and won giveaways, as far as today's quota allows.
+
+    The remaining entry pages are planned again by the next run. A giveaway
+    whose entry page fails to load is resumed after the others.
+    Returns: the plan of today's crawl.
+    """
     logger: logging.Logger = get_logger()
     giveaways_ended: list[Giveaway] = filter_ended_giveaways(session, no_cache)
+    plan = plan_giveaways(giveaways_ended, no_cache)
+    if plan_only:
+        return plan
+
+    # loop over the planned giveaways
+    giveaways_by_id = {str(ga["id"]): ga for ga in giveaways_ended}
+    tasks = [task for task in plan.today if task.name in giveaways_by_id]
+    giveaway_count: int = len(tasks)
+    pages_left = {task.name: task.requests for task in tasks}
+    retry_queue = httpclient.RetryQueue[str]()
+
+    def crawl(giveaway: Giveaway, no_cache: bool) -> bool:
+        name = str(giveaway["id"])
+        offset = 0 if no_cache else giveaway.get("entries_page_offset", 0)
+        try:
+            process_giveaway(session, giveaway, no_cache, pages_left[name])
+        except requests.RequestException as error:
+            if not httpclient.is_transient(error):
+                raise
+            pages_left[name] -= giveaway.get("entries_page_offset", 0) - offset
+            if retry_queue.defer(name, error):
+                logger.warning(
+                    "Deferred end giveaway (ID: %d): %s", giveaway["id"], error
+                )
+            else:
+                logger.error(
+                    "Failed to retrieve end giveaway (ID: %d): %s",
+                    giveaway["id"],
+                    error,
+                )
+            return False
+        return True
 
-    # loop over ended giveaways
-    giveaways_ended.sort(key=lambda ga: ga["end_timestamp"])
-    giveaway_count: int = len(giveaways_ended)
     logger.info(
         "Retrieving a total of %d end giveaways...",
         giveaway_count,
     )
-    for index, giveaway in enumerate(giveaways_ended, start=1):
-        if (
-            giveaway.get("entries_page_offset", 0) * 25
-            >= giveaway["entry_count"]
-        ):
-            # skipped
-            continue
+    for index, task in enumerate(tasks, start=1):
+        giveaway = giveaways_by_id[task.name]
         logger.info(
             "Retrieving end giveaway %d out of %d (ID: %d)...",
             index,
             giveaway_count,
             giveaway["id"],
         )
-        process_giveaway(session, giveaway, no_cache)
-        logger.info(
-            "Finished retrieving end giveaway %d out of %d (ID: %d).",
-            index,
-            giveaway_count,
-            giveaway["id"],
-        )
+        if crawl(giveaway, no_cache):
+            logger.info(
+                "Finished retrieving end giveaway %d out of %d (ID: %d).",
+                index,
+                giveaway_count,
+                giveaway["id"],
+            )
+    for name in retry_queue:
+        giveaway = giveaways_by_id[name]
+        logger.info("Retrying end giveaway (ID: %d)...", giveaway["id"])
+        # resumed from the pages retrieved by the failed attempts
+        if crawl(giveaway, False):
+            logger.info(
+                "Finished retrying end giveaway (ID: %d).", giveaway["id"]
+            )
     logger.info(
         "Finished retrieving a total of %d end giveaways.",
         giveaway_count,
     )
+    return plan
 
 
-def load_user_infos(session: requests.Session):
-    with get_cache() as db:
+def fetch_profile_page(
+    session: requests.Session,
+    username: str,
+    negative_cache: negcache.NegativeCache,
+    user_store: userstore.UserStore,
+) -> str | None:
+    """Return the profile page of a user, from the shared store if fresh.
+
+    Return `None` for an invalid username, recorded in `negative_cache`.
+    """
+    field = user_store.get(username, userstore.PROFILE)
+    if field is not None:
+        return field.value
+    r = fetch_request(
+        session,
+        f"https://www.steamgifts.com/user/{username}",
+        allow_redirects=False,
+    )
+    if r.is_redirect:
+        negative_cache.add(username, r.status_code, r.headers.get("Location"))
+        return None
+    if r.status_code == 200:
+        user_store.put(username, userstore.PROFILE, r.text)
+    return r.text
+
+
+def load_user_infos(session: httpclient.Session, max_requests: int):
+    """Fetch the profiles of the cached usernames, up to `max_requests`.
+
+    The profiles still fresh in the shared store cost no request, so the next
+    run goes on from the first profile not fetched.
+    """
+    start_count = session.request_count
+    negative_cache = negcache.NegativeCache(NEGATIVE_CACHE_NAME)
+    with (
+        get_cache() as db,
+        userstore.UserStore(ttl=CACHE_LIVE_SECONDS) as user_store,
+    ):
         usernames = db.table(CACHE_USERNAMES)
+        retry_queue = httpclient.RetryQueue[str]()
 
-        for doc in usernames:
-            username = cast(str, doc["username"])
-            r = fetch_request(
-                session,
-                f"https://www.steamgifts.com/user/{username}",
-                allow_redirects=False,
-            )
-            if r.is_redirect:
+        # the failed profiles are retried last
+        for username in itertools.chain(
+            (cast(str, doc["username"]) for doc in usernames), retry_queue
+        ):
+            if username in negative_cache:
+                # known invalid username
+                continue
+            if session.request_count - start_count >= max_requests:
+                break
+            try:
+                page = fetch_profile_page(
+                    session, username, negative_cache, user_store
+                )
+            except requests.RequestException as error:
+                if not httpclient.is_transient(error):
+                    raise
+                if not retry_queue.defer(username, error):
+                    get_logger().error(
+                        "Failed to retrieve user %s: %s", username, error
+                    )
+                continue
+            if page is None:
                 # invalid username
                 continue
 
             user_stats = {}
-            soup = bs4.BeautifulSoup(r.text, "html.parser")
-            rows = soup.select(".featured__table__row")
+            with trace.span("parse:user"):
+                soup = bs4.BeautifulSoup(page, "html.parser")
+                rows = soup.select(".featured__table__row")
             for row in rows:
                 row_left = row.select_one(".featured__table__row__left")
                 row_right = row.select_one(".featured__table__row__right")
@@ -404,16 +650,6 @@ def load_user_infos(session: requests.Session):
                     case "Giveaways Entered":
                         user_stats["entered"] = row_right.text
                     case "Gifts Won":
-                        if row_right.span and row_right.span.span:
-                            # tooltip_data = cast(
-                            #     str, row_right.span.span["data-ui-tooltip"]
-                            # )
-                            tooltip_data = json.loads(
-                                cast(
-                                    str, row_right.span.span["data-ui-tooltip"]
-                                )
-                            )["rows"]
-                            print(tooltip_data)
                         user_stats["won"] = {
                             "count": 0,
                             "full": 0,
@@ -438,20 +674,34 @@ def load_user_infos(session: requests.Session):
                         user_stats["level"] = 0
                     case _:
                         pass
-            print(username)
-            print(user_stats)
-            break
+            get_logger().debug("User %s: %s", username, user_stats)
 
 
-def main(no_cache: bool = False):
-    session: requests.Session = init_session()
-    if not is_logged_in(session):
-        print("Logged out. Please update PHPSESSID cookie value.")
-        sys.exit(1)
-    load_giveaways(session, no_cache)
-    load_user_infos(session)
+def main(
+    no_cache: bool = False, plan_only: bool = False, cache_only: bool = False
+):
+    if cache_only:
+        plan_giveaways(filter_ended_giveaways(None))
+        return
+    session: httpclient.Session = init_session()
+    try:
+        if not is_logged_in(session):
+            print("Logged out. Please update PHPSESSID cookie value.")
+            sys.exit(1)
+        plan = load_giveaways(session, no_cache, plan_only)
+        if not plan_only:
+            load_user_infos(
+                session,
+                sum(
+                    task.requests
+                    for task in plan.today
+                    if task.name == USER_INFOS_TASK
+                ),
+            )
+    finally:
+        add_requests_today(session.request_count)
 
 
 if __name__ == "__main__":
     args: ExtractedArgs = parse_args()
-    main(args.no_cache)
+    main(args.no_cache, args.plan, args.cache_only)
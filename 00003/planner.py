@@ -0,0 +1,87 @@
+"""Crawl Planning within Layered Request Limits.
+"""
+from collections.abc import Sequence
+from typing import NamedTuple
+
+Rate = tuple[int, float]  # (requests, per seconds)
+
+
+class Task(NamedTuple):
+    name: str
+    requests: int
+    value: float  # per request
+
+
+class Plan(NamedTuple):
+    today: list[Task]
+    deferred: list[Task]
+    eta: float  # seconds, to send every request
+    today_eta: float  # seconds, to send the requests of today
+
+
+def get_eta(request_count: int, rates: Sequence[Rate], used: int = 0) -> float:
+    """Simulate the seconds until `request_count` requests are sent.
+
+    Each window lets its limit of requests go in a burst, then waits for the
+    next window. `used` requests already count in the longest window.
+    """
+    if request_count <= 0:
+        return 0
+    longest = max(seconds for _, seconds in rates)
+    return max(
+        (request_count - 1 + (used if seconds == longest else 0))
+        // limit
+        * seconds
+        for limit, seconds in rates
+    )
+
+
+def get_plan(
+    tasks: Sequence[Task], rates: Sequence[Rate], used: int = 0
+) -> Plan:
+    """Fit the most valuable tasks in the quota left in the longest window.
+
+    A task that does not fit is split, and its remaining requests deferred to
+    the next window.
+    """
+    longest = max(seconds for _, seconds in rates)
+    quota = max(
+        0, min(limit for limit, seconds in rates if seconds == longest) - used
+    )
+    today: list[Task] = []
+    deferred: list[Task] = []
+    # stable, so the given order breaks ties
+    for task in sorted(tasks, key=lambda task: task.value, reverse=True):
+        request_count = min(task.requests, quota)
+        quota -= request_count
+        if request_count:
+            today.append(task._replace(requests=request_count))
+        if request_count < task.requests:
+            deferred.append(
+                task._replace(requests=task.requests - request_count)
+            )
+    return Plan(
+        today,
+        deferred,
+        get_eta(sum(task.requests for task in tasks), rates, used),
+        get_eta(sum(task.requests for task in today), rates, used),
+    )
+
+
+def format_duration(seconds: float) -> str:
+    days, seconds = divmod(int(seconds), 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{f"{days}d " if days else ""}{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def print_plan(plan: Plan):
+    today = sum(task.requests for task in plan.today)
+    deferred = sum(task.requests for task in plan.deferred)
+    print(
+        f"Plan: {today} requests today, in {format_duration(plan.today_eta)},",
+        f"{deferred} deferred.",
+        f"ETA of the whole crawl: {format_duration(plan.eta)}.",
+    )
+    for task in plan.today:
+        print(f"- {task.name}: {task.requests} requests")
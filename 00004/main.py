@@ -1,26 +1,86 @@
-import time
+import argparse
 
-import requests
 import urllib3
 import urllib3.exceptions
 
+import solver
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-url = "https://www.2solve.me/api/quiz-attempt/anonymous/e031c847"
-payload = {
+URL = "https://www.2solve.me/api/quiz-attempt/anonymous/e031c847"
+PAYLOAD = {
     "anonymousClientKey": "6koke",
     "quizId": 188,
     "quizQuestionId": 701,
 }
 
-i = 0
-while True:
-    payload["answer"] = str(i)
-    r = requests.post(url, json=payload, timeout=2, verify=False)
-    if not i % 10:
-        print(i)
-    if r.json()["isCorrect"]:
-        print(i)
-        break
-    i += 1
-    time.sleep(5)
+
+class ExtractedArgs:
+    url: str
+    start: int
+    stop: int | None
+    wordlist: list[str]
+    hint: list[str]
+    delay: float
+    max_attempts: int | None
+    checkpoint: str
+    dry_run: int
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default=URL, help="Quiz-attempt endpoint.")
+    ap.add_argument("--start", type=int, default=0, help="First number.")
+    ap.add_argument("--stop", type=int, help="Last number (excluded).")
+    ap.add_argument(
+        "--wordlist", action="append", default=[], help="Words file."
+    )
+    ap.add_argument(
+        "--hint", action="append", default=[], help="Hint such as `1?3?`."
+    )
+    ap.add_argument("--delay", type=float, default=5, help="Seconds.")
+    ap.add_argument("--max-attempts", type=int)
+    ap.add_argument(
+        "--checkpoint",
+        default="checkpoint.jsonl",
+        help="Tried answers, by URL and quiz.",
+    )
+    ap.add_argument(
+        "--dry-run",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Print the first N answers of the search order and exit.",
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def main(args: ExtractedArgs):
+    candidates = solver.search_order(
+        *(solver.hint_pattern(hint) for hint in args.hint),
+        *(solver.wordlist(file) for file in args.wordlist),
+        solver.numeric_range(args.start, args.stop),
+    )
+    if args.dry_run:
+        for _, (answer, likelihood) in zip(range(args.dry_run), candidates):
+            print(f"{answer}\t{likelihood:.4f}")
+        return
+
+    checkpoint = solver.Checkpoint(
+        args.checkpoint, solver.get_target(args.url, PAYLOAD)
+    )
+    with solver.init_session(args.delay, verify=False) as session:
+        answer = solver.solve(
+            session,
+            args.url,
+            PAYLOAD,
+            candidates,
+            checkpoint,
+            args.max_attempts,
+        )
+    print(f"Answer: {answer}" if answer is not None else "No answer found.")
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,147 @@
+"""Search an answer with as few quiz attempts as possible.
+
+Candidates come from several sources, each yielding `(answer, likelihood)`
+pairs in decreasing likelihood. The sources are merged into one search order,
+every attempt is checkpointed and a single pooled session, which also paces
+the attempts, is reused.
+"""
+
+import heapq
+import itertools
+import json
+import math
+import pathlib
+import sys
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+import requests
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+# pylint: disable-next=wrong-import-position
+from sgcommon import httpclient
+
+REQUEST_TIMEOUT = 2  # seconds
+
+Candidate = tuple[str, float]
+
+
+def numeric_range(
+    start: int = 0, stop: int | None = None, weight: float = 1
+) -> Iterator[Candidate]:
+    """Numbers from `start`, the smaller ones being the more likely."""
+    numbers = itertools.count(start) if stop is None else range(start, stop)
+    for n in numbers:
+        yield str(n), weight / (1 + math.log1p(n - start))
+
+
+def wordlist(file: str, weight: float = 1) -> Iterator[Candidate]:
+    """Words of a file, one per line, the first ones being the more likely."""
+    with open(file, encoding="utf-8") as f:
+        for rank, line in enumerate(f):
+            if word := line.strip():
+                yield word, weight / (1 + math.log1p(rank))
+
+
+def hint_pattern(
+    pattern: str, alphabet: str = "0123456789", weight: float = 1
+) -> Iterator[Candidate]:
+    """Expand the `?` wildcards of a hint, e.g. `1?3?`, over `alphabet`."""
+    parts = [alphabet if char == "?" else char for char in pattern]
+    for chars in itertools.product(*parts):
+        yield "".join(chars), weight
+
+
+def search_order(*sources: Iterable[Candidate]) -> Iterator[Candidate]:
+    """Merge the sources by likelihood, dropping duplicate answers."""
+    seen: set[str] = set()
+    for answer, likelihood in heapq.merge(*sources, key=lambda c: -c[1]):
+        if answer not in seen:
+            seen.add(answer)
+            yield answer, likelihood
+
+
+def get_target(url: str, payload: dict[str, Any]) -> str:
+    """Identify a quiz by its endpoint and the payload of its attempts."""
+    return f"{url} {json.dumps(payload, sort_keys=True)}"
+
+
+class Checkpoint:
+    """Answers already tried on `target`, appended to a JSON lines file.
+
+    The answers tried on other targets, such as a stand-in endpoint, are kept
+    in the file but ignored.
+    """
+
+    def __init__(self, file: str, target: str):
+        self.file = pathlib.Path(file)
+        self.target = target
+        self.tried: dict[str, bool] = {}
+        if self.file.is_file():
+            with open(self.file, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("target") == target:
+                        self.tried[record["answer"]] = record["correct"]
+
+    @property
+    def answer(self) -> str | None:
+        return next((a for a, correct in self.tried.items() if correct), None)
+
+    def add(self, answer: str, correct: bool):
+        self.tried[answer] = correct
+        record = {"target": self.target, "answer": answer, "correct": correct}
+        with open(self.file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def init_session(delay: float = 5, verify: bool = True) -> requests.Session:
+    """Return a session sending at most one attempt every `delay` seconds."""
+    session = httpclient.Session(
+        timeout=REQUEST_TIMEOUT,
+        retry=0,
+        rates=[(1, delay)] if delay > 0 else [],
+        pool_maxsize=1,
+    )
+    session.verify = verify
+    return session
+
+
+def attempt(
+    session: requests.Session,
+    url: str,
+    payload: dict[str, Any],
+    answer: str,
+) -> bool:
+    r = session.post(url, json=payload | {"answer": answer})
+    r.raise_for_status()
+    return bool(r.json()["isCorrect"])
+
+
+def solve(
+    session: requests.Session,
+    url: str,
+    payload: dict[str, Any],
+    candidates: Iterable[Candidate],
+    checkpoint: Checkpoint,
+    max_attempts: int | None = None,
+) -> str | None:
+    """Try the candidates in order, skipping the checkpointed ones."""
+    if checkpoint.target != get_target(url, payload):
+        raise ValueError(f"The checkpoint is for {checkpoint.target}.")
+    if (answer := checkpoint.answer) is not None:
+        return answer
+    attempts = 0
+    for answer, _ in candidates:
+        if answer in checkpoint.tried:
+            continue
+        if max_attempts is not None and attempts >= max_attempts:
+            break
+        correct = attempt(session, url, payload, answer)
+        checkpoint.add(answer, correct)
+        attempts += 1
+        if not attempts % 10:
+            print(f"{attempts} attempts, last answer {answer}.")
+        if correct:
+            return answer
+    return None
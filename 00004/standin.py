@@ -0,0 +1,57 @@
+"""Local stand-in for the quiz-attempt endpoint, to test the solver.
+
+Execute:
+`python standin.py 1234`, then `python main.py --url http://127.0.0.1:8004/`
+"""
+
+import argparse
+import http.server
+import json
+
+
+class ExtractedArgs:
+    answer: str
+    port: int
+
+
+class QuizHandler(http.server.BaseHTTPRequestHandler):
+    """Tell whether the answer of each attempt is `answer`, and count them."""
+
+    answer = ""
+    attempts = 0
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        QuizHandler.attempts += 1
+        body = json.dumps(
+            {"isCorrect": payload.get("answer") == self.answer}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        print(f"Attempt {QuizHandler.attempts}: {payload.get("answer")}")
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("answer", help="The correct answer.")
+    ap.add_argument("--port", type=int, default=8004)
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def main(answer: str, port: int = 8004):
+    QuizHandler.answer = answer
+    with http.server.HTTPServer(("127.0.0.1", port), QuizHandler) as server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    extracted_args = parse_args()
+    main(extracted_args.answer, extracted_args.port)
@@ -0,0 +1,68 @@
+"""Tests of the solver, against stand-in quiz endpoints.
+"""
+
+import contextlib
+import http.server
+import io
+import pathlib
+import tempfile
+import threading
+import unittest
+
+import solver
+import standin
+
+
+class SolveTest(unittest.TestCase):
+    def serve(self, answer: str) -> str:
+        """Start a stand-in endpoint for `answer`, and return its URL."""
+        handler = type("Handler", (standin.QuizHandler,), {"answer": answer})
+        server = http.server.HTTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_port}/"
+
+    def solve(self, url: str, file: str) -> tuple[str | None, int]:
+        """Return the answer, and the count of attempts sent."""
+        payload = {"quizId": 1}
+        checkpoint = solver.Checkpoint(file, solver.get_target(url, payload))
+        before = standin.QuizHandler.attempts
+        with (
+            solver.init_session(delay=0) as session,
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            answer = solver.solve(
+                session,
+                url,
+                payload,
+                solver.numeric_range(0, 100),
+                checkpoint,
+            )
+        return answer, standin.QuizHandler.attempts - before
+
+    def test_checkpoint_by_target(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file = str(pathlib.Path(directory.name) / "checkpoint.jsonl")
+        first, second = self.serve("12"), self.serve("34")
+
+        self.assertEqual(self.solve(first, file), ("12", 13))
+        # the answer of the stand-in is not taken for the other target
+        self.assertEqual(self.solve(second, file), ("34", 35))
+        self.assertEqual(self.solve(first, file), ("12", 0))
+
+    def test_other_target(self):
+        checkpoint = solver.Checkpoint(
+            "checkpoint.jsonl", solver.get_target("http://a/", {})
+        )
+        with (
+            solver.init_session(delay=0) as session,
+            self.assertRaises(ValueError),
+        ):
+            solver.solve(session, "http://b/", {}, [], checkpoint)
+
+
+if __name__ == "__main__":
+    unittest.main()
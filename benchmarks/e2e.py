@@ -0,0 +1,215 @@
+"""End-to-end benchmarks of the crawlers on recorded HTTP archives.
+
+Every scenario replays the archive `benchmarks/data/<scenario>.zip`, recorded
+beforehand with `SG_HTTP_RECORD` (see `sgcommon.replay`), or else the
+synthetic one of `benchmarks/archives`, built by `synthetic.py`. It reports
+its wall time, request count, requests per second and optionally its peak
+memory.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import logging
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from types import ModuleType
+from typing import Any, NamedTuple
+
+import requests
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DATA_DIR = pathlib.Path(__file__).resolve().parent / "data"
+ARCHIVES_DIR = pathlib.Path(__file__).resolve().parent / "archives"
+REPLAY_CACHE_LIVE = 100 * 365  # days
+
+sys.path.append(str(ROOT))
+# pylint: disable-next=wrong-import-position
+from sgcommon import httpclient, negcache, replay
+
+
+class ExtractedArgs:
+    scenarios: list[str]
+    latency: float
+    rate: float
+    memory: bool
+
+
+class Scenario(NamedTuple):
+    name: str
+    run: Callable[[requests.Session], Any]
+
+
+class Result(NamedTuple):
+    name: str
+    seconds: float
+    requests: int
+    peak_memory: int | None
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "scenarios", nargs="*", help="Scenarios to run, all by default."
+    )
+    ap.add_argument(
+        "--latency", type=float, default=0, help="Seconds per response."
+    )
+    ap.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="Requests per second allowed per host, 429 beyond.",
+    )
+    ap.add_argument(
+        "--memory", action="store_true", help="Trace the peak memory."
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def load_tool(name: str, path: str) -> ModuleType:
+    """Import the script `path`, relative to the repository, as `name`."""
+    file = ROOT / path
+    sys.path.insert(0, str(file.parent))
+    spec = importlib.util.spec_from_file_location(name, file)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_fetchmb(session: requests.Session):
+    fetchmb = load_tool("fetchmb", "00001/fetchmb.py")
+    fetchmb.get_session = lambda: session
+    # the pages keep their creation time, which must not look stale later
+    fetchmb.MAX_CACHE_LIVE = REPLAY_CACHE_LIVE
+    fetchmb.main(1990, r"^[a-z]{4}$")
+
+
+def run_giveaways(session: requests.Session):
+    giveaways = load_tool("giveaways", "00003/main.py")
+    giveaways.load_giveaways(session)
+    # planned again, with the usernames of the entries just crawled
+    plan = giveaways.plan_giveaways(giveaways.filter_ended_giveaways(None))
+    giveaways.load_user_infos(
+        session,
+        sum(
+            task.requests
+            for task in plan.today
+            if task.name == giveaways.USER_INFOS_TASK
+        ),
+    )
+
+
+def run_whitelist_manager(session: requests.Session):
+    whitelist = load_tool(
+        "whitelist_manager", "tools/whitelist_manager/main.py"
+    )
+    whitelist.process_list(session, whitelist.export_list(session))
+    whitelist.load_my_profile(session)
+
+
+SCENARIOS = [
+    Scenario("fetchmb", run_fetchmb),
+    Scenario("giveaways", run_giveaways),
+    Scenario("whitelist_manager", run_whitelist_manager),
+]
+
+
+@contextlib.contextmanager
+def in_temp_dir() -> Iterator[None]:
+    """Run in an empty folder, so that the tool caches start empty.
+
+    The caches shared by the tools, see `sgcommon.negcache`, are also kept
+    in this folder.
+    """
+    cwd = os.getcwd()
+    cache_dir = os.environ.get(negcache.ENV_CACHE_DIR)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+        os.environ[negcache.ENV_CACHE_DIR] = temp_dir
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+            if cache_dir is None:
+                del os.environ[negcache.ENV_CACHE_DIR]
+            else:
+                os.environ[negcache.ENV_CACHE_DIR] = cache_dir
+
+
+def get_archive(name: str) -> pathlib.Path | None:
+    """The recorded archive of a scenario, or else its synthetic one."""
+    for folder in (DATA_DIR, ARCHIVES_DIR):
+        if (file := folder / f"{name}.zip").is_file():
+            return file
+    return None
+
+
+def run_scenario(
+    scenario: Scenario,
+    archive: pathlib.Path,
+    latency: float,
+    rate: float,
+    memory: bool,
+) -> Result:
+    adapter = replay.ReplayAdapter(
+        str(archive), latency, replay.get_rates(rate)
+    )
+    session = httpclient.Session(adapter=adapter)
+    if memory:
+        tracemalloc.start()
+    with in_temp_dir():
+        start = time.perf_counter()
+        scenario.run(session)
+        seconds = time.perf_counter() - start
+    peak_memory = None
+    if memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return Result(scenario.name, seconds, adapter.request_count, peak_memory)
+
+
+def print_results(results: list[Result]):
+    print(
+        f"{"scenario":<20}{"wall s":>10}{"requests":>10}{"req/s":>10}"
+        f"{"peak MiB":>10}"
+    )
+    for result in results:
+        memory = (
+            "-"
+            if result.peak_memory is None
+            else f"{result.peak_memory / 2**20:.1f}"
+        )
+        print(
+            f"{result.name:<20}{result.seconds:>10.2f}{result.requests:>10}"
+            f"{result.requests / result.seconds:>10.1f}{memory:>10}"
+        )
+
+
+def main(args: ExtractedArgs):
+    logging.disable(logging.INFO)
+    results: list[Result] = []
+    for scenario in SCENARIOS:
+        if args.scenarios and scenario.name not in args.scenarios:
+            continue
+        if (archive := get_archive(scenario.name)) is None:
+            print(f"Skip `{scenario.name}`: no archive.")
+            continue
+        print(f"Replay `{archive.relative_to(ROOT)}`.")
+        results.append(
+            run_scenario(
+                scenario, archive, args.latency, args.rate, args.memory
+            )
+        )
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,271 @@
+"""Microbenchmarks of the CPU-bound functions of the tools.
+
+Every benchmark times one call of a parser or a scoring function on the
+checked-in pages of `benchmarks/fixtures` (and the sheets of `00002/data`),
+best of several rounds. `--save` stores the results as the baseline, then a
+run fails when a function is slower than its baseline by more than the
+threshold.
+"""
+
+import argparse
+import functools
+import json
+import pathlib
+import random
+import sys
+import timeit
+from collections.abc import Callable
+from types import ModuleType
+from typing import Any, NamedTuple
+
+import cv2
+
+from e2e import DATA_DIR, ROOT, in_temp_dir, load_tool
+
+FIXTURES_DIR = pathlib.Path(__file__).resolve().parent / "fixtures"
+BASELINE_FILE = DATA_DIR / "micro_baseline.json"
+ROUNDS = 5
+THRESHOLD = 0.25  # slower than the baseline by 25%
+USER_COUNT = 1000  # cached users, for the scoring
+
+
+class ExtractedArgs:
+    benchmarks: list[str]
+    baseline: str
+    rounds: int
+    save: bool
+    threshold: float
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # prepare the inputs, and return the call to time
+    setup: Callable[[], Callable[[], Any]]
+
+
+class Result(NamedTuple):
+    name: str
+    seconds: float  # per call
+    baseline: float | None
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "benchmarks", nargs="*", help="Benchmarks to run, all by default."
+    )
+    ap.add_argument("--baseline", default=str(BASELINE_FILE))
+    ap.add_argument(
+        "--rounds",
+        type=int,
+        default=ROUNDS,
+        help="Rounds per benchmark, the best is kept.",
+    )
+    ap.add_argument(
+        "--save",
+        action="store_true",
+        help="Store the results as the baseline, instead of checking them.",
+    )
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="Slowdown allowed over the baseline, as a fraction.",
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+@functools.cache
+def get_tool(name: str) -> ModuleType:
+    paths = {
+        "fetchmb": "00001/fetchmb.py",
+        "giveaways": "00003/main.py",
+        "steam_key_ocr": "00002/steam_key_ocr.py",
+        "whitelist": "tools/whitelist_manager/main.py",
+    }
+    return load_tool(name, paths[name])
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+
+def setup_load_profile() -> Callable[[], Any]:
+    whitelist = get_tool("whitelist")
+    page = read_fixture("sg_profile.html")
+    return lambda: whitelist.load_profile(page)
+
+
+def setup_check_not_activated() -> Callable[[], Any]:
+    whitelist = get_tool("whitelist")
+    page = read_fixture("sgtools_nonactivated.html")
+    return lambda: whitelist.check_not_activated(page)
+
+
+def setup_check_multiple() -> Callable[[], Any]:
+    whitelist = get_tool("whitelist")
+    page = read_fixture("sgtools_multiple.html")
+    return lambda: whitelist.check_multiple(page)
+
+
+def setup_add_sent_won_ratio() -> Callable[[], Any]:
+    whitelist = get_tool("whitelist")
+    profile = whitelist.load_profile(read_fixture("sg_profile.html"))
+    return lambda: whitelist.add_sent_won_ratio(profile)
+
+
+def setup_filter_users_conditions() -> Callable[[], Any]:
+    """The limits of `USER_COUNT` cached users, without stored sketches."""
+    whitelist = get_tool("whitelist")
+    profile = whitelist.load_profile(read_fixture("sg_profile.html"))
+    whitelist.add_sent_won_ratio(profile)
+    rng = random.Random(0)
+    users = {
+        f"user{i:05d}": {
+            "profile": profile,
+            "namwc": {
+                "not_activated": ["game"] * rng.randint(0, 20),
+                "multiple": ["game"] * rng.randint(0, 3),
+            },
+        }
+        for i in range(USER_COUNT)
+    }
+    data = {"my_profile": profile, "users": users}
+    return lambda: whitelist.filter_users_conditions(data)
+
+
+def setup_parse_entries() -> Callable[[], Any]:
+    giveaways = get_tool("giveaways")
+    page = read_fixture("sg_entries.html")
+    return lambda: giveaways.parse_entries(page)
+
+
+def setup_upsert_user() -> Callable[[], Any]:
+    """One entry page of known usernames, in a cache of `USER_COUNT`."""
+    giveaways = get_tool("giveaways")
+    entries = giveaways.parse_entries(read_fixture("sg_entries.html"))
+    with giveaways.get_cache() as db:
+        db.table(giveaways.CACHE_USERNAMES).insert_multiple(
+            {"username": f"cached{i:05d}"} for i in range(USER_COUNT)
+        )
+
+    def run():
+        for entry in entries:
+            giveaways.upsert_user({"username": entry, "steam_id": ""})
+
+    return run
+
+
+def setup_update_store() -> Callable[[], Any]:
+    fetchmb = get_tool("fetchmb")
+    page = json.loads(read_fixture("mb_recordings.json"))
+    query = fetchmb.get_query(1990)
+
+    def run():
+        store = {
+            "recordings": {},
+            "queries": {query: fetchmb.init_query_index()},
+            "partitions": {},
+        }
+        fetchmb.update_store(store, query, page)
+
+    return run
+
+
+def setup_preprocess() -> Callable[[], Any]:
+    steam_key_ocr = get_tool("steam_key_ocr")
+    gray = cv2.imread(
+        str(ROOT / "00002/data/97C3MPJ.png"), cv2.IMREAD_GRAYSCALE
+    )
+    return lambda: steam_key_ocr.preprocess(gray)
+
+
+BENCHMARKS = [
+    Benchmark("whitelist.load_profile", setup_load_profile),
+    Benchmark("whitelist.check_not_activated", setup_check_not_activated),
+    Benchmark("whitelist.check_multiple", setup_check_multiple),
+    Benchmark("whitelist.add_sent_won_ratio", setup_add_sent_won_ratio),
+    Benchmark(
+        "whitelist.filter_users_conditions", setup_filter_users_conditions
+    ),
+    Benchmark("giveaways.parse_entries", setup_parse_entries),
+    Benchmark("giveaways.upsert_user", setup_upsert_user),
+    Benchmark("fetchmb.update_store", setup_update_store),
+    Benchmark("steam_key_ocr.preprocess", setup_preprocess),
+]
+
+
+def time_call(call: Callable[[], Any], rounds: int) -> float:
+    """Return the best time of one call, in seconds."""
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    return min(timer.repeat(rounds, number)) / number
+
+
+def load_baseline(file: str) -> dict[str, float]:
+    if not pathlib.Path(file).is_file():
+        return {}
+    with open(file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(file: str, results: list[Result]):
+    """Store the results, along with the baselines of the other benchmarks."""
+    baseline = load_baseline(file) | {r.name: r.seconds for r in results}
+    pathlib.Path(file).parent.mkdir(parents=True, exist_ok=True)
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def get_change(result: Result) -> float | None:
+    if result.baseline is None:
+        return None
+    return result.seconds / result.baseline - 1
+
+
+def print_results(results: list[Result], threshold: float):
+    print(f"{"benchmark":<36}{"us/call":>12}{"baseline":>12}{"change":>10}")
+    for result in results:
+        change = get_change(result)
+        baseline = (
+            "-" if result.baseline is None else f"{result.baseline*1e6:.1f}"
+        )
+        flag = " !" if change is not None and change > threshold else ""
+        print(
+            f"{result.name:<36}{result.seconds * 1e6:>12.1f}{baseline:>12}"
+            f"{"-" if change is None else f"{change:+.1%}":>10}{flag}"
+        )
+
+
+def main(args: ExtractedArgs) -> int:
+    baseline = load_baseline(args.baseline)
+    results: list[Result] = []
+    with in_temp_dir():
+        for benchmark in BENCHMARKS:
+            if args.benchmarks and benchmark.name not in args.benchmarks:
+                continue
+            seconds = time_call(benchmark.setup(), args.rounds)
+            results.append(
+                Result(benchmark.name, seconds, baseline.get(benchmark.name))
+            )
+    print_results(results, args.threshold)
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"Baseline saved to `{args.baseline}`.")
+        return 0
+    regressions = [
+        r.name for r in results if (get_change(r) or 0) > args.threshold
+    ]
+    if regressions:
+        print(
+            f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:"
+            f" {", ".join(regressions)}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,311 @@
+"""Build the synthetic archives of the end-to-end benchmarks.
+
+The pages are fabricated from a fixed seed in the shape of the MusicBrainz,
+SteamGifts and SGTools ones, so they hold no personal data. Every scenario of
+`e2e.py` is run once against them through a `RecordingAdapter`, so its archive
+holds exactly the requests it sends, and is written to `benchmarks/archives`.
+"""
+
+import html
+import json
+import pathlib
+import random
+import sys
+import urllib.parse
+from collections.abc import Mapping
+from typing import Any, NamedTuple
+
+import requests
+import requests.adapters
+import requests.structures
+import requests.utils
+
+from e2e import ARCHIVES_DIR, ROOT, SCENARIOS, in_temp_dir
+
+sys.path.append(str(ROOT))
+# pylint: disable-next=wrong-import-position
+from sgcommon import httpclient, replay
+
+SEED = 2026
+NOW = 1_790_000_000  # the giveaways ended before
+USER_COUNT = 150
+INVALID_USERS = 5  # redirected to the home page
+WHITELIST_SIZE = 60
+ENTRIES_PER_PAGE = 25
+WHITELIST_PER_PAGE = 25
+MB_COUNT = 450  # recordings of the year query
+MB_PAGE = 100
+SG_USER = "ngoclong19"  # the account of `00003/main.py`
+MY_USERNAME = "benchmark"
+WORDS = (
+    "love rock home fire rain blue gold time road wind dark star moon "
+    "heart night dream city light river train wild king baby girl song"
+).split()
+
+
+class Page(NamedTuple):
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+
+def get_tooltip(rows: list[tuple[str, str]]) -> str:
+    data = {"rows": [{"columns": [{"name": n}, {"name": v}]} for n, v in rows]}
+    return html.escape(json.dumps(data), quote=True)
+
+
+def get_row(name: str, right: str) -> str:
+    return (
+        '<div class="featured__table__row">'
+        f'<div class="featured__table__row__left">{name}</div>'
+        f'<div class="featured__table__row__right">{right}</div></div>'
+    )
+
+
+def get_profile_page(rng: random.Random) -> str:
+    won = rng.choice([0, 0, rng.randint(1, 5), rng.randint(1, 40)])
+    sent = rng.randint(0, 60)
+    registered = NOW - rng.randint(30, 10 * 365) * 86400
+
+    def values(rows: list[tuple[str, str]], count: int) -> str:
+        real = get_tooltip([("Real", f"${count * 9.5:,.2f}")])
+        return (
+            f'<span data-ui-tooltip="{get_tooltip(rows)}">{count}</span> '
+            f'<span data-ui-tooltip="{real}">${count * 10:,.2f}</span>'
+        )
+
+    won_rows = [("Total", str(won)), ("Full", str(won))] + [
+        (name, "0") for name in ("Reduced", "Zero", "Not Received")
+    ]
+    sent_rows = [("Total", str(sent)), ("Full", str(sent))] + [
+        (name, "0") for name in ("Reduced", "Zero", "Awaiting", "Not Received")
+    ]
+    return (
+        "<html><body><div class='featured__table'>"
+        + get_row("Registered", f'<span data-timestamp="{registered}">x</span>')
+        + get_row("Last Online", f'<span data-timestamp="{NOW}">now</span>')
+        + get_row("Role", "Member")
+        + get_row("Comments", str(rng.randint(0, 500)))
+        + get_row("Giveaways Entered", str(rng.randint(0, 5000)))
+        + get_row("Gifts Won", values(won_rows, won))
+        + get_row("Gifts Sent", values(sent_rows, sent))
+        + get_row("Contributor Level", str(rng.randint(0, 10)))
+        + "</div></body></html>"
+    )
+
+
+def get_games_page(css_class: str, count: int) -> str:
+    return (
+        "<html><body><div class='results'>"
+        + "".join(
+            f'<div class="{css_class}"><a href="/app/{i}/">Game {i}</a></div>'
+            for i in range(count)
+        )
+        + "</div></body></html>"
+    )
+
+
+def get_list_page(usernames: list[str], page: int, last_page: int) -> str:
+    """A page of users, as the whitelist and the giveaway entries."""
+    rows = "".join(
+        '<div class="table__row-outer-wrap">'
+        f'<a class="table__column__heading" href="/user/{u}">{u}</a></div>'
+        for u in usernames
+    )
+    pages = "".join(
+        f'<a href="?page={n}"{' class="is-selected"' if n == page else ""}>'
+        f"{n}</a>"
+        for n in range(1, last_page + 1)
+    )
+    if page < last_page:
+        pages += f'<a href="?page={last_page}">Last</a>'
+    return (
+        f"<html><body><div class='table__rows'>{rows}</div>"
+        f'<div class="pagination__navigation">{pages}</div></body></html>'
+    )
+
+
+def get_recording(index: int) -> dict[str, Any]:
+    rng = random.Random(SEED + index)
+    return {
+        "id": f"00000000-0000-4000-8000-{index:012x}",
+        "score": 100,
+        "title": " ".join(rng.sample(WORDS, rng.choice([1, 1, 2, 3]))).title(),
+        "first-release-date": f"1990-{rng.randint(1, 12):02d}"
+        f"-{rng.randint(1, 28):02d}",
+        "tags": [{"count": 1, "name": "rock"}],
+    }
+
+
+class Site:
+    """The fabricated pages, by URL."""
+
+    def __init__(self):
+        rng = random.Random(SEED)
+        self.users = [f"user{i:03d}" for i in range(USER_COUNT)]
+        self.invalid = set(rng.sample(self.users, INVALID_USERS))
+        self.profiles = {u: get_profile_page(rng) for u in self.users}
+        self.profiles[MY_USERNAME] = get_profile_page(rng)
+        self.sgtools = {
+            u: (rng.choice([0, 0, 0, 2, 6]), rng.choice([0, 0, 0, 1, 3]))
+            for u in self.users
+        }
+        self.whitelist = sorted(
+            set(rng.sample(self.users, WHITELIST_SIZE)) - self.invalid
+        )
+        self.giveaways = [
+            self.get_giveaway(rng, i, created=i < 4) for i in range(6)
+        ]
+        self.entries = {
+            ga["link"]: rng.sample(self.users, ga["entry_count"])
+            for ga in self.giveaways
+        }
+
+    def get_giveaway(
+        self, rng: random.Random, index: int, created: bool
+    ) -> dict[str, Any]:
+        code = f"G{index:04d}"
+        giveaway: dict[str, Any] = {
+            "id": 1000 + index,
+            "link": f"https://www.steamgifts.com/giveaway/{code}/game-{index}",
+            "end_timestamp": NOW - (index + 1) * 86400,
+            "entry_count": rng.randint(30, 80),
+        }
+        if created:
+            winner = rng.choice(self.users)
+            giveaway["creator"] = {
+                "id": 1,
+                "steam_id": "76561190000000000",
+                "username": SG_USER,
+            }
+            giveaway["winners"] = [
+                {
+                    "id": 2 + index,
+                    "steam_id": f"7656119{index:010d}",
+                    "username": winner,
+                    "received": True,
+                }
+            ]
+        else:
+            creator = rng.choice(self.users)
+            giveaway["creator"] = {
+                "id": 100 + index,
+                "steam_id": f"7656118{index:010d}",
+                "username": creator,
+            }
+            giveaway["received"] = True
+        return giveaway
+
+    def get_page(self, url: str) -> Page:
+        parts = urllib.parse.urlsplit(url)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        path = parts.path.rstrip("/")
+        if parts.netloc == "musicbrainz.org":
+            offset = int(query.get("offset", 0))
+            body = {
+                "created": "2026-01-01T00:00:00.000Z",
+                "count": MB_COUNT,
+                "offset": offset,
+                "recordings": [
+                    get_recording(i)
+                    for i in range(offset, min(offset + MB_PAGE, MB_COUNT))
+                ],
+            }
+            return self.ok(json.dumps(body), "application/json")
+        if parts.netloc == "www.sgtools.info":
+            kind, user = path.strip("/").split("/")
+            na, mw = self.sgtools.get(user, (0, 0))
+            if kind == "nonactivated":
+                return self.ok(get_games_page("notActivatedGame", na))
+            return self.ok(get_games_page("multiplewins", mw))
+        if path == "/account/settings/profile":
+            return self.ok(
+                '<html><body><a class="nav__avatar-outer-wrap"'
+                f' href="/user/{MY_USERNAME}"></a></body></html>'
+            )
+        if path == "/account/manage/whitelist/search":
+            return self.get_list(self.whitelist, query, WHITELIST_PER_PAGE)
+        if path == f"/user/{SG_USER}":
+            return self.ok(
+                json.dumps(
+                    {"results": [g for g in self.giveaways if "winners" in g]}
+                ),
+                "application/json",
+            )
+        if path == f"/user/{SG_USER}/giveaways/won":
+            return self.ok(
+                json.dumps(
+                    {"results": [g for g in self.giveaways if "received" in g]}
+                ),
+                "application/json",
+            )
+        if path.startswith("/user/"):
+            user = path.removeprefix("/user/")
+            if user in self.invalid or user not in self.profiles:
+                return Page(
+                    302, {"Location": "https://www.steamgifts.com/"}, b""
+                )
+            return self.ok(self.profiles[user])
+        if path.endswith(("/entries", "/entries/search")):
+            link = url[: url.index("/entries")]
+            return self.get_list(self.entries[link], query, ENTRIES_PER_PAGE)
+        return Page(404, {}, b"Not found.")
+
+    def get_list(
+        self, usernames: list[str], query: dict[str, str], per_page: int
+    ) -> Page:
+        page = int(query.get("page", 1))
+        last_page = max(1, -(-len(usernames) // per_page))
+        chunk = usernames[(page - 1) * per_page : page * per_page]
+        return self.ok(get_list_page(chunk, page, last_page))
+
+    @staticmethod
+    def ok(text: str, content_type: str = "text/html; charset=utf-8") -> Page:
+        return Page(200, {"Content-Type": content_type}, text.encode())
+
+
+class SiteAdapter(requests.adapters.BaseAdapter):
+    """Serve the pages of `site`, never touching the network."""
+
+    def __init__(self, site: Site):
+        super().__init__()
+        self.site = site
+
+    def send(  # type: ignore[override]
+        self, request: requests.PreparedRequest, **_: Any
+    ) -> requests.Response:
+        page = self.site.get_page(request.url or "")
+        response = requests.Response()
+        response.status_code = page.status
+        response.reason = "OK" if page.status == 200 else "Found"
+        response.headers = requests.structures.CaseInsensitiveDict(page.headers)
+        response._content = page.body  # pylint: disable=protected-access
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers
+        )
+        response.url = request.url or ""
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def main():
+    ARCHIVES_DIR.mkdir(exist_ok=True)
+    for scenario in SCENARIOS:
+        file = ARCHIVES_DIR / f"{scenario.name}.zip"
+        file.unlink(missing_ok=True)
+        adapter = replay.RecordingAdapter(str(file), SiteAdapter(Site()))
+        session = httpclient.Session(adapter=adapter)
+        with in_temp_dir():
+            scenario.run(session)
+        size = pathlib.Path(file).stat().st_size
+        print(
+            f"{file.name}: {session.request_count} requests,"
+            f" {size / 1024:.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Code shared by the puzzle tools.
+
+The tools are run as scripts from their own folder, so they add the
+repository root to `sys.path` before importing this package.
+"""
@@ -0,0 +1,305 @@
+"""Pooled HTTP client shared by the puzzle tools.
+
+A `Session` keeps its connections alive per host, retries failed requests,
+applies a default timeout and waits for its rate limits before each request.
+With a `CircuitBreaker`, a host failing repeatedly is paused for a while, and
+its requests fail at once, so that the crawlers keep crawling the other hosts
+and retry the failed fetches at the end, from a `RetryQueue`.
+`AsyncSession` offers the same session to asyncio code.
+
+Responses can be recorded and replayed offline, see `sgcommon.replay`.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import heapq
+import threading
+import time
+import urllib.parse
+from collections.abc import Iterator, Sequence
+from typing import Any, Generic, Self, TypeVar
+
+import requests
+import requests.adapters
+import urllib3.util
+
+from sgcommon import trace
+
+DEFAULT_TIMEOUT = 30  # seconds
+DEFAULT_POOL_MAXSIZE = 10
+FAILURE_THRESHOLD = 5  # consecutive failures that pause a host
+COOLDOWN = 60  # seconds, doubled each time the host fails again
+MAX_COOLDOWN = 900  # seconds
+MAX_ATTEMPTS = 3  # per deferred fetch
+RETRY_DELAY = 10  # seconds, times the attempts of a deferred fetch
+
+# (requests, seconds), e.g. `(120, 60)` for 120 requests per minute.
+Rate = tuple[int, float]
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """The host is paused after repeated failures; no request was sent."""
+
+    def __init__(self, host: str, delay: float):
+        super().__init__(f"{host} is paused for {delay:.0f} s")
+        self.host = host
+        self.delay = delay
+
+
+def is_failure(status_code: int) -> bool:
+    """Whether a response status tells that the host is unhealthy."""
+    return status_code == 429 or status_code >= 500
+
+
+def is_transient(error: requests.RequestException) -> bool:
+    """Whether a failed request may succeed later, sent again."""
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and is_failure(
+            error.response.status_code
+        )
+    return isinstance(
+        error,
+        (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.RetryError,
+        ),
+    )
+
+
+class RateLimiter:
+    """Sliding window rate limiter, applied to every host separately."""
+
+    def __init__(self, rates: Sequence[Rate]):
+        self.rates = sorted(rates, key=lambda rate: rate[1])
+        self.window = max((seconds for _, seconds in rates), default=0)
+        self.history: dict[str, collections.deque[float]] = {}
+        self.lock = threading.Lock()
+
+    def get_delay(self, host: str, now: float) -> float:
+        """Return the seconds to wait before the next request to `host`."""
+        history = self.history.get(host, ())
+        delay = 0.0
+        for limit, seconds in self.rates:
+            in_window = [t for t in history if t > now - seconds]
+            if len(in_window) >= limit:
+                delay = max(delay, in_window[-limit] + seconds - now)
+        return delay
+
+    def acquire(self, host: str) -> float:
+        """Wait for a free slot for `host`; return the seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                delay = self.get_delay(host, now)
+                if delay <= 0:
+                    history = self.history.setdefault(host, collections.deque())
+                    history.append(now)
+                    while history and history[0] <= now - self.window:
+                        history.popleft()
+                    return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class HostHealth:
+    def __init__(self, cooldown: float):
+        self.failures = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0  # monotonic time
+
+
+class CircuitBreaker:
+    """Pause a host after consecutive failures, the other hosts go on.
+
+    Once its cooldown is over, a single request probes the host: a success
+    closes the circuit, a failure pauses the host again, twice as long.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        cooldown: float = COOLDOWN,
+        max_cooldown: float = MAX_COOLDOWN,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.hosts: dict[str, HostHealth] = {}
+        self.lock = threading.Lock()
+
+    def check(self, host: str):
+        """Raise `CircuitOpenError` if `host` is paused."""
+        with self.lock:
+            health = self.hosts.get(host)
+            if health is None or health.failures < self.failure_threshold:
+                return
+            now = time.monotonic()
+            if health.open_until > now:
+                raise CircuitOpenError(host, health.open_until - now)
+            # the probe, the others wait for its result
+            health.open_until = now + health.cooldown
+
+    def record(self, host: str, success: bool):
+        with self.lock:
+            if success:
+                self.hosts.pop(host, None)
+                return
+            health = self.hosts.setdefault(host, HostHealth(self.cooldown))
+            health.failures += 1
+            if health.failures >= self.failure_threshold:
+                health.open_until = time.monotonic() + health.cooldown
+                health.cooldown = min(health.cooldown * 2, self.max_cooldown)
+
+
+class RetryQueue(Generic[T]):
+    """Fetches that failed transiently, to retry once the others are done.
+
+    Iterating yields every deferred item when it is due, waiting if needed;
+    an item deferred again while iterating is yielded again later.
+    """
+
+    def __init__(
+        self, max_attempts: int = MAX_ATTEMPTS, delay: float = RETRY_DELAY
+    ):
+        self.max_attempts = max_attempts
+        self.delay = delay
+        self.attempts: dict[T, int] = {}
+        # (due monotonic time, insertion order, item)
+        self.heap: list[tuple[float, int, T]] = []
+        self.count = 0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __iter__(self) -> Iterator[T]:
+        while self.heap:
+            yield self.pop()
+
+    def defer(self, item: T, error: requests.RequestException) -> bool:
+        """Queue `item` again, unless out of attempts; return if queued.
+
+        An item failing on a paused host is due when the host is probed
+        again, so a host that stays down costs a few cooldowns at most.
+        """
+        attempts = self.attempts.get(item, 0) + 1
+        if attempts >= self.max_attempts:
+            return False
+        self.attempts[item] = attempts
+        delay = self.delay * attempts
+        if isinstance(error, CircuitOpenError):
+            delay = max(delay, error.delay)
+        self.count += 1
+        heapq.heappush(self.heap, (time.monotonic() + delay, self.count, item))
+        return True
+
+    def get_delay(self) -> float:
+        """Return the seconds to wait for the next item, if any."""
+        if not self.heap:
+            return 0
+        return max(0.0, self.heap[0][0] - time.monotonic())
+
+    def pop(self) -> T:
+        """Wait for the next item to be due, and return it."""
+        time.sleep(self.get_delay())
+        return heapq.heappop(self.heap)[2]
+
+    def clear(self) -> list[T]:
+        """Remove and return the items not retried."""
+        items = [item for _, _, item in sorted(self.heap)]
+        self.heap.clear()
+        return items
+
+
+class Session(requests.Session):
+    """`requests.Session` with pooling, retry, rate limits and a timeout."""
+
+    def __init__(
+        self,
+        *,
+        timeout: float = DEFAULT_TIMEOUT,
+        retry: urllib3.util.Retry | int = 3,
+        rates: Sequence[Rate] = (),
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        adapter: requests.adapters.BaseAdapter | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self.limiter = RateLimiter(rates) if rates else None
+        self.breaker = breaker
+        self.request_count = 0
+        if adapter is None:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=pool_maxsize, max_retries=retry
+            )
+        # pylint: disable-next=import-outside-toplevel
+        from sgcommon import replay
+
+        adapter = replay.from_environ(adapter)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(  # type: ignore[override]
+        self, method: str | bytes, url: str, *args: Any, **kwargs: Any
+    ) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        host = urllib.parse.urlsplit(url).netloc
+        if self.breaker is not None:
+            self.breaker.check(host)
+        self.request_count += 1
+        if self.limiter is not None:
+            with trace.span("ratelimit"):
+                self.limiter.acquire(host)
+        try:
+            with trace.span("network"):
+                response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException as error:
+            if self.breaker is not None and is_transient(error):
+                self.breaker.record(host, False)
+            raise
+        if self.breaker is not None:
+            self.breaker.record(host, not is_failure(response.status_code))
+        return response
+
+
+class AsyncSession:
+    """Run the requests of a `Session` in a bounded thread pool."""
+
+    def __init__(
+        self, session: Session | None = None, max_workers: int | None = None
+    ):
+        self.session = session or Session()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers or DEFAULT_POOL_MAXSIZE
+        )
+
+    async def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> requests.Response:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            functools.partial(self.session.request, method, url, **kwargs),
+        )
+
+    async def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *args: object):
+        self.close()
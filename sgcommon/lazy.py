@@ -0,0 +1,28 @@
+"""Import modules on first use.
+
+The tools import heavy parsers and HTTP stacks that their cache-only runs
+never touch. `lazy_import` returns the module at once, and only executes it
+when one of its attributes is first accessed.
+"""
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return the module `name`, executed on first attribute access.
+
+    The parent packages of a submodule are imported right away.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,94 @@
+"""Cache of negative results, such as deleted or renamed users.
+
+Crawlers record the keys that led to an error or a redirect, and skip them
+until the entry expires, instead of spending rate-limited requests on them
+at every run. The cache is a SQLite database per name, in `SG_CACHE_DIR` or
+`~/.cache/sg-linhtinh`, so that it is shared by the tools. Each entry is
+written on its own, so tools running at the same time keep each other's.
+"""
+
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import TypedDict
+
+ENV_CACHE_DIR = "SG_CACHE_DIR"
+DEFAULT_CACHE_DIR = pathlib.Path.home() / ".cache" / "sg-linhtinh"
+DEFAULT_TTL = 30 * 86400  # seconds
+
+
+class Entry(TypedDict):
+    timestamp: float
+    status: int
+    location: str | None
+
+
+def get_cache_dir() -> pathlib.Path:
+    return pathlib.Path(os.environ.get(ENV_CACHE_DIR, DEFAULT_CACHE_DIR))
+
+
+class NegativeCache:
+    """Negative results by key, each expiring after `ttl` seconds."""
+
+    def __init__(self, name: str, ttl: float = DEFAULT_TTL):
+        self.file = get_cache_dir() / f"{name}.sqlite"
+        self.ttl = ttl
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.file, check_same_thread=False)
+        # the tools may run at the same time
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " timestamp REAL NOT NULL,"
+            " status INTEGER NOT NULL,"
+            " location TEXT"
+            ") WITHOUT ROWID"
+        )
+        self.lock = threading.Lock()
+        self.import_json(self.file.with_suffix(".json"))
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM entries WHERE timestamp < ?",
+                (time.time() - self.ttl,),
+            )
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str) -> Entry | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT timestamp, status, location FROM entries"
+                " WHERE key = ? AND timestamp >= ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"timestamp": row[0], "status": row[1], "location": row[2]}
+
+    def add(self, key: str, status: int, location: str | None = None):
+        """Record a negative result."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, time.time(), status, location),
+            )
+
+    def import_json(self, file: pathlib.Path):
+        """Import, then remove, a cache of the former JSON format."""
+        if not file.is_file():
+            return
+        entries: dict[str, Entry] = json.loads(file.read_text(encoding="utf-8"))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)",
+                [
+                    (key, e["timestamp"], e["status"], e["location"])
+                    for key, e in entries.items()
+                ],
+            )
+        file.unlink()
@@ -0,0 +1,209 @@
+"""Record HTTP responses into an archive and replay them offline.
+
+`RecordingAdapter` wraps the adapter of a session and appends every response
+to a LZMA compressed zip archive. `ReplayAdapter` serves the archived
+responses instead of the network, with a configurable latency and rate limit,
+so that the crawlers can be run and measured repeatably.
+
+Sessions of `sgcommon.httpclient` pick them up from the environment variables
+`SG_HTTP_RECORD` or `SG_HTTP_REPLAY`, set to the path of the archive. The
+replay latency and rate limit are set by `SG_HTTP_REPLAY_LATENCY` and
+`SG_HTTP_REPLAY_RATE`.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+import zipfile
+from collections.abc import Mapping, Sequence
+from typing import Any, TypedDict
+
+import requests
+import requests.adapters
+import requests.structures
+import requests.utils
+
+from sgcommon import httpclient
+
+ENV_RECORD = "SG_HTTP_RECORD"
+ENV_REPLAY = "SG_HTTP_REPLAY"
+ENV_REPLAY_LATENCY = "SG_HTTP_REPLAY_LATENCY"  # seconds
+ENV_REPLAY_RATE = "SG_HTTP_REPLAY_RATE"  # requests per second per host
+
+# headers describing the raw transfer, not the decoded body that is stored
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+class Record(TypedDict):
+    method: str
+    url: str
+    status: int
+    reason: str
+    headers: dict[str, str]
+
+
+def get_key(request: requests.PreparedRequest) -> str:
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode()
+    digest = hashlib.sha1(f"{request.method} {request.url}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def read_archive(file: str) -> dict[str, list[tuple[Record, bytes]]]:
+    """Return the archived responses by request key, in recording order."""
+    records: dict[str, list[tuple[Record, bytes]]] = {}
+    if not pathlib.Path(file).is_file():
+        return records
+    with zipfile.ZipFile(file) as z:
+        names = sorted(
+            (name for name in z.namelist() if name.endswith(".json")),
+            key=lambda name: (name.split("/")[0], int(name.split("/")[1][:-5])),
+        )
+        for name in names:
+            record: Record = json.loads(z.read(name))
+            body = z.read(name[:-5] + ".body")
+            records.setdefault(name.split("/")[0], []).append((record, body))
+    return records
+
+
+class RecordingAdapter(requests.adapters.BaseAdapter):
+    """Send requests through `adapter` and archive their responses."""
+
+    def __init__(self, file: str, adapter: requests.adapters.BaseAdapter):
+        super().__init__()
+        self.file = file
+        self.adapter = adapter
+        pathlib.Path(file).parent.mkdir(parents=True, exist_ok=True)
+        self.counts = {
+            key: len(responses) for key, responses in read_archive(file).items()
+        }
+        self.lock = threading.Lock()
+
+    def send(  # type: ignore[override]
+        self, request: requests.PreparedRequest, **kwargs: Any
+    ) -> requests.Response:
+        response = self.adapter.send(request, **kwargs)
+        record: Record = {
+            "method": request.method or "GET",
+            "url": request.url or "",
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                k: v
+                for k, v in response.headers.items()
+                if k.lower() not in SKIPPED_HEADERS
+            },
+        }
+        key = get_key(request)
+        with self.lock, zipfile.ZipFile(self.file, "a", zipfile.ZIP_LZMA) as z:
+            n = self.counts.get(key, 0)
+            z.writestr(f"{key}/{n}.json", json.dumps(record))
+            z.writestr(f"{key}/{n}.body", response.content)
+            self.counts[key] = n + 1
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """Serve archived responses, never touching the network.
+
+    Repeated requests get the archived responses in order, the last one
+    being served again once exhausted. Unknown requests get a 404 response and
+    requests over `rates` get a 429 response.
+    """
+
+    def __init__(
+        self,
+        file: str,
+        latency: float = 0,
+        rates: Sequence[httpclient.Rate] = (),
+    ):
+        super().__init__()
+        self.records = read_archive(file)
+        self.latency = latency
+        self.limiter = httpclient.RateLimiter(rates) if rates else None
+        self.served: dict[str, int] = {}
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+    def build_response(
+        self,
+        request: requests.PreparedRequest,
+        status: int,
+        reason: str,
+        headers: Mapping[str, str],
+        body: bytes,
+    ) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response._content = body  # pylint: disable=protected-access
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers
+        )
+        response.url = request.url or ""
+        response.request = request
+        return response
+
+    def send(  # type: ignore[override]
+        self, request: requests.PreparedRequest, **_: Any
+    ) -> requests.Response:
+        key = get_key(request)
+        with self.lock:
+            self.request_count += 1
+            if self.limiter is not None:
+                host = requests.utils.urlparse(request.url).netloc
+                if self.limiter.get_delay(host, time.monotonic()) > 0:
+                    return self.build_response(
+                        request,
+                        429,
+                        "Too Many Requests",
+                        {"Retry-After": "1"},
+                        b"",
+                    )
+                self.limiter.acquire(host)
+            responses = self.records.get(key)
+            index = self.served.get(key, 0)
+            self.served[key] = index + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not responses:
+            return self.build_response(
+                request, 404, "Not Recorded", {}, b"Not recorded."
+            )
+        record, body = responses[min(index, len(responses) - 1)]
+        return self.build_response(
+            request, record["status"], record["reason"], record["headers"], body
+        )
+
+    def close(self):
+        pass
+
+
+def get_rates(rate: float) -> list[httpclient.Rate]:
+    """The limit of `rate` requests per second per host, none if zero."""
+    return [(1, 1 / rate)] if rate else []
+
+
+def from_environ(
+    adapter: requests.adapters.BaseAdapter,
+) -> requests.adapters.BaseAdapter:
+    """Wrap or replace `adapter` as requested by the environment."""
+    if file := os.environ.get(ENV_REPLAY):
+        rate = float(os.environ.get(ENV_REPLAY_RATE, 0))
+        return ReplayAdapter(
+            file,
+            float(os.environ.get(ENV_REPLAY_LATENCY, 0)),
+            get_rates(rate),
+        )
+    if file := os.environ.get(ENV_RECORD):
+        return RecordingAdapter(file, adapter)
+    return adapter
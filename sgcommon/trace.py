@@ -0,0 +1,138 @@
+"""Lightweight span timers for the hot paths of the tools.
+
+Tracing is enabled by setting the environment variable `SG_TRACE` to the path
+of a Chrome trace-event JSON file, e.g. `SG_TRACE=trace.json python main.py`.
+The file is written at exit, along with a per-stage latency summary on stderr.
+Open it in `chrome://tracing` or https://ui.perfetto.dev.
+
+When disabled, `span` returns a shared no-op context manager.
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import ContextManager, NamedTuple, ParamSpec, TextIO, TypeVar
+
+ENV_TRACE = "SG_TRACE"
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class Event(NamedTuple):
+    name: str
+    start: float  # seconds, from `time.perf_counter`
+    duration: float  # seconds
+    thread_id: int
+
+
+enabled = False
+events: list[Event] = []
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def _span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        events.append(
+            Event(
+                name,
+                start,
+                time.perf_counter() - start,
+                threading.get_ident(),
+            )
+        )
+
+
+def span(name: str) -> ContextManager[None]:
+    """Time the enclosed block under the stage `name`."""
+    if not enabled:
+        return _NULL_SPAN
+    return _span(name)
+
+
+def traced(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Decorator timing every call of a function under the stage `name`."""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not enabled:
+                return func(*args, **kwargs)
+            with _span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def get_percentile(values: list[float], percent: float) -> float:
+    """Return the nearest-rank percentile of sorted `values`."""
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def get_summary() -> str:
+    """Return a table of per-stage count, p50/p95 latency and total time."""
+    durations: dict[str, list[float]] = {}
+    for event in events:
+        durations.setdefault(event.name, []).append(event.duration)
+    lines = [
+        f"{"stage":<24}{"count":>8}{"p50 ms":>10}{"p95 ms":>10}{"total s":>10}"
+    ]
+    for name, values in sorted(
+        durations.items(), key=lambda item: -sum(item[1])
+    ):
+        values.sort()
+        lines.append(
+            f"{name:<24}{len(values):>8}"
+            f"{get_percentile(values, 50) * 1000:>10.1f}"
+            f"{get_percentile(values, 95) * 1000:>10.1f}"
+            f"{sum(values):>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def write_chrome_trace(file: str):
+    origin = min((event.start for event in events), default=0)
+    trace_events = [
+        {
+            "name": event.name,
+            "cat": event.name.split(":")[0],
+            "ph": "X",
+            "ts": (event.start - origin) * 1e6,
+            "dur": event.duration * 1e6,
+            "pid": os.getpid(),
+            "tid": event.thread_id,
+        }
+        for event in events
+    ]
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace_events}, f)
+
+
+def dump(file: str, stream: TextIO = sys.stderr):
+    write_chrome_trace(file)
+    print(get_summary(), file=stream)
+    print(f"Trace written to `{file}`.", file=stream)
+
+
+if trace_file := os.environ.get(ENV_TRACE):
+    enable()
+    atexit.register(dump, trace_file)
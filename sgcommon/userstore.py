@@ -0,0 +1,112 @@
+"""Store of the user pages, shared by the tools.
+
+The whitelist manager and the giveaways crawler fetch the same
+`steamgifts.com/user/<name>` pages. Every page is stored by user and field,
+along with the time it was fetched, so a page fetched by a tool serves the
+other until it expires. The store is a SQLite database, `users.sqlite` in the
+cache folder of `sgcommon.negcache`, and the pages are compressed.
+"""
+
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple, Self
+
+from sgcommon import negcache
+
+FILE_NAME = "users.sqlite"
+DEFAULT_TTL = 7 * 86400  # seconds
+PROFILE = "profile"  # the steamgifts.com/user/<name> page
+
+
+class Field(NamedTuple):
+    value: str
+    timestamp: float
+
+
+class UserStore:
+    """Fields by user, each expiring after `ttl` seconds."""
+
+    def __init__(
+        self,
+        file: str | os.PathLike[str] | None = None,
+        ttl: float = DEFAULT_TTL,
+    ):
+        self.file = pathlib.Path(file or negcache.get_cache_dir() / FILE_NAME)
+        self.ttl = ttl
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.file, check_same_thread=False)
+        # the tools may run at the same time
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fields ("
+            " username TEXT NOT NULL,"
+            " field TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " timestamp REAL NOT NULL,"
+            " PRIMARY KEY (username, field)"
+            ") WITHOUT ROWID"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS fields_timestamp ON fields (timestamp)"
+        )
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object):
+        self.close()
+
+    def get(self, username: str, field: str) -> Field | None:
+        """Return a field of `username`, unless missing or expired."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, timestamp FROM fields"
+                " WHERE username = ? AND field = ? AND timestamp >= ?",
+                (username, field, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        return Field(zlib.decompress(row[0]).decode(), row[1])
+
+    def get_usernames(self, field: str) -> set[str]:
+        """Return the users whose `field` has not expired."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT username FROM fields"
+                " WHERE field = ? AND timestamp >= ?",
+                (field, time.time() - self.ttl),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def put(
+        self,
+        username: str,
+        field: str,
+        value: str,
+        timestamp: float | None = None,
+    ):
+        """Store a field of `username`, fetched at `timestamp` or now."""
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?)",
+                (username, field, zlib.compress(value.encode()), timestamp),
+            )
+
+    def prune(self) -> int:
+        """Delete the expired fields, and return their number."""
+        with self.lock, self.connection:
+            return self.connection.execute(
+                "DELETE FROM fields WHERE timestamp < ?",
+                (time.time() - self.ttl,),
+            ).rowcount
+
+    def close(self):
+        self.prune()
+        self.connection.close()
@@ -0,0 +1,181 @@
+"""Columnar history of the whitelist user stats.
+"""
+
+import argparse
+import datetime
+import pathlib
+import time
+from collections.abc import Iterator, Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+HISTORY_DIR = "history"
+PROFILE_COLUMNS = (
+    "registration_date",
+    "won_count",
+    "won_full",
+    "won_reduced",
+    "won_zero",
+    "won_not_received",
+    "won_cv",
+    "won_real_cv",
+    "sent_count",
+    "sent_full",
+    "sent_reduced",
+    "sent_zero",
+    "sent_awaiting",
+    "sent_not_received",
+    "sent_cv",
+    "sent_real_cv",
+    "ratio",
+    "ratio_full",
+    "ratio_reduced",
+    "ratio_zero",
+    "ratio_cv",
+    "ratio_real_cv",
+)
+COUNT_COLUMNS = {"na_count": "not_activated", "mw_count": "multiple"}
+COLUMNS = ("username", "timestamp", *PROFILE_COLUMNS, *COUNT_COLUMNS)
+
+
+class ExtractedArgs:
+    column: str
+    drop: float
+    days: float
+    directory: str
+
+
+def append(
+    users: dict[str, Any], directory: str = HISTORY_DIR
+) -> pathlib.Path | None:
+    """Append the stats of `users` as a new part of today's partition.
+
+    Each column is an array of the part, missing values are NaN.
+    """
+    rows = [(user, v) for user, v in users.items() if v.get("profile")]
+    if not rows:
+        return None
+    columns: dict[str, npt.NDArray[Any]] = {
+        "username": np.array([user for user, _ in rows], dtype=np.str_),
+        "timestamp": np.array([v["timestamp"] for _, v in rows], np.float64),
+    }
+    for column in PROFILE_COLUMNS:
+        columns[column] = np.array(
+            [v["profile"].get(column, np.nan) for _, v in rows], np.float64
+        )
+    for column, key in COUNT_COLUMNS.items():
+        columns[column] = np.array(
+            [
+                len(v["namwc"][key]) if key in v["namwc"] else np.nan
+                for _, v in rows
+            ],
+            np.float64,
+        )
+    now = time.time_ns()
+    partition = pathlib.Path(directory) / f"date={get_date(now / 1e9)}"
+    partition.mkdir(parents=True, exist_ok=True)
+    file = partition / f"part-{now}.npz"
+    np.savez_compressed(file, **columns)
+    return file
+
+
+def find_drops(
+    column: str,
+    drop: float,
+    days: float = 90,
+    directory: str = HISTORY_DIR,
+) -> list[tuple[str, float, float]]:
+    """Find the users whose `column` dropped by more than `drop` in `days`.
+
+    Compare the first and the last value of each user in the period.
+    Returns: `list[tuple(username, first, last)]`, largest drop first.
+    """
+    rows = load(
+        ("username", "timestamp", column),
+        directory,
+        time.time() - days * 86400,
+    )
+    if not rows["username"].size:
+        return []
+    order = np.lexsort((rows["timestamp"], rows["username"]))
+    usernames = rows["username"][order]
+    values = rows[column][order]
+    users, first = np.unique(usernames, return_index=True)
+    last = np.append(first[1:], len(usernames)) - 1
+    drops = values[first] - values[last]
+    selected = np.flatnonzero(drops > drop)
+    selected = selected[np.argsort(-drops[selected], kind="stable")]
+    return [
+        (str(users[i]), float(values[first[i]]), float(values[last[i]]))
+        for i in selected
+    ]
+
+
+def get_date(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.UTC).strftime(
+        "%Y-%m-%d"
+    )
+
+
+def iter_parts(
+    directory: str, since: float | None = None
+) -> Iterator[pathlib.Path]:
+    """Yield the parts of the partitions from the date of `since` on."""
+    start = f"date={get_date(since)}" if since is not None else ""
+    for partition in sorted(pathlib.Path(directory).glob("date=*")):
+        if partition.name >= start:
+            yield from sorted(partition.glob("*.npz"))
+
+
+def load(
+    columns: Sequence[str],
+    directory: str = HISTORY_DIR,
+    since: float | None = None,
+) -> dict[str, npt.NDArray[Any]]:
+    """Load and concatenate `columns` of the rows since `since`.
+
+    Only the partitions in range are opened, and only the requested columns
+    are decompressed.
+    """
+    parts: dict[str, list[npt.NDArray[Any]]] = {c: [] for c in columns}
+    for file in iter_parts(directory, since):
+        with np.load(file) as npz:
+            selected = slice(None)
+            if since is not None:
+                selected = npz["timestamp"] >= since
+            for column in columns:
+                parts[column].append(npz[column][selected])
+    return {
+        column: (
+            np.concatenate(arrays)
+            if arrays
+            else np.array([], np.str_ if column == "username" else np.float64)
+        )
+        for column, arrays in parts.items()
+    }
+
+
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("column", choices=COLUMNS[2:], help="Stat to compare.")
+    ap.add_argument("drop", type=float, help="Minimum drop of the stat.")
+    ap.add_argument(
+        "--days", type=float, default=90, help="Period, 90 days by default."
+    )
+    ap.add_argument("--directory", default=HISTORY_DIR)
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def main(column: str, drop: float, days: float, directory: str):
+    drops = find_drops(column, drop, days, directory)
+    print(f"Users whose `{column}` dropped by more than {drop}:")
+    for user, first, last in drops:
+        print(f"https://www.steamgifts.com/user/{user} {first:g} -> {last:g}")
+
+
+if __name__ == "__main__":
+    args: ExtractedArgs = parse_args()
+    main(args.column, args.drop, args.days, args.directory)
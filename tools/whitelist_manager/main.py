@@ -1,20 +1,74 @@
 """Suggest a list of users to remove from your whitelist.
 """
 
+from __future__ import annotations
+
+import argparse
 import configparser
+import contextlib
 import json
+import math
 import pathlib
 import pickle
 import re
+import sys
 import time
 import zipfile
-from typing import Any, cast
+from collections.abc import Callable, Iterator
+from typing import IO, TYPE_CHECKING, Any, NamedTuple, cast
+
+import sketch
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))
+# pylint: disable-next=wrong-import-position
+from sgcommon import lazy, negcache, trace, userstore
+
+# not needed to filter a fresh cache, so only loaded when used
+if TYPE_CHECKING:
+    import bs4
+    import requests
+
+    from sgcommon import httpclient
+else:
+    bs4 = lazy.lazy_import("bs4")
+    requests = lazy.lazy_import("requests")
+    httpclient = lazy.lazy_import("sgcommon.httpclient")
+
+REQUEST_DELAY = 1  # seconds
+REQUEST_TIMEOUT = 10  # seconds
+# the failed users are retried at the end, see `process_users`
+REQUEST_RETRIES = 2
+
+CACHE_LIVE_SECONDS = 604800
+NEGATIVE_CACHE_NAME = "users"
+USER_URLS = {
+    "profile": "https://www.steamgifts.com/user/",
+    "not_activated": "https://www.sgtools.info/nonactivated/",
+    "multiple": "https://www.sgtools.info/multiple/",
+}
+
+
+class ExtractedArgs:
+    max_requests: int | None
+    deadline: float | None
+    stream: str | None
+    cache_only: bool
+
+
+class UserFetchError(Exception):
+    """The pages of a user failed to load, maybe not for long."""
+
+    def __init__(self, error: requests.RequestException, request_count: int):
+        super().__init__(str(error))
+        self.error = error
+        self.request_count = request_count
+
 
-import bs4
-import numpy as np
-import requests
-import requests.adapters
-import urllib3.util
+class Rule(NamedTuple):
+    """A reason to remove a user."""
+
+    name: str
+    check: Callable[[dict[str, Any], dict[str, float]], bool]
 
 
 def add_sent_won_ratio(profile: dict[str, float]):
@@ -44,16 +98,17 @@ def add_sent_won_ratio(profile: dict[str, float]):
     )
 
 
-def calculate_iqr(data: list[int]) -> tuple[np.floating[Any], np.floating[Any]]:
-    """Calculate Interquartile Range (IQR) using numpy.
+def calculate_iqr(data: sketch.KLL) -> tuple[float, float]:
+    """Calculate Interquartile Range (IQR) using a quantile sketch.
 
     Returns: `tuple(q1, q3)`
     """
-    q1 = np.percentile(data, 25)
-    q3 = np.percentile(data, 75)
+    q1 = data.quantile(0.25)
+    q3 = data.quantile(0.75)
     return (q1, q3)
 
 
+@trace.traced("parse:nonactivated")
 def check_not_activated(na_page: str) -> dict[str, int | list[str]]:
     results: dict[str, int | list[str]] = {}
     if "has a private profile" in na_page:
@@ -74,6 +129,7 @@ def check_not_activated(na_page: str) -> dict[str, int | list[str]]:
     return results
 
 
+@trace.traced("parse:multiple")
 def check_multiple(mw_page: str) -> dict[str, int | list[str]]:
     results: dict[str, int | list[str]] = {}
     response_html = bs4.BeautifulSoup(mw_page, "html.parser")
@@ -104,7 +160,8 @@ def export_list(
     response: requests.Response = fetch_request(session, url, params)
     if response.status_code != 200:
         raise_not_logged_in()
-    response_html = bs4.BeautifulSoup(response.text, "html.parser")
+    with trace.span("parse:whitelist"):
+        response_html = bs4.BeautifulSoup(response.text, "html.parser")
     elements = cast(
         bs4.ResultSet[bs4.Tag],
         response_html.find_all(class_="table__column__heading"),
@@ -131,9 +188,8 @@ def export_list(
 def fetch_request(
     session: requests.Session, url: str, params: dict[str, Any] | None = None
 ) -> requests.Response:
-    time.sleep(1)
     response: requests.Response = session.get(
-        url, params=params, timeout=10, allow_redirects=False
+        url, params=params, allow_redirects=False
     )
     response.raise_for_status()
     return response
@@ -162,40 +218,134 @@ def filter_users_conditions(data: dict[str, Any]) -> dict[str, float]:
         my_profile["won_count"] / my_profile_age * 31536000
     )
 
-    users: dict[str, Any] = data["users"]
-    na_counts = [
-        len(v["namwc"]["not_activated"])
-        for v in users.values()
-        if v["namwc"]["not_activated"]
-    ]
-    mw_counts = [
-        len(v["namwc"]["multiple"])
-        for v in users.values()
-        if v["namwc"]["multiple"]
-    ]
-    na_q1, na_q3 = calculate_iqr(na_counts)
-    na_iqr = na_q3 - na_q1
-    conditions["na_lower_limit"] = (na_q1 - 1.5 * na_iqr).astype(float)
-    conditions["na_upper_limit"] = (na_q3 + 1.5 * na_iqr).astype(float)
-    mw_q1, mw_q3 = calculate_iqr(mw_counts)
-    mw_iqr = mw_q3 - mw_q1
-    conditions["mw_lower_limit"] = (mw_q1 - 1.5 * mw_iqr).astype(float)
-    conditions["mw_upper_limit"] = (mw_q3 + 1.5 * mw_iqr).astype(float)
+    sketches = data.get("sketches") or get_sketches(data["users"])
+    na_counts: sketch.KLL = sketches["not_activated"]
+    mw_counts: sketch.KLL = sketches["multiple"]
+    conditions["na_lower_limit"] = -math.inf
+    conditions["na_upper_limit"] = math.inf
+    if len(na_counts):
+        na_q1, na_q3 = calculate_iqr(na_counts)
+        na_iqr = na_q3 - na_q1
+        conditions["na_lower_limit"] = na_q1 - 1.5 * na_iqr
+        conditions["na_upper_limit"] = na_q3 + 1.5 * na_iqr
+    conditions["mw_lower_limit"] = -math.inf
+    conditions["mw_upper_limit"] = math.inf
+    if len(mw_counts):
+        mw_q1, mw_q3 = calculate_iqr(mw_counts)
+        mw_iqr = mw_q3 - mw_q1
+        conditions["mw_lower_limit"] = mw_q1 - 1.5 * mw_iqr
+        conditions["mw_upper_limit"] = mw_q3 + 1.5 * mw_iqr
     return conditions
 
 
 def filter_users_func(user: dict[str, Any], conds: dict[str, float]) -> bool:
+    return any(rule.check(user, conds) for rule in get_rules())
+
+
+def get_refresh_priority(
+    user: dict[str, Any], conds: dict[str, float], now: float
+) -> float:
+    """Rank a cached user for refresh, the highest first.
+
+    The priority grows with the age of the entry and with how close its stats
+    are to a removal threshold, relative to that threshold.
+    """
+
+    def get_margin(value: float, threshold: float) -> float:
+        if math.isinf(threshold):
+            # no limit yet, a user cannot be close to it
+            return math.inf
+        return abs(value - threshold) / max(abs(threshold), 1)
+
+    profile = user["profile"]
+    namwc = user["namwc"]
+    margins = [
+        get_margin(profile["won_count"], conds["max_won_count"]),
+        get_margin(
+            len(namwc.get("not_activated", [])), conds["na_upper_limit"]
+        ),
+        get_margin(len(namwc.get("multiple", [])), conds["mw_upper_limit"]),
+    ]
+    if profile["won_real_cv"]:
+        margins.append(
+            get_margin(profile["ratio_real_cv"], conds["min_ratio_real_cv"])
+        )
+    else:
+        margins.append(
+            get_margin(profile["sent_real_cv"], conds["min_sent_real_cv"])
+        )
+    age = (now - user["timestamp"]) / CACHE_LIVE_SECONDS
+    return age / (min(margins) + 0.01)
+
+
+def get_rules() -> list[Rule]:
+    """Return the removal rules, the cheapest first."""
+    return [
+        Rule("low_contributor", is_low_contributor),
+        Rule("private", is_private),
+        Rule("many_not_activated", has_many_not_activated),
+        Rule("many_multiple_wins", has_many_multiple_wins),
+    ]
+
+
+def get_sketches(users: dict[str, Any]) -> dict[str, sketch.KLL]:
+    sketches = {"not_activated": sketch.KLL(), "multiple": sketch.KLL()}
+    for user_data in users.values():
+        update_sketches(sketches, user_data)
+    return sketches
+
+
+def get_verdict(
+    user: str,
+    user_data: dict[str, Any],
+    conds: dict[str, float],
+    provisional: bool = False,
+) -> dict[str, Any]:
+    reasons = [
+        rule.name for rule in get_rules() if rule.check(user_data, conds)
+    ]
+    return {
+        "user": user,
+        "remove": bool(reasons),
+        "reasons": reasons,
+        "provisional": provisional,
+        "url": USER_URLS["profile"] + user,
+    }
+
+
+def has_many_multiple_wins(
+    user: dict[str, Any], conds: dict[str, float]
+) -> bool:
+    # The user has too many multiple wins.
+    return len(user["namwc"].get("multiple", [])) > conds["mw_upper_limit"]
+
+
+def has_many_not_activated(
+    user: dict[str, Any], conds: dict[str, float]
+) -> bool:
+    # The user has too many not-activated wins.
+    return len(user["namwc"].get("not_activated", [])) > conds["na_upper_limit"]
+
+
+def init_session() -> httpclient.Session:
+    import urllib3.util  # pylint: disable=import-outside-toplevel
+
+    session = httpclient.Session(
+        timeout=REQUEST_TIMEOUT,
+        retry=urllib3.util.Retry(REQUEST_RETRIES, other=0, backoff_factor=0.3),
+        rates=[(1, REQUEST_DELAY)],
+        breaker=httpclient.CircuitBreaker(),
+    )
+    set_cookie(session)
+    return session
+
+
+def is_cache_expired(data: dict[str, Any]) -> bool:
+    return time.time() - data["last_check"] > CACHE_LIVE_SECONDS
+
+
+def is_low_contributor(user: dict[str, Any], conds: dict[str, float]) -> bool:
     user_profile = user["profile"]
-    user_namwc = user["namwc"]
-    if user_profile["won_count"] and user_namwc["unknown"]:
-        # The user has a private profile.
-        return True
-    if len(user_namwc["not_activated"]) > conds["na_upper_limit"]:
-        # The user has too many not-activated wins.
-        return True
-    if len(user_namwc["multiple"]) > conds["mw_upper_limit"]:
-        # The user has too many multiple wins.
-        return True
     if user_profile["won_count"] <= conds["max_won_count"]:
         # Exception: The user has won less than my yearly average.
         return False
@@ -210,12 +360,14 @@ def filter_users_func(user: dict[str, Any], conds: dict[str, float]) -> bool:
     return False
 
 
-def load_my_profile() -> dict[str, float]:
+def is_private(user: dict[str, Any], _: dict[str, float]) -> bool:
+    # The user has a private profile.
+    return bool(user["profile"]["won_count"] and user["namwc"].get("unknown"))
+
+
+def load_my_profile(session: requests.Session) -> dict[str, float]:
     url = "https://www.steamgifts.com/account/settings/profile"
-    response: requests.Response
-    with requests.Session() as session:
-        set_cookie(session)
-        response = fetch_request(session, url)
+    response: requests.Response = fetch_request(session, url)
     if response.status_code != 200:
         raise_not_logged_in()
     response_html = bs4.BeautifulSoup(response.text, "html.parser")
@@ -223,14 +375,14 @@ def load_my_profile() -> dict[str, float]:
     href = cast(str, element.get("href"))
     username = cast(re.Match[str], re.search("/user/(.+)", href)).group(1)
     url = "https://www.steamgifts.com/user/" + username
-    with requests.Session() as session:
-        response = fetch_request(session, url)
+    response = fetch_request(session, url)
     my_profile: dict[str, float] = load_profile(response.text)
     add_sent_won_ratio(my_profile)
     print(f"Logged in as `{username}`.")
     return my_profile
 
 
+@trace.traced("parse:profile")
 def load_profile(user_page: str) -> dict[str, float]:
     profile: dict[str, float] = {}
     page_html = bs4.BeautifulSoup(user_page, "html.parser")
@@ -329,40 +481,224 @@ def load_profile(user_page: str) -> dict[str, float]:
     return profile
 
 
-def process_list(user_list: list[str]):
-    users: dict[str, Any] = {}
-    with requests.Session() as session:
-        retries = urllib3.util.Retry(other=0, backoff_factor=0.3)
-        session.mount(
-            "https://", requests.adapters.HTTPAdapter(max_retries=retries)
+def parse_args() -> ExtractedArgs:
+    """Construct the argument parser and parse the arguments."""
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--max-requests",
+        type=int,
+        help="Maximum number of user page requests of a refresh.",
+    )
+    ap.add_argument(
+        "--deadline",
+        type=float,
+        help="Maximum duration of a refresh, in seconds.",
+    )
+    ap.add_argument(
+        "--stream",
+        metavar="FILE",
+        help="Write the verdicts as JSON lines to FILE (`-` for stdout, the"
+        " logs then go to stderr) as soon as each user is retrieved.",
+    )
+    ap.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Filter the cached users again, even if expired, without any"
+        " request.",
+    )
+    return ap.parse_args(namespace=ExtractedArgs())
+
+
+def process_list(
+    session: requests.Session,
+    user_list: list[str],
+    previous_data: dict[str, Any] | None = None,
+    max_requests: int | None = None,
+    deadline: float | None = None,
+) -> dict[str, Any]:
+    return dict(
+        process_users(session, user_list, previous_data, max_requests, deadline)
+    )
+
+
+def process_user(
+    session: requests.Session,
+    user: str,
+    lazy: bool = False,
+    negative_cache: negcache.NegativeCache | None = None,
+    user_store: userstore.UserStore | None = None,
+) -> tuple[dict[str, Any] | None, int]:
+    """Fetch the pages of `user` needed by the rules and the count sketches.
+
+    If `lazy`, the sgtools pages are skipped for a user without any win:
+    there is nothing to activate or to win twice, so the counts are known to
+    be zero and the verdicts are the same either way. Return the user data, or
+    `None` if a page is missing, and the number of requests sent. A missing
+    profile is recorded in `negative_cache`. The pages still fresh in
+    `user_store`, possibly fetched by another tool, are not fetched again,
+    and the user data is timestamped with the oldest page.
+
+    Raise `UserFetchError` if a page fails to load but may load later.
+    """
+    user_data: dict[str, Any] = {"namwc": {}}
+    loaded: dict[str, float] = {}  # page: timestamp
+    request_count = 0
+
+    def load(page: str) -> bool:
+        nonlocal request_count
+        if page in loaded:
+            return True
+        field = user_store.get(user, page) if user_store else None
+        if field is None:
+            try:
+                response = fetch_request(session, USER_URLS[page] + user)
+            except requests.RequestException as error:
+                if not httpclient.is_transient(error):
+                    raise
+                if not isinstance(error, httpclient.CircuitOpenError):
+                    request_count += 1
+                raise UserFetchError(error, request_count) from error
+            request_count += 1
+            if response.status_code != 200:
+                if page == "profile" and negative_cache is not None:
+                    negative_cache.add(
+                        user,
+                        response.status_code,
+                        response.headers.get("Location"),
+                    )
+                return False
+            field = userstore.Field(response.text, time.time())
+            if user_store:
+                user_store.put(user, page, *field)
+        loaded[page] = field.timestamp
+        match page:
+            case "profile":
+                user_data["profile"] = load_profile(field.value)
+                add_sent_won_ratio(user_data["profile"])
+            case "not_activated":
+                user_data["namwc"] |= check_not_activated(field.value)
+            case _:
+                user_data["namwc"] |= check_multiple(field.value)
+        user_data["timestamp"] = min(loaded.values())
+        return True
+
+    if not load("profile"):
+        return None, request_count
+    if lazy and not user_data["profile"]["won_count"]:
+        user_data["namwc"] |= {"not_activated": [], "multiple": []}
+        return user_data, request_count
+    if not all(load(page) for page in USER_URLS):
+        return None, request_count
+    return user_data, request_count
+
+
+def process_users(
+    session: requests.Session,
+    user_list: list[str],
+    previous_data: dict[str, Any] | None = None,
+    max_requests: int | None = None,
+    deadline: float | None = None,
+    negative_cache: negcache.NegativeCache | None = None,
+    user_store: userstore.UserStore | None = None,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Fetch and parse the pages of every user, yielding them one by one.
+
+    Given the data of a previous run, the filter conditions are estimated from
+    it and the sgtools pages are only fetched for the users with a win. The
+    pages not fetched keep their previous results, if any.
+
+    New users are fetched first, then the cached ones by refresh priority.
+    Once `max_requests` are sent or `deadline` seconds are elapsed, the
+    remaining users keep their cached data. Users in `negative_cache` are
+    skipped, and the pages in `user_store` are reused.
+
+    A user whose pages fail to load, for example while sgtools.info is down,
+    is retried after the others; the session pauses the failing host only.
+    A user failing every attempt keeps its cached data, if any.
+    """
+    start = time.time()
+    conditions: dict[str, float] | None = None
+    previous_users: dict[str, Any] = {}
+    if previous_data:
+        conditions = filter_users_conditions(previous_data)
+        previous_users = previous_data["users"]
+        for user_data in previous_users.values():
+            user_data.setdefault("timestamp", previous_data["last_check"])
+        user_list = sorted(
+            user_list,
+            key=lambda user: (
+                -math.inf
+                if user not in previous_users
+                else -get_refresh_priority(
+                    previous_users[user],
+                    cast(dict[str, float], conditions),
+                    start,
+                )
+            ),
+        )
+    n = len(user_list)
+    request_count = 0
+    retry_queue = httpclient.RetryQueue[str]()
+
+    def is_exhausted(delay: float = 0) -> bool:
+        return (max_requests is not None and request_count >= max_requests) or (
+            deadline is not None and time.time() + delay - start >= deadline
         )
-        urls = [
-            "https://www.steamgifts.com/user/",
-            "https://www.sgtools.info/nonactivated/",
-            "https://www.sgtools.info/multiple/",
-        ]
-        url_count = len(urls)
-        n = len(user_list)
-        for i, user in enumerate(user_list, start=1):
-            responses: list[requests.Response] = []
-            for url in urls:
-                response: requests.Response = fetch_request(session, url + user)
-                if response.status_code != 200:
-                    break
-                responses.append(response)
-            if len(responses) != url_count:
-                print(f"There is no user with username {user}.")
-                continue
-            profile = load_profile(responses[0].text)
-            add_sent_won_ratio(profile)
-            users[user] = {"profile": profile}
-            users[user]["namwc"] = check_not_activated_multiple_win(
-                responses[1].text, responses[2].text
+
+    def process(user: str) -> dict[str, Any] | None:
+        nonlocal request_count
+        try:
+            user_data, user_request_count = process_user(
+                session,
+                user,
+                conditions is not None,
+                negative_cache,
+                user_store,
+            )
+        except UserFetchError as error:
+            request_count += error.request_count
+            if retry_queue.defer(user, error.error):
+                return None
+            print(f"Failed to retrieve user {user}: {error}")
+            return previous_users.get(user)
+        request_count += user_request_count
+        if user_data is None:
+            print(f"There is no user with username {user}.")
+            return None
+        if user in previous_users:
+            user_data["namwc"] = (
+                previous_users[user]["namwc"] | user_data["namwc"]
             )
-            if i % 20 == 0:
-                print(f"{i} of {n} user profiles retrieved...")
-    print("All user profiles retrieved!")
-    return users
+        return user_data
+
+    def keep(users: list[str]) -> Iterator[tuple[str, dict[str, Any]]]:
+        kept = [u for u in users if u in previous_users]
+        print(f"Budget exhausted, {len(kept)} users kept from cache.")
+        for u in kept:
+            yield u, previous_users[u]
+
+    for i, user in enumerate(user_list, start=1):
+        if is_exhausted():
+            yield from keep(user_list[i - 1 :] + retry_queue.clear())
+            break
+        if negative_cache is not None and user in negative_cache:
+            continue
+        user_data = process(user)
+        if user_data is not None:
+            yield user, user_data
+        if i % 20 == 0:
+            print(f"{i} of {n} user profiles retrieved...")
+    if retry_queue:
+        print(f"Retrying {len(retry_queue)} failed users...")
+    while retry_queue:
+        if is_exhausted(retry_queue.get_delay()):
+            yield from keep(retry_queue.clear())
+            break
+        user = retry_queue.pop()
+        user_data = process(user)
+        if user_data is not None:
+            yield user, user_data
+    print(f"User profiles retrieved with {request_count} requests!")
 
 
 def raise_not_logged_in():
@@ -381,9 +717,8 @@ def read_cache() -> dict[str, Any] | None:
                 data = cast(dict[str, Any], pickle.loads(f.read()))
         last_check = data["last_check"]
         print(f"Cache read! Last checked {time.ctime(last_check)}.")
-        if time.time() - last_check > 604800:
-            data = None
-            print("Cache is more than 1 week old. Cache cleared!")
+        if is_cache_expired(data):
+            print("Cache is more than 1 week old. Cache to be refreshed!")
     return data
 
 
@@ -400,6 +735,75 @@ def read_config() -> configparser.ConfigParser:
     return config_parser
 
 
+def refresh_cache(
+    data: dict[str, Any] | None,
+    max_requests: int | None = None,
+    deadline: float | None = None,
+    stream: IO[str] | None = None,
+) -> dict[str, Any]:
+    """Refresh the cached `data` and write it.
+
+    With a `stream`, a provisional verdict is written for each user as soon as
+    it is retrieved. Its conditions come from the count sketches of the cache
+    or, on the first run, from the users retrieved so far.
+    """
+    users: dict[str, Any] = {}
+    evaluated: dict[str, Any] = {}  # not kept from the cache
+    sketches = get_sketches({})
+    with (
+        init_session() as session,
+        userstore.UserStore(ttl=CACHE_LIVE_SECONDS) as user_store,
+    ):
+        my_profile = load_my_profile(session)
+        previous_data = None
+        if data:
+            previous_data = {
+                "users": data["users"],
+                "sketches": data.get("sketches"),
+                "my_profile": my_profile,
+                "last_check": data["last_check"],
+            }
+        provisional_data = previous_data or {
+            "sketches": sketches,
+            "my_profile": my_profile,
+        }
+        conditions = filter_users_conditions(provisional_data)
+        for user, user_data in process_users(
+            session,
+            export_list(session),
+            previous_data,
+            max_requests,
+            deadline,
+            negcache.NegativeCache(NEGATIVE_CACHE_NAME),
+            user_store,
+        ):
+            users[user] = user_data
+            if not data or user_data is not data["users"].get(user):
+                evaluated[user] = user_data
+            update_sketches(sketches, user_data)
+            if stream:
+                if not previous_data:
+                    conditions = filter_users_conditions(provisional_data)
+                write_verdict(
+                    stream, get_verdict(user, user_data, conditions, True)
+                )
+    data = {
+        "users": users,
+        "sketches": sketches,
+        "my_profile": my_profile,
+        # the oldest entry, so that an incomplete refresh resumes
+        "last_check": min(
+            (v["timestamp"] for v in users.values()), default=time.time()
+        ),
+    }
+    write_cache(data)
+    # numpy is only needed to record the history
+    import history  # pylint: disable=import-outside-toplevel
+
+    history.append(evaluated)
+    return data
+
+
 def set_cookie(session: requests.Session):
     session.cookies.set(  # type: ignore
         "PHPSESSID",
@@ -408,32 +812,59 @@ def set_cookie(session: requests.Session):
     )
 
 
+def update_sketches(sketches: dict[str, sketch.KLL], user: dict[str, Any]):
+    """Add the not-activated and multiple win counts of a user, if any."""
+    for key, counts in sketches.items():
+        if user["namwc"].get(key):
+            counts.update(len(user["namwc"][key]))
+
+
+@trace.traced("cache:write")
 def write_cache(data: dict[str, Any]):
     with zipfile.ZipFile("cache.zip", "w", zipfile.ZIP_LZMA) as z:
         z.writestr("cache.pkl", pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
     print("Cache written!")
 
 
-def main():
-    data: dict[str, Any] | None = read_cache()
-    if not data:
-        user_list: list[str]
-        with requests.Session() as session:
-            set_cookie(session)
-            user_list = export_list(session)
-        data = {
-            "users": process_list(user_list),
-            "my_profile": load_my_profile(),
-            "last_check": time.time(),
-        }
-        write_cache(data)
-    users_to_remove: list[str] = filter_users(data)
-    n = len(users_to_remove)
-    print()
-    print(f"Results (total {n} user{"s" if n else ""}):")
-    for user in users_to_remove:
-        print("https://www.steamgifts.com/user/" + user)
+def write_verdict(stream: IO[str], verdict: dict[str, Any]):
+    stream.write(json.dumps(verdict) + "\n")
+    stream.flush()
+
+
+def main(
+    max_requests: int | None = None,
+    deadline: float | None = None,
+    stream_file: str | None = None,
+    cache_only: bool = False,
+):
+    with contextlib.ExitStack() as stack:
+        stream: IO[str] | None = None
+        if stream_file == "-":
+            stream = sys.stdout
+            # the logs would break the JSON lines
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        elif stream_file:
+            stream = stack.enter_context(
+                open(stream_file, "w", encoding="utf-8")
+            )
+        data: dict[str, Any] | None = read_cache()
+        if cache_only and not data:
+            print("No cache to filter.")
+            return
+        if not data or (is_cache_expired(data) and not cache_only):
+            data = refresh_cache(data, max_requests, deadline, stream)
+        elif stream:
+            conditions = filter_users_conditions(data)
+            for user, user_data in data["users"].items():
+                write_verdict(stream, get_verdict(user, user_data, conditions))
+        users_to_remove: list[str] = filter_users(data)
+        n = len(users_to_remove)
+        print()
+        print(f"Results (total {n} user{"s" if n else ""}):")
+        for user in users_to_remove:
+            print("https://www.steamgifts.com/user/" + user)
 
 
 if __name__ == "__main__":
-    main()
+    args: ExtractedArgs = parse_args()
+    main(args.max_requests, args.deadline, args.stream, args.cache_only)
@@ -0,0 +1,104 @@
+"""Mergeable quantile sketch (KLL) in constant memory.
+
+Items are kept in compactors of growing weight. When the sketch is full, the
+first full compactor is sorted and every other item is promoted to the next
+compactor with twice the weight. Until the first compaction every item is
+kept, and the quantiles are exact, interpolated like `numpy.percentile`.
+
+Reference: Karnin, Lang and Liberty, "Optimal Quantile Approximation in
+Streams", 2016.
+"""
+
+import math
+import random
+from collections.abc import Iterable
+
+
+class KLL:
+    """Approximate quantiles of a stream, within about `k` items.
+
+    `c` is the ratio of the capacity of a compactor to the next one.
+    """
+
+    def __init__(self, k: int = 200, c: float = 2 / 3):
+        self.k = k
+        self.c = c
+        self.compactors: list[list[float]] = [[]]
+        self.size = 0
+        self.max_size = 0
+        self.update_max_size()
+
+    def __len__(self) -> int:
+        """Return the number of items seen."""
+        return sum(len(items) << h for h, items in enumerate(self.compactors))
+
+    def get_capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return math.ceil(self.c**depth * self.k) + 1
+
+    def update_max_size(self):
+        self.max_size = sum(
+            self.get_capacity(h) for h in range(len(self.compactors))
+        )
+
+    def update(self, item: float):
+        self.compactors[0].append(item)
+        self.size += 1
+        if self.size >= self.max_size:
+            self.compress()
+
+    def extend(self, items: Iterable[float]):
+        for item in items:
+            self.update(item)
+
+    def compress(self):
+        for h, items in enumerate(self.compactors):
+            if len(items) >= self.get_capacity(h):
+                if h + 1 == len(self.compactors):
+                    self.compactors.append([])
+                items.sort()
+                # an odd item out stays, so that the weights add up
+                odd = [items.pop()] if len(items) % 2 else []
+                offset = random.randrange(2)
+                self.compactors[h + 1].extend(items[offset::2])
+                items[:] = odd
+                self.size = sum(len(c) for c in self.compactors)
+                self.update_max_size()
+                break
+
+    def merge(self, other: "KLL"):
+        """Add the items of `other`, e.g. the sketch of another shard."""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for h, items in enumerate(other.compactors):
+            self.compactors[h].extend(items)
+        self.size = sum(len(c) for c in self.compactors)
+        self.update_max_size()
+        while self.size >= self.max_size:
+            self.compress()
+
+    def quantile(self, q: float) -> float:
+        """Return the `q` quantile, `q` between 0 and 1."""
+        if len(self.compactors) == 1:
+            items = sorted(self.compactors[0])
+            if not items:
+                raise ValueError("Empty sketch.")
+            position = q * (len(items) - 1)
+            lower = math.floor(position)
+            upper = min(lower + 1, len(items) - 1)
+            return items[lower] + (items[upper] - items[lower]) * (
+                position - lower
+            )
+
+        weighted = sorted(
+            (item, 1 << h)
+            for h, items in enumerate(self.compactors)
+            for item in items
+        )
+        rank = q * sum(weight for _, weight in weighted)
+        cumulative = 0
+        for item, weight in weighted:
+            cumulative += weight
+            if cumulative >= rank:
+                return item
+        return weighted[-1][0]
@@ -0,0 +1,63 @@
+"""Tests of the columnar history of the user stats.
+"""
+
+import tempfile
+import time
+import unittest
+from typing import Any
+
+import history
+
+
+def get_users(timestamp: float, ratios: dict[str, float]) -> dict[str, Any]:
+    return {
+        user: {
+            "timestamp": timestamp,
+            "profile": {"ratio": ratio},
+            "namwc": {},
+        }
+        for user, ratio in ratios.items()
+    }
+
+
+class FindDropsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_empty_history(self):
+        self.assertEqual(
+            history.find_drops("ratio", 0.5, directory=self.directory.name), []
+        )
+
+    def test_no_rows_in_period(self):
+        old = time.time() - 200 * 86400
+        history.append(get_users(old, {"a": 2, "b": 1}), self.directory.name)
+        self.assertEqual(
+            history.find_drops(
+                "ratio", 0.5, days=90, directory=self.directory.name
+            ),
+            [],
+        )
+
+    def test_drop(self):
+        now = time.time()
+        history.append(
+            get_users(now - 30 * 86400, {"a": 2, "b": 1, "c": 3}),
+            self.directory.name,
+        )
+        history.append(
+            get_users(now, {"a": 0.5, "b": 1.5, "c": 2.8}), self.directory.name
+        )
+        self.assertEqual(
+            history.find_drops("ratio", 0.5, directory=self.directory.name),
+            [("a", 2.0, 0.5)],
+        )
+        self.assertEqual(
+            history.find_drops("ratio", 0.1, directory=self.directory.name),
+            [("a", 2.0, 0.5), ("c", 3.0, 2.8)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+"""Tests of the whitelist manager, on synthetic pages.
+"""
+
+import contextlib
+import html
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import unittest
+from typing import Any
+
+import requests
+
+import main
+
+
+def get_tooltip(rows: list[tuple[str, str]]) -> str:
+    data = {"rows": [{"columns": [{"name": n}, {"name": v}]} for n, v in rows]}
+    return html.escape(json.dumps(data), quote=True)
+
+
+def get_profile_page(won: int, sent: int, registered: float) -> str:
+    won_rows = [("Total", str(won)), ("Full", str(won))] + [
+        (name, "0") for name in ("Reduced", "Zero", "Not Received")
+    ]
+    sent_rows = [("Total", str(sent)), ("Full", str(sent))] + [
+        (name, "0") for name in ("Reduced", "Zero", "Awaiting", "Not Received")
+    ]
+
+    def row(name: str, right: str) -> str:
+        return (
+            '<div class="featured__table__row">'
+            f'<div class="featured__table__row__left">{name}</div>'
+            f'<div class="featured__table__row__right">{right}</div></div>'
+        )
+
+    def values(rows: list[tuple[str, str]], count: int) -> str:
+        real = get_tooltip([("Real", f"${count * 10:,.2f}")])
+        return (
+            f'<span data-ui-tooltip="{get_tooltip(rows)}">{count}</span> '
+            f'<span data-ui-tooltip="{real}">${count * 10:,.2f}</span>'
+        )
+
+    return (
+        '<html><body><div class="featured__table">'
+        + row("Registered", f'<span data-timestamp="{registered:.0f}">x</span>')
+        + row("Gifts Won", values(won_rows, won))
+        + row("Gifts Sent", values(sent_rows, sent))
+        + "</div></body></html>"
+    )
+
+
+def get_population(
+    count: int, seed: int
+) -> dict[str, tuple[int, int, int, int]]:
+    """Return `username: (won, sent, not activated, multiple)`."""
+    rng = random.Random(seed)
+    population: dict[str, tuple[int, int, int, int]] = {}
+    for i in range(count):
+        won = rng.choice([0, 0, rng.randint(1, 5), rng.randint(1, 40)])
+        population[f"user{i:03d}"] = (
+            won,
+            rng.randint(0, 60),
+            rng.randint(0, won),
+            rng.randint(0, won // 3),
+        )
+    return population
+
+
+def get_pages(
+    population: dict[str, tuple[int, int, int, int]],
+) -> dict[str, str]:
+    registered = time.time() - 5 * 365 * 86400
+    pages: dict[str, str] = {}
+    for user, (won, sent, na, mw) in population.items():
+        pages[main.USER_URLS["profile"] + user] = get_profile_page(
+            won, sent, registered
+        )
+        pages[main.USER_URLS["not_activated"] + user] = "<html>" + "".join(
+            f'<div class="notActivatedGame">Game {i}</div>' for i in range(na)
+        )
+        pages[main.USER_URLS["multiple"] + user] = "<html>" + "".join(
+            f'<div class="multiplewins">Game {i}</div>' for i in range(mw)
+        )
+    return pages
+
+
+class FakeSession:
+    """Serve `pages`, and count the requests."""
+
+    def __init__(self, pages: dict[str, str]):
+        self.pages = pages
+        self.urls: list[str] = []
+
+    def get(self, url: str, **_: Any) -> requests.Response:
+        self.urls.append(url)
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200 if url in self.pages else 302
+        # pylint: disable-next=protected-access
+        response._content = self.pages.get(url, "").encode()
+        response.encoding = "utf-8"
+        return response
+
+
+class ProcessUsersTest(unittest.TestCase):
+    def setUp(self):
+        self.my_profile = main.load_profile(
+            get_profile_page(20, 40, time.time() - 3 * 365 * 86400)
+        )
+        main.add_sent_won_ratio(self.my_profile)
+
+    def process(
+        self,
+        population: dict[str, tuple[int, int, int, int]],
+        previous_data: dict[str, Any] | None = None,
+    ) -> tuple[dict[str, Any], int]:
+        """Return the refreshed data, and the number of requests."""
+        session = FakeSession(get_pages(population))
+        with contextlib.redirect_stdout(io.StringIO()):
+            users = dict(
+                main.process_users(session, list(population), previous_data)
+            )
+        data = {
+            "users": users,
+            "sketches": main.get_sketches(users),
+            "my_profile": self.my_profile,
+            "last_check": time.time(),
+        }
+        return data, len(session.urls)
+
+    def get_verdicts(self, data: dict[str, Any]) -> dict[str, list[str]]:
+        conditions = main.filter_users_conditions(data)
+        return {
+            user: main.get_verdict(user, user_data, conditions)["reasons"]
+            for user, user_data in data["users"].items()
+        }
+
+    def test_lazy_pages_keep_verdicts(self):
+        # the previous run saw fewer users, with other counts
+        previous_data, _ = self.process(get_population(120, seed=1))
+        population = get_population(200, seed=2)
+        full, full_requests = self.process(population)
+        lazy, lazy_requests = self.process(population, previous_data)
+
+        full_conditions = main.filter_users_conditions(full)
+        lazy_conditions = main.filter_users_conditions(lazy)
+        for key in ("na", "mw"):
+            for bound in ("lower", "upper"):
+                limit = f"{key}_{bound}_limit"
+                self.assertEqual(full_conditions[limit], lazy_conditions[limit])
+        self.assertEqual(self.get_verdicts(full), self.get_verdicts(lazy))
+        self.assertTrue(any(self.get_verdicts(full).values()))
+        self.assertLess(lazy_requests, full_requests)
+
+    def test_stream_to_stdout(self):
+        data, _ = self.process(get_population(50, seed=3))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cwd = os.getcwd()
+        os.chdir(directory.name)
+        self.addCleanup(os.chdir, cwd)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.write_cache(data)
+        with (
+            contextlib.redirect_stdout(stdout),
+            contextlib.redirect_stderr(stderr),
+        ):
+            main.main(stream_file="-", cache_only=True)
+
+        verdicts = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(len(verdicts), len(data["users"]))
+        self.assertIn("Results", stderr.getvalue())
+
+
+class RefreshPriorityTest(unittest.TestCase):
+    def test_no_limits(self):
+        # no user with a count yet: the count limits are infinite
+        now = time.time()
+        conditions = {
+            "max_won_count": 5,
+            "min_sent_real_cv": 100,
+            "min_ratio_real_cv": 1,
+            "na_upper_limit": math.inf,
+            "mw_upper_limit": math.inf,
+        }
+        priorities = [
+            main.get_refresh_priority(
+                {
+                    "timestamp": now - 86400 * age,
+                    "profile": {
+                        "won_count": 4,
+                        "won_real_cv": 0,
+                        "sent_real_cv": 0,
+                        "ratio_real_cv": 0,
+                    },
+                    "namwc": {"not_activated": [], "multiple": []},
+                },
+                conditions,
+                now,
+            )
+            for age in (1, 2)
+        ]
+        self.assertTrue(all(math.isfinite(p) for p in priorities))
+        self.assertLess(priorities[0], priorities[1])
+
+
+if __name__ == "__main__":
+    unittest.main()